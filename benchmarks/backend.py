@@ -0,0 +1,271 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+"""A fake trytond backend, built from fixtures, for the benchmarks.
+
+The fixtures are a dictionary with a ``fields`` entry, holding the field
+definitions of each model, and a list of rows for each model.  The rows only
+need the fields that are read by the extension.
+"""
+from contextlib import contextmanager
+from time import sleep
+from unittest.mock import patch
+
+import proteus.config
+from proteus.config import Config
+
+TIMESTAMP = '2020-01-01 00:00:00'
+
+IR_FIELDS = {
+    'ir.action.act_window': {
+        'name': 'char',
+        'res_model': 'char',
+        },
+    'ir.action.wizard': {
+        'name': 'char',
+        'wiz_name': 'char',
+        },
+    'ir.model': {
+        'info': 'text',
+        'model': 'char',
+        'module': 'char',
+        'name': 'char',
+        },
+    'ir.model.button': {
+        'help': 'text',
+        'model': ('many2one', 'ir.model'),
+        'name': 'char',
+        'string': 'char',
+        },
+    'ir.model.data': {
+        'db_id': 'integer',
+        'fs_id': 'char',
+        'model': 'char',
+        'module': 'char',
+        },
+    'ir.model.field': {
+        'field_description': 'char',
+        'help': 'text',
+        'model': ('many2one', 'ir.model'),
+        'name': 'char',
+        'ttype': 'char',
+        },
+    'ir.module': {
+        'name': 'char',
+        'state': 'char',
+        },
+    'ir.module.dependency': {
+        'module': ('many2one', 'ir.module'),
+        'name': 'char',
+        },
+    'ir.ui.menu': {
+        'complete_name': 'char',
+        'name': 'char',
+        'parent': ('many2one', 'ir.ui.menu'),
+        },
+    'ir.ui.view': {
+        'arch': 'text',
+        'model': 'char',
+        'name': 'char',
+        'type': 'char',
+        },
+    }
+
+
+def field_definitions(fields):
+    definitions = {}
+    for name, type_ in fields.items():
+        definition = {
+            'loading': 'lazy',
+            'name': name,
+            'readonly': False,
+            'string': name.replace('_', ' ').title(),
+            }
+        if isinstance(type_, tuple):
+            type_, relation = type_
+            definition['relation'] = relation
+        if isinstance(type_, list):
+            type_, definition['selection'] = 'selection', type_
+        definition['type'] = type_
+        definitions[name] = definition
+    for name in ('create_date', 'write_date'):
+        definitions[name] = {
+            'loading': 'eager', 'name': name, 'readonly': True,
+            'string': name, 'type': 'datetime'}
+    return definitions
+
+
+def generate_fixtures(models=20, fields=10, options=5, buttons=3, wizards=10,
+                      menus=20):
+    "Returns fixtures for a database with the given number of objects."
+    definitions = {n: f.copy() for n, f in IR_FIELDS.items()}
+    rows = {n: [] for n in IR_FIELDS}
+
+    def add(model_name, **values):
+        values['id'] = len(rows[model_name]) + 1
+        rows[model_name].append(values)
+        return values['id']
+
+    def add_data(fs_id, model_name, db_id):
+        add('ir.model.data', module='bench', fs_id=fs_id, model=model_name,
+            db_id=db_id)
+
+    for module in ('ir', 'res', 'bench'):
+        add('ir.module', name=module, state='activated')
+    add('ir.module.dependency', module=2, name='ir')
+    add('ir.module.dependency', module=3, name='res')
+
+    for model_name, model_fields in sorted(definitions.items()):
+        add('ir.model', model=model_name, module='ir',
+            name=model_name.replace('.', ' ').title(), info='')
+    for index in range(models):
+        model_name = 'bench.model{}'.format(index)
+        model_fields = {'field{}'.format(f): 'char' for f in range(fields)}
+        model_fields['state'] = [
+            ('option{}'.format(o), 'Option {}'.format(o))
+            for o in range(options)]
+        definitions[model_name] = model_fields
+
+        model_id = add(
+            'ir.model', model=model_name, module='bench',
+            name='Bench Model {}'.format(index), info='')
+        for field_name, type_ in sorted(model_fields.items()):
+            add('ir.model.field', model=model_id, name=field_name,
+                field_description=field_name.title(), help='',
+                ttype='selection' if isinstance(type_, list) else type_)
+        for button in range(buttons):
+            add('ir.model.button', model=model_id,
+                name='button{}'.format(button),
+                string='Button {}'.format(button), help='')
+        add('ir.action.act_window', res_model=model_name,
+            name='Bench Models {}'.format(index))
+        view_id = add(
+            'ir.ui.view', model=model_name, type='form',
+            name='bench_model{}_form'.format(index), arch='<form/>')
+        add_data('model{}_view_form'.format(index), 'ir.ui.view', view_id)
+
+    for index in range(wizards):
+        add('ir.action.wizard', wiz_name='bench.wizard{}'.format(index),
+            name='Bench Wizard {}'.format(index))
+
+    root = add('ir.ui.menu', name='Bench', complete_name='Bench', parent=None)
+    add_data('menu_bench', 'ir.ui.menu', root)
+    for index in range(menus):
+        name = 'Menu {}'.format(index)
+        menu_id = add(
+            'ir.ui.menu', name=name, complete_name='Bench / ' + name,
+            parent=root)
+        add_data('menu{}'.format(index), 'ir.ui.menu', menu_id)
+
+    fixtures = {'fields': definitions}
+    fixtures.update(rows)
+    return fixtures
+
+
+class FakeDatabase(object):
+    "Answers the requests made by proteus from the fixtures."
+
+    def __init__(self, fixtures):
+        self.fields = {
+            n: field_definitions(f) for n, f in fixtures['fields'].items()}
+        self.rows = {
+            n: {r['id']: r for r in rows}
+            for n, rows in fixtures.items() if n != 'fields'}
+
+    def call(self, model_name, method, args):
+        if model_name not in self.fields:
+            raise KeyError("model '{}' not found".format(model_name))
+        return getattr(self, method)(model_name, *args)
+
+    def matches(self, row, domain):
+        for name, operator, value in domain:
+            field = row.get(name)
+            if operator == '=' and field != value:
+                return False
+            if operator == '!=' and field == value:
+                return False
+            if operator == 'in' and field not in value:
+                return False
+        return True
+
+    def values(self, model_name, row, fields_names):
+        if fields_names is None:
+            fields_names = list(self.fields[model_name])
+        values = {'id': row['id']}
+        for name in fields_names:
+            values[name] = row.get(name, TIMESTAMP if name in (
+                'create_date', 'write_date') else None)
+        return values
+
+    def fields_get(self, model_name, fields_names=None, context=None):
+        fields = self.fields[model_name]
+        return {
+            n: d for n, d in fields.items()
+            if fields_names is None or n in fields_names}
+
+    def search(self, model_name, domain, offset=0, limit=None, order=None,
+               context=None):
+        ids = [
+            i for i, r in sorted(self.rows.get(model_name, {}).items())
+            if self.matches(r, domain)]
+        return ids[offset:offset + limit if limit else None]
+
+    def read(self, model_name, ids, fields_names, context=None):
+        rows = self.rows.get(model_name, {})
+        result = []
+        for id in ids:
+            values = self.values(
+                model_name, rows[id],
+                [f for f in fields_names if f != '_timestamp'])
+            values['_timestamp'] = TIMESTAMP
+            result.append(values)
+        return result
+
+    def search_read(self, model_name, domain, offset=0, limit=None,
+                    order=None, fields_names=None, context=None):
+        rows = self.rows.get(model_name, {})
+        return [
+            self.values(model_name, rows[i], fields_names)
+            for i in self.search(model_name, domain, offset, limit, order)]
+
+
+class FakeProxy(object):
+
+    def __init__(self, database, name, latency):
+        self._database = database
+        self._name = name
+        self._latency = latency
+
+    def __getattr__(self, method):
+        def call(*args):
+            if self._latency:
+                sleep(self._latency)
+            return self._database.call(self._name, method, args)
+        return call
+
+
+class FakeConfig(Config):
+    "A proteus configuration that answers requests from a fake database."
+
+    def __init__(self, database, latency=0):
+        super().__init__()
+        self.database = database
+        self.latency = latency
+        self.user = 1
+
+    def get_proxy(self, name, type='model'):
+        return FakeProxy(self.database, name, self.latency)
+
+    def get_proxy_methods(self, name, type='model'):
+        return []
+
+
+@contextmanager
+def fake_xmlrpc(database, latency=0):
+    "Makes xmlrpc connections use the fake database with the given latency."
+    def set_xmlrpc(url, **kwargs):
+        proteus.config._CONFIG.current = FakeConfig(database, latency)
+        return proteus.config._CONFIG.current
+
+    with patch('proteus.config.set_xmlrpc', set_xmlrpc):
+        yield
@@ -0,0 +1,169 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+"""Benchmark capturing tryton figures with a fake Sao webdriver.
+
+Run it from the top level of the package with::
+
+    python3 -m benchmarks.figures --figures 20 --render-delay 50
+
+This needs Pillow and selenium to be installed, but not a browser or server.
+"""
+from argparse import ArgumentParser
+from collections import defaultdict
+from io import StringIO
+from pathlib import Path
+from shutil import rmtree
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+from tempfile import mkdtemp
+from time import perf_counter
+from unittest.mock import patch
+
+from sphinxcontrib.tryton import client_sao
+from sphinxcontrib.tryton.domain import get_clients_in_use
+from sphinxcontrib.tryton.trace import get_tracer
+
+from .backend import FakeDatabase, fake_xmlrpc, generate_fixtures
+from .webdriver import FakeWebDriver
+
+CONF = """\
+extensions = ['sphinxcontrib.tryton']
+project = 'sphinxcontrib-tryton benchmark'
+trytond_connection_type = 'xmlrpc'
+trytond_database = 'bench'
+trytond_host = 'localhost'
+trytond_password = 'admin'
+sao_browser = 'firefox'
+sao_force_update = True
+tryton_trace_file = 'trace.json'
+"""
+
+FIGURES_PER_DOCUMENT = 5
+
+# The trace spans that are spent waiting on the browser, and encoding images
+WAIT_SPANS = ('prepare', 'navigate', 'settle', 'screenshot')
+ENCODE_SPANS = ('crop', 'encode')
+
+
+def figure_directive(index, models, menus):
+    kind = index % 3
+    if kind == 0:
+        return '.. tryton:view:: bench.model{}_view_form view{}.png\n'.format(
+            index % models, index)
+    if kind == 1:
+        return (
+            '.. tryton:figure:: fig{}.png\n'
+            '    :view: bench.model{}_view_form\n'
+            '    :fields: field0 field1\n'
+            '    :padding: 10\n').format(index, index % models)
+    return (
+        '.. tryton:figure:: fig{}.png\n'
+        '    :menuitem: bench.menu{}\n').format(index, index % menus)
+
+
+def write_project(directory, figures, models, menus):
+    "Writes a project with the given number of figures."
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / 'conf.py').write_text(CONF, encoding='utf-8')
+
+    names = []
+    for start in range(0, figures, FIGURES_PER_DOCUMENT):
+        name = 'figures{}'.format(len(names))
+        names.append(name)
+        lines = [name, '=' * len(name), '']
+        for index in range(start, min(start + FIGURES_PER_DOCUMENT, figures)):
+            lines.append(figure_directive(index, models, menus))
+        (directory / (name + '.rst')).write_text(
+            '\n'.join(lines), encoding='utf-8')
+    (directory / 'index.rst').write_text(
+        'Benchmark\n=========\n\n.. toctree::\n\n' +
+        ''.join('    {}\n'.format(n) for n in names), encoding='utf-8')
+
+
+def build(directory, database, render_delay, settle_delay):
+    "Builds the project, and returns the time spent on each step."
+    def get_webdriver(self, browser):
+        client_sao.import_webdriver()
+        return FakeWebDriver(
+            database='bench', render_delay=render_delay,
+            settle_delay=settle_delay)
+
+    start = perf_counter()
+    with fake_xmlrpc(database), docutils_namespace(), \
+            patch.object(client_sao.ClientSao, 'get_webdriver', get_webdriver):
+        app = Sphinx(
+            str(directory), str(directory), str(directory / '_build'),
+            str(directory / '_build' / '.doctrees'), 'html',
+            status=StringIO(), warning=StringIO(), freshenv=True)
+        try:
+            app.build()
+        finally:
+            get_clients_in_use().clear()
+    elapsed = perf_counter() - start
+
+    spans = defaultdict(float)
+    figures = 0
+    for event in get_tracer().events:
+        spans[event['name']] += event['dur'] / 1000000
+        if event['name'] == 'figure':
+            figures += 1
+
+    images = list(directory.glob('*.png'))
+    return {
+        'time': elapsed,
+        'figures': figures,
+        'figure_time': spans['figure'],
+        'wait_time': sum(spans[s] for s in WAIT_SPANS),
+        'encode_time': sum(spans[s] for s in ENCODE_SPANS),
+        'start_time': spans['start'],
+        'bytes': sum(i.stat().st_size for i in images),
+        'warnings': app._warncount,
+        }
+
+
+def run(figures=10, render_delay=0, settle_delay=0, directory=None):
+    "Runs the benchmark, and returns its results."
+    models = menus = max(figures // 3, 1)
+    database = FakeDatabase(generate_fixtures(models=models, menus=menus))
+
+    temp_dir = None
+    if directory is None:
+        directory = temp_dir = Path(mkdtemp(prefix='tryton-bench-'))
+    try:
+        write_project(directory, figures, models, menus)
+        return build(directory, database, render_delay, settle_delay)
+    finally:
+        if temp_dir:
+            rmtree(str(temp_dir), ignore_errors=True)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--figures', type=int, default=10)
+    parser.add_argument('--render-delay', type=float, default=0,
+                        help="milliseconds to load a page or take a "
+                        "screenshot")
+    parser.add_argument('--settle-delay', type=float, default=0,
+                        help="milliseconds until the page is ready after "
+                        "each action")
+    args = parser.parse_args()
+
+    result = run(
+        figures=args.figures, render_delay=args.render_delay / 1000,
+        settle_delay=args.settle_delay / 1000)
+
+    figure_time = result['figure_time'] or 1
+    print("figures:        {figures}".format(**result))
+    print("build time:     {time:.3f}s".format(**result))
+    print("client start:   {start_time:.3f}s".format(**result))
+    print("figures/second: {:.2f}".format(result['figures'] / figure_time))
+    print("waiting:        {wait_time:.3f}s ({:.0%})".format(
+        result['wait_time'] / figure_time, **result))
+    print("encoding:       {encode_time:.3f}s ({:.0%})".format(
+        result['encode_time'] / figure_time, **result))
+    print("bytes written:  {bytes}".format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+"""Benchmark resolving the names of tryton objects in a synthetic project.
+
+Run it from the top level of the package with::
+
+    python3 -m benchmarks.metadata --documents 50 --references 40 --latency 5
+"""
+from argparse import ArgumentParser
+from contextlib import ExitStack
+from functools import partial
+from io import StringIO
+from pathlib import Path
+from random import Random
+from shutil import rmtree
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+from tempfile import mkdtemp
+from time import perf_counter
+import tracemalloc
+
+from .backend import FakeDatabase, fake_xmlrpc, generate_fixtures
+from .server import serve
+
+CONF = """\
+extensions = ['sphinxcontrib.tryton']
+project = 'sphinxcontrib-tryton benchmark'
+trytond_connection_type = 'xmlrpc'
+trytond_host = 'localhost'
+trytond_password = 'admin'
+trytond_port = {port!r}
+trytond_rpc_stats = True
+trytond_cache_file = {cache_file!r}
+"""
+
+
+def random_references(random, count, models, fields, options, buttons,
+                      wizards, menus):
+    for _ in range(count):
+        type_ = random.choice([
+            'model', 'field', 'option', 'button', 'wizard', 'menu', 'data'])
+        model = 'bench.model{}'.format(random.randrange(models))
+        if type_ == 'model':
+            target = model
+        elif type_ == 'field':
+            target = '{}.field{}'.format(model, random.randrange(fields))
+        elif type_ == 'option':
+            target = '{}.state.option{}'.format(
+                model, random.randrange(options))
+        elif type_ == 'button':
+            target = '{}.button{}'.format(model, random.randrange(buttons))
+        elif type_ == 'wizard':
+            target = 'bench.wizard{}'.format(random.randrange(wizards))
+        else:
+            target = 'bench.menu{}'.format(random.randrange(menus))
+        yield ':tryton:{}:`{}`'.format(type_, target)
+
+
+def write_project(directory, documents, references, seed=0, cache_file=None,
+                  port=8000, **sizes):
+    "Writes a project with documents that refer to random tryton objects."
+    random = Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / 'conf.py').write_text(
+        CONF.format(cache_file=cache_file, port=port), encoding='utf-8')
+
+    names = ['doc{}'.format(d) for d in range(documents)]
+    (directory / 'index.rst').write_text(
+        'Benchmark\n=========\n\n.. toctree::\n\n' +
+        ''.join('    {}\n'.format(n) for n in names), encoding='utf-8')
+    for name in names:
+        lines = [name, '=' * len(name), '']
+        for reference in random_references(random, references, **sizes):
+            lines.extend([reference, ''])
+        (directory / (name + '.rst')).write_text(
+            '\n'.join(lines), encoding='utf-8')
+
+
+def build(directory, connect, freshenv):
+    "Builds the project, and returns the time, requests and peak memory."
+    tracemalloc.start()
+    start = perf_counter()
+    with connect(), docutils_namespace():
+        app = Sphinx(
+            str(directory), str(directory), str(directory / '_build'),
+            str(directory / '_build' / '.doctrees'), 'html',
+            status=StringIO(), warning=StringIO(), freshenv=freshenv)
+        app.build()
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = app.trytond.stats
+    return {
+        'time': elapsed,
+        'rpc_calls': len(stats.calls),
+        'rpc_time': sum(c.duration for c in stats.calls),
+        'peak_memory': peak,
+        'warnings': app._warncount,
+        }
+
+
+def touch_documents(directory):
+    for filename in directory.glob('doc*.rst'):
+        filename.write_text(
+            filename.read_text(encoding='utf-8') + '\n', encoding='utf-8')
+
+
+def run(documents=20, references=20, latency=0, seed=0, cache=False,
+        directory=None, server=False, bandwidth=None, **sizes):
+    """Runs the benchmark and returns the results of each build.
+
+    The first build reads every document with a fresh environment, the second
+    reads them all again using the lookups that were recorded by the first.
+    With ``server`` the builds connect over XML-RPC to a stand-in server that
+    sends its responses with the given ``bandwidth``, instead of calling the
+    fake database directly.
+    """
+    sizes = dict({
+        'models': 20, 'fields': 10, 'options': 5, 'buttons': 3,
+        'wizards': 10, 'menus': 20}, **sizes)
+    database = FakeDatabase(generate_fixtures(**sizes))
+
+    temp_dir = None
+    if directory is None:
+        directory = temp_dir = Path(mkdtemp(prefix='tryton-bench-'))
+    try:
+        with ExitStack() as stack:
+            port, connect = 8000, partial(fake_xmlrpc, database, latency)
+            if server:
+                stand_in = stack.enter_context(serve(
+                    database, latency=latency, bandwidth=bandwidth))
+                port, connect = stand_in.port, ExitStack
+
+            cache_file = str(directory / 'cache.sqlite') if cache else None
+            write_project(
+                directory, documents, references, seed, cache_file, port,
+                **sizes)
+            results = [('cold', build(directory, connect, True))]
+            touch_documents(directory)
+            results.append(('prefetch', build(directory, connect, False)))
+            return results
+    finally:
+        if temp_dir:
+            rmtree(str(temp_dir), ignore_errors=True)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=20)
+    parser.add_argument('--references', type=int, default=20,
+                        help="references in each document")
+    parser.add_argument('--latency', type=float, default=0,
+                        help="milliseconds added to each request")
+    parser.add_argument('--models', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache', action='store_true',
+                        help="use a trytond cache file")
+    parser.add_argument('--server', action='store_true',
+                        help="connect to a stand-in XML-RPC server")
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help="KiB per second sent by the stand-in server")
+    args = parser.parse_args()
+    if args.bandwidth and not args.server:
+        parser.error("--bandwidth can only be used with --server")
+
+    results = run(
+        documents=args.documents, references=args.references,
+        latency=args.latency / 1000, seed=args.seed, cache=args.cache,
+        server=args.server, bandwidth=args.bandwidth * 1024,
+        models=args.models)
+
+    print("{:<10} {:>9} {:>9} {:>11} {:>12}".format(
+        'build', 'time (s)', 'requests', 'rpc (s)', 'peak (KiB)'))
+    for name, result in results:
+        print("{:<10} {time:>9.3f} {rpc_calls:>9} {rpc_time:>11.3f} "
+              "{peak:>12.0f}".format(
+                  name, peak=result['peak_memory'] / 1024, **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+"""A stand-in trytond XML-RPC server, built from fixtures, for the benchmarks.
+
+It answers the requests that proteus makes over XML-RPC from a fake database,
+so builds can use the ``xmlrpc`` connection type without a trytond server.
+Each request can be delayed by a fixed latency, and each response by the time
+it takes to send it with a limited bandwidth.
+
+Run it from the top level of the package with::
+
+    python3 -m benchmarks.server --port 8000 --latency 5 --bandwidth 1024
+"""
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from socketserver import ThreadingMixIn
+from threading import Thread
+from time import sleep
+from xmlrpc.client import Fault
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+from .backend import FakeDatabase, generate_fixtures
+
+METHODS = ('fields_get', 'read', 'search', 'search_read')
+
+
+class ThrottledWriter(object):
+    "Writes to a file no faster than the given number of bytes per second."
+
+    def __init__(self, file, bandwidth):
+        self.file = file
+        self.bandwidth = bandwidth
+
+    def write(self, data):
+        sleep(len(data) / self.bandwidth)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class RequestHandler(SimpleXMLRPCRequestHandler):
+    # Like trytond, keep the connection open between requests
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        if self.server.bandwidth:
+            self.wfile = ThrottledWriter(self.wfile, self.server.bandwidth)
+
+    def is_rpc_path_valid(self):
+        return self.path.strip('/') == self.server.database_name
+
+
+class StandInServer(ThreadingMixIn, SimpleXMLRPCServer):
+    "Answers trytond XML-RPC requests from a fake database."
+
+    daemon_threads = True
+
+    def __init__(self, database, database_name='tryton', host='localhost',
+                 port=0, latency=0, bandwidth=None):
+        super().__init__(
+            (host, port), RequestHandler, logRequests=False, allow_none=True,
+            use_builtin_types=True)
+        self.database = database
+        self.database_name = database_name
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def _dispatch(self, method, params):
+        self.requests += 1
+        if self.latency:
+            sleep(self.latency)
+
+        if method == 'system.listMethods':
+            return self.list_methods()
+        if method == 'model.res.user.get_preferences':
+            return {'language': 'en', 'groups': []}
+
+        type_, _, name = method.partition('.')
+        model_name, _, method_name = name.rpartition('.')
+        if type_ != 'model' or method_name not in METHODS:
+            raise Fault(
+                'UserError', "method '{}' is not available".format(method))
+        try:
+            return self.database.call(model_name, method_name, params)
+        except Exception as err:
+            raise Fault(type(err).__name__, str(err))
+
+    def list_methods(self):
+        return [
+            'model.{}.{}'.format(n, m)
+            for n in sorted(self.database.fields) for m in METHODS]
+
+    def start(self):
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+
+@contextmanager
+def serve(database, **kwargs):
+    "Runs a stand-in server for the database on localhost while in use."
+    server = StandInServer(database, **kwargs)
+    server.start()
+    try:
+        yield server
+    finally:
+        server.stop()
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--database', default='tryton')
+    parser.add_argument('--latency', type=float, default=0,
+                        help="milliseconds added to each request")
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help="KiB per second that responses are sent at")
+    parser.add_argument('--models', type=int, default=20)
+    parser.add_argument('--menus', type=int, default=20)
+    args = parser.parse_args()
+
+    database = FakeDatabase(
+        generate_fixtures(models=args.models, menus=args.menus))
+    server = StandInServer(
+        database, args.database, port=args.port, latency=args.latency / 1000,
+        bandwidth=args.bandwidth * 1024)
+    print("serving database '{}' on http://localhost:{}/{}/".format(
+        args.database, server.port, args.database))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
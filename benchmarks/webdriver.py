@@ -0,0 +1,200 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+"""A fake selenium webdriver that behaves like a browser running Sao.
+
+Pages take ``render_delay`` seconds to load and screenshots take as long to
+render.  After each action the conditions that the client waits for only
+become true once ``settle_delay`` seconds have passed, so the client's waits
+poll just like they do against a real browser.
+"""
+from io import BytesIO
+from pathlib import Path
+from random import Random
+from re import search
+from time import monotonic, sleep
+from urllib.parse import unquote
+
+from PIL import Image, ImageDraw
+from selenium.common.exceptions import NoSuchElementException
+
+
+class FakeElement(object):
+
+    def __init__(self, driver, id, rect=None, attributes=None, displayed=True):
+        self.driver = driver
+        self.id = id
+        self.rect = rect or {'x': 0, 'y': 0, 'width': 100, 'height': 20}
+        self.attributes = attributes or {}
+        self.displayed = displayed
+
+    def __eq__(self, other):
+        return isinstance(other, FakeElement) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def get_attribute(self, name):
+        value = self.attributes.get(name)
+        return value() if callable(value) else value
+
+    def is_displayed(self):
+        return self.displayed
+
+    def send_keys(self, *values):
+        pass
+
+    def submit(self):
+        self.driver.submit(self)
+
+    def find_elements_by_xpath(self, xpath):
+        # The focused element is a descendant of the focused field
+        return [self]
+
+
+class FakeSwitchTo(object):
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    @property
+    def active_element(self):
+        return self.driver.field_element(self.driver.focus or '')
+
+
+class FakeWebDriver(object):
+    "A webdriver for a browser that is showing a Sao client."
+
+    w3c = False
+
+    def __init__(self, database='tryton', render_delay=0, settle_delay=0,
+                 seed=0):
+        self.database = database
+        self.render_delay = render_delay
+        self.settle_delay = settle_delay
+        self.random = Random(seed)
+
+        self.size = {'width': 1920, 'height': 1080}
+        self.logged_in = False
+        self.menu_active = True
+        self.menu_expanded = True
+        self.tabs = []
+        self.focus = None
+        self.selected_menu_item = None
+        self.ready_at = 0
+
+        self.screenshots = 0
+        self.switch_to = FakeSwitchTo(self)
+
+    def act(self):
+        self.ready_at = monotonic() + self.settle_delay
+
+    @property
+    def ready(self):
+        return monotonic() >= self.ready_at
+
+    def get(self, url):
+        sleep(self.render_delay)
+        self.logged_in = False
+        self.tabs = []
+
+    def submit(self, element):
+        if element.id == 'ask-dialog-entry':
+            self.logged_in = True
+            self.act()
+
+    def execute(self, command, params=None):
+        return {'value': None}
+
+    def field_element(self, name):
+        rows = self.random.randrange(1, 12)
+        return FakeElement(self, 'field-' + name, rect={
+            'x': 160, 'y': 40 * rows, 'width': 400, 'height': 30})
+
+    def execute_script(self, script, *args):
+        if 'session_loaded' in script:
+            return self.logged_in and self.ready
+        if 'count == 0' in script:
+            return not self.menu_expanded and self.ready
+        if 'collapse_children' in script:
+            self.menu_expanded = False
+            self.act()
+        elif 'removeClass("active")' in script:
+            self.menu_active = False
+            self.act()
+        elif 'expand_to_id_path' in script:
+            self.menu_active = True
+            self.selected_menu_item = args[0]
+            self.act()
+        elif 'Sao.Tab.tabs[i].close()' in script:
+            self.tabs = []
+            self.focus = None
+            self.act()
+        elif 'Sao.open_url' in script:
+            title = search(r'name="([^"]*)"', args[0])
+            self.tabs.append(unquote(title.group(1)) if title else '')
+            sleep(self.render_delay)
+            self.act()
+        elif 'state_widgets' in script:
+            return FakeElement(self, 'label-' + args[0], rect={
+                'x': 20, 'y': 40, 'width': 120, 'height': 30})
+        elif '.focus()' in script:
+            self.focus = args[0]
+            self.act()
+        elif '.widgets["' in script:
+            return self.field_element(search(r'widgets\["([^"]*)"', script)
+                                      .group(1))
+
+    def find_element_by_id(self, id):
+        return FakeElement(self, id)
+
+    def find_element_by_xpath(self, xpath):
+        if xpath == '//input[@id="database"]':
+            return FakeElement(self, 'database', attributes={
+                'readonly': 'readonly', 'value': self.database})
+        if xpath == '//select[@id="database"]':
+            return FakeElement(self, 'database-select', displayed=False)
+        if xpath == '//*[@id="menu"]/..':
+            return FakeElement(self, 'menu', attributes={
+                'class': lambda: 'active' if (
+                    self.menu_active or not self.ready) else ''})
+        if xpath == '//*[@id="tablist"]//li':
+            # Closed tabs only disappear once the page has settled
+            if self.tabs or not self.ready:
+                return FakeElement(self, 'tab')
+        elif xpath.startswith('//*[@id="tablist"]') and self.ready:
+            name = search(r'text\(\)="([^"]*)"', xpath)
+            if name and name.group(1) in self.tabs:
+                return FakeElement(self, 'tab')
+        if xpath.startswith('//tr[@') and self.selected_menu_item:
+            return FakeElement(self, 'menu-item')
+        raise NoSuchElementException(xpath)
+
+    def get_window_size(self):
+        return dict(self.size)
+
+    def set_window_size(self, width, height):
+        self.size = {'width': width, 'height': height}
+
+    def get_screenshot_as_png(self):
+        sleep(self.render_delay)
+        width, height = self.size['width'], self.size['height']
+        image = Image.new('RGB', (width, height), (245, 245, 245))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((0, 0, width, 32), fill=(38, 115, 150))
+        for y in range(48, height - 40, 40):
+            draw.rectangle((20, y, 140, y + 24), fill=(220, 220, 220))
+            draw.rectangle(
+                (160, y, 160 + self.random.randrange(100, 600), y + 24),
+                fill=(255, 255, 255), outline=(180, 180, 180))
+        screenshot = BytesIO()
+        image.save(screenshot, 'PNG')
+        self.screenshots += 1
+        return screenshot.getvalue()
+
+    def save_screenshot(self, filename):
+        Path(filename).write_bytes(self.get_screenshot_as_png())
+        return True
+
+    def quit(self):
+        pass
@@ -56,7 +56,7 @@ setup(
     ],
     license='GPL-3',
     platforms='any',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['benchmarks', 'tests']),
     namespace_packages=['sphinxcontrib'],
     include_package_data=True,
     python_requires='>=3.5',
@@ -85,5 +85,11 @@ setup(
     #         'trytond_stock_lot_sled>=5.0.0',
     #     ],
     # },
+    entry_points={
+        'console_scripts': [
+            'tryton-capture = sphinxcontrib.tryton.capture:main',
+            'tryton-service = sphinxcontrib.tryton.service:main',
+        ],
+    },
     zip_safe=False,
 )
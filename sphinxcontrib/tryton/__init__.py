@@ -1,10 +1,31 @@
 # This file is part of the sphinxcontrib-tryton extension.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
+from .capture import (
+    TrytonCaptureBuilder, get_capture_outdated_docs, merge_capture,
+    setup_capture)
+from .check import (
+    TrytonCheckBuilder, get_check_outdated_docs, merge_check, setup_check)
 from .client_sao import ClientSao
 from .client_tryton import ClientTryton
-from .domain import TrytonDomain, cleanup_stop_clients, cleanup_temp_figures
-from .trytond import Trytond, setup_env, initialise_trytond
+from .domain import (
+    TrytonDomain, WaitForFigureImages, cleanup_stop_clients,
+    cleanup_temp_figures, get_outdated_docs, merge_figure_times,
+    merge_skipped_figures, merge_temp_figures, report_skipped_figures,
+    report_slow_figures, setup_figure_times, setup_prefetch,
+    setup_skipped_figures, setup_start_pooled_clients, update_fingerprints,
+    write_lookups_manifest)
+from .inventory import (
+    load_inventories, resolve_inventory_reference, write_inventory)
+from .service import initialise_service, setup_service_clients
+from .stats import (
+    clear_rpc_document, clear_rpc_stats, merge_rpc_stats, note_rpc_document,
+    report_rpc_stats, setup_rpc_stats)
+from .trace import (
+    clear_trace, initialise_trace, merge_trace, setup_trace, write_trace)
+from .trytond import (
+    Trytond, cleanup_trytond, initialise_trytond, setup_connect, setup_env,
+    write_cached_properties, write_reader_cached_properties)
 
 version = '0.1.1'
 
@@ -13,15 +34,63 @@ def setup(app):
     ClientSao.add_config_values(app)
     ClientTryton.add_config_values(app)
     Trytond.add_config_values(app)
+    app.add_config_value('tryton_capture_workers', 1, '')
+    app.add_config_value('tryton_figure_budget', None, '')
+    app.add_config_value('tryton_figure_mode', 'capture', 'env')
+    app.add_config_value('tryton_inventory_mapping', {}, 'env')
+    app.add_config_value('tryton_service', None, '')
+    app.add_config_value('tryton_trace_file', None, '')
 
+    app.connect('config-inited', initialise_trace)
+    app.connect('config-inited', initialise_service)
     app.connect('config-inited', initialise_trytond)
+    app.connect('builder-inited', load_inventories)
+    app.connect('env-get-outdated', get_outdated_docs)
+    app.connect('env-get-outdated', get_check_outdated_docs)
+    app.connect('env-get-outdated', get_capture_outdated_docs)
+    app.connect('env-before-read-docs', setup_trace)
+    app.connect('env-before-read-docs', setup_rpc_stats)
     app.connect('env-before-read-docs', setup_env)
+    app.connect('env-before-read-docs', setup_connect)
+    app.connect('env-before-read-docs', setup_check)
+    app.connect('env-before-read-docs', setup_capture)
+    app.connect('env-before-read-docs', setup_prefetch)
+    app.connect('env-before-read-docs', setup_skipped_figures)
+    app.connect('env-before-read-docs', setup_figure_times)
+    app.connect('env-before-read-docs', setup_service_clients)
+    app.connect('env-before-read-docs', setup_start_pooled_clients)
+    app.connect('source-read', note_rpc_document)
+    app.connect('doctree-read', clear_rpc_document)
+    app.connect('doctree-read', write_reader_cached_properties)
+    app.connect('env-merge-info', merge_check)
+    app.connect('env-merge-info', merge_capture)
+    app.connect('env-merge-info', merge_skipped_figures)
+    app.connect('env-merge-info', merge_figure_times)
+    app.connect('env-merge-info', merge_temp_figures)
+    app.connect('env-merge-info', merge_rpc_stats)
+    app.connect('env-merge-info', merge_trace)
+    app.connect('env-updated', report_skipped_figures)
+    app.connect('env-updated', report_slow_figures)
+    app.connect('env-updated', update_fingerprints)
+    app.connect('env-updated', write_lookups_manifest)
+    app.connect('env-updated', write_cached_properties)
+    app.connect('env-updated', clear_trace)
+    app.connect('env-updated', clear_rpc_stats)
+    app.connect('missing-reference', resolve_inventory_reference)
     app.connect('build-finished', cleanup_stop_clients)
     app.connect('build-finished', cleanup_temp_figures)
+    app.connect('build-finished', report_rpc_stats)
+    app.connect('build-finished', cleanup_trytond)
+    app.connect('build-finished', write_inventory)
+    app.connect('build-finished', write_trace)
 
+    app.add_builder(TrytonCaptureBuilder)
+    app.add_builder(TrytonCheckBuilder)
     app.add_domain(TrytonDomain)
+    app.add_transform(WaitForFigureImages)
 
     return {
         'version': version,
-        'env_version': 1,
+        'env_version': 5,
+        'parallel_read_safe': True,
         }
@@ -0,0 +1,100 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from json import dumps, loads
+from os import getpid
+from sphinx.util import logging
+from sqlite3 import Error as SQLiteError, connect
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_TYPES = (bool, float, int, str, type(None))
+
+
+class MetadataCache(object):
+    "A cache of trytond metadata that can be shared by several builds."
+
+    batch_size = 500
+
+    def __init__(self, filename, namespace, timeout=60):
+        self.filename = str(filename)
+        self.namespace = namespace
+        self.timeout = timeout
+        self.disabled = False
+
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
+
+    @property
+    def connection(self):
+        # SQLite connections must not be shared with forked processes
+        if self._pid != getpid():
+            self._connection = connect(
+                self.filename, timeout=self.timeout, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS metadata ('
+                'namespace TEXT NOT NULL, '
+                'key TEXT NOT NULL, '
+                'validator TEXT NOT NULL, '
+                'value TEXT, '
+                'PRIMARY KEY (namespace, key))')
+            self._pid = getpid()
+        return self._connection
+
+    def disable(self, err):
+        self.disabled = True
+        logger.warning(
+            "tryton metadata cache {filename} disabled: {error}".format(
+                filename=self.filename, error=repr(err)))
+
+    def get_many(self, keys, validator):
+        keys = {dumps(list(k)): k for k in keys}
+        if self.disabled or not keys or validator is None:
+            return {}
+
+        result = {}
+        names = list(keys)
+        try:
+            for i in range(0, len(names), self.batch_size):
+                batch = names[i:i + self.batch_size]
+                rows = self.connection.execute(
+                    'SELECT key, value FROM metadata '
+                    'WHERE namespace = ? AND validator = ? '
+                    'AND key IN ({params})'.format(
+                        params=', '.join('?' * len(batch))),
+                    [self.namespace, validator] + batch)
+                for name, value in rows:
+                    result[keys[name]] = loads(value)
+        except SQLiteError as err:
+            self.disable(err)
+            return {}
+        return result
+
+    def set_many(self, items, validator):
+        rows = [
+            (self.namespace, dumps(list(k)), validator, dumps(v))
+            for k, v in items.items() if isinstance(v, CACHEABLE_TYPES)]
+        if self.disabled or not rows or validator is None:
+            return
+
+        try:
+            connection = self.connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO metadata '
+                    '(namespace, key, validator, value) VALUES (?, ?, ?, ?)',
+                    rows)
+            except SQLiteError:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        except SQLiteError as err:
+            self.disable(err)
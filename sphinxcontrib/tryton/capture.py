@@ -0,0 +1,220 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from argparse import ArgumentParser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from queue import Queue
+from sphinx.builders import Builder
+from sphinx.cmd.build import build_main
+from sphinx.util import logging
+
+from .client import Client, figure_timer, get_image_writer
+from .domain import capture_figure, get_figure_targets
+from .stats import rpc_phase
+from .trace import trace_span
+
+logger = logging.getLogger(__name__)
+
+
+class TrytonCaptureBuilder(Builder):
+    "Captures the images of the tryton figures that are missing or outdated."
+
+    name = 'tryton-capture'
+    epilog = 'The images of the tryton figures have been captured.'
+
+    def init(self):
+        pass
+
+    def get_outdated_docs(self):
+        return self.env.found_docs
+
+    def get_target_uri(self, docname, typ=None):
+        return ''
+
+    def prepare_writing(self, docnames):
+        pass
+
+    def write_doc(self, docname, doctree):
+        pass
+
+    def write(self, build_docnames, updated_docnames, method='update'):
+        with rpc_phase(self.app, 'capture'):
+            self.capture_figures()
+
+    def capture_figures(self):
+        # Figures that share an image only need to be captured once
+        figures = OrderedDict()
+        for docname, lineno, client, options, filename in (
+                self.env.tryton_capture or []):
+            figures.setdefault(filename, (docname, lineno, client, options))
+
+        # The server is only used from this thread, so everything that is
+        # shown in the figures is looked up before they are captured
+        pending = OrderedDict()
+        failed = 0
+        for filename, (docname, lineno, client, options) in figures.items():
+            try:
+                targets = get_figure_targets(self.env.trytond, options)
+            except Exception as err:
+                logger.warning(
+                    "tryton figure could not be captured: {error}".format(
+                        error=repr(err)),
+                    location=(docname, lineno))
+                failed += 1
+                continue
+            pending.setdefault(client, []).append(
+                (filename, (docname, lineno), options, targets))
+
+        captured = 0
+        for name, client_figures in pending.items():
+            clients = self.start_clients(name)
+            if not clients:
+                logger.warning(
+                    "client '{client}' is not available - {count} image(s) "
+                    "could not be created".format(
+                        client=name, count=len(client_figures)))
+                failed += len(client_figures)
+                continue
+            try:
+                count = self.capture(clients, client_figures)
+            finally:
+                for client in clients:
+                    client.stop()
+            captured += count
+            failed += len(client_figures) - count
+
+        logger.info(
+            "captured {captured} tryton figure(s), {failed} failed".format(
+                captured=captured, failed=failed))
+
+    def start_clients(self, name):
+        for TrytonClient in Client.__subclasses__():
+            if TrytonClient.__name__.lower() == name:
+                break
+        else:
+            return []
+
+        size = max(int(self.config.tryton_capture_workers), 1)
+        configs = TrytonClient.get_pool_config(
+            TrytonClient.get_config(self.config), size)
+        clients = [TrytonClient(**c) for c in configs]
+        return [c for c in clients if c.ensure_started()]
+
+    def capture(self, clients, figures):
+        "Captures the figures using the clients, and returns the number done."
+        available = Queue()
+        for client in clients:
+            available.put(client)
+        budget = self.config.tryton_figure_budget
+
+        def capture_image(figure):
+            filename, location, options, targets = figure
+            client = available.get()
+            try:
+                with trace_span(
+                        'figure', 'figure', document=location[0],
+                        line=location[1], view=options.get('view')), \
+                        client.acquire(), figure_timer(budget):
+                    capture_figure(client, options, targets, filename)
+            except Exception as err:
+                logger.warning(
+                    "tryton figure could not be captured: {error}".format(
+                        error=repr(err)),
+                    location=location)
+                return False
+            finally:
+                available.put(client)
+            return True
+
+        with ThreadPoolExecutor(len(clients)) as executor:
+            captured = [
+                f for f, done in zip(
+                    figures, executor.map(capture_image, figures)) if done]
+
+        # The images are written in the background while the clients capture
+        # the next figures
+        failed = get_image_writer().wait([str(f[0]) for f in captured])
+        for filename, location, _, _ in captured:
+            if str(filename) in failed:
+                logger.warning(
+                    "tryton figure could not be written: {error}".format(
+                        error=repr(failed[str(filename)])),
+                    location=location)
+        return len(captured) - len(failed)
+
+    def finish(self):
+        pass
+
+
+def setup_capture(app, env, docnames):
+    # Documents read while capturing do not contain their figures, so other
+    # builders must read them again
+    capturing = app.builder.name == TrytonCaptureBuilder.name
+    env.tryton_capture = [] if capturing else None
+    capture_docs = getattr(env, 'tryton_capture_docs', set())
+    if capturing:
+        capture_docs.update(docnames)
+    else:
+        capture_docs.difference_update(docnames)
+    env.tryton_capture_docs = capture_docs
+
+
+def merge_capture(app, env, docnames, other):
+    if env.tryton_capture is not None:
+        env.tryton_capture.extend(other.tryton_capture or [])
+
+
+def get_capture_outdated_docs(app, env, added, changed, removed):
+    if app.builder.name == TrytonCaptureBuilder.name:
+        return list(env.found_docs)
+    return list(getattr(env, 'tryton_capture_docs', set()) & env.found_docs)
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        prog='tryton-capture',
+        description="Captures the images of the tryton figures in a Sphinx "
+        "project that are missing or outdated.")
+    parser.add_argument('sourcedir')
+    parser.add_argument(
+        'outputdir', nargs='?',
+        help="the output directory of the build, defaults to "
+        "_build/tryton-capture in the source directory")
+    parser.add_argument(
+        '-d', dest='doctreedir',
+        help="the doctree directory of the build, whose environment is "
+        "updated, defaults to .doctrees in the output directory")
+    parser.add_argument(
+        '-w', '--workers', type=int, default=1,
+        help="the number of clients used to capture the figures")
+    parser.add_argument(
+        '-c', dest='confdir', help="the directory containing conf.py")
+    parser.add_argument(
+        '-D', dest='define', action='append', default=[],
+        metavar='setting=value', help="override a setting in conf.py")
+    parser.add_argument(
+        '-W', dest='warningiserror', action='store_true',
+        help="turn warnings into errors")
+    args = parser.parse_args(argv)
+
+    outputdir = args.outputdir
+    if outputdir is None:
+        outputdir = str(Path(args.sourcedir) / '_build' / 'tryton-capture')
+    # The capture must update the fingerprints that the build compares the
+    # server's objects to, or the build would capture the images again
+    doctreedir = args.doctreedir
+    if doctreedir is None:
+        doctreedir = str(Path(outputdir) / '.doctrees')
+
+    sphinx_args = [
+        '-b', TrytonCaptureBuilder.name, '-d', doctreedir,
+        '-D', 'tryton_capture_workers={}'.format(args.workers)]
+    for define in args.define:
+        sphinx_args.extend(['-D', define])
+    if args.confdir:
+        sphinx_args.extend(['-c', args.confdir])
+    if args.warningiserror:
+        sphinx_args.append('-W')
+    return build_main(sphinx_args + [args.sourcedir, outputdir])
@@ -0,0 +1,127 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from json import dump
+from pathlib import Path
+from sphinx.builders import Builder
+from sphinx.util import logging
+
+from .exception import RecordNotFoundError
+from .stats import rpc_phase
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILENAME = 'tryton-check.json'
+
+# Figures refer to their views by the view's xml id
+CHECK_TYPES = {'view': 'data'}
+
+
+class TrytonCheckBuilder(Builder):
+    "Checks the tryton objects used by the documentation exist."
+
+    name = 'tryton-check'
+    epilog = (
+        'Look for any missing tryton objects in the above output or in '
+        '%(outdir)s/' + REPORT_FILENAME + '.')
+
+    def init(self):
+        pass
+
+    def get_outdated_docs(self):
+        return self.env.found_docs
+
+    def get_target_uri(self, docname, typ=None):
+        return ''
+
+    def prepare_writing(self, docnames):
+        pass
+
+    def write_doc(self, docname, doctree):
+        pass
+
+    def write(self, build_docnames, updated_docnames, method='update'):
+        lookups = self.env.tryton_check or []
+        targets = set(
+            (CHECK_TYPES.get(t, t), n, p) for _, _, t, n, p in lookups)
+
+        trytond = self.app.trytond
+        resolved = {}
+        with rpc_phase(self.app, 'check'):
+            trytond.prefetch(targets)
+            for target in targets:
+                try:
+                    resolved[target] = trytond.get_property(*target)
+                except RecordNotFoundError:
+                    resolved[target] = None
+
+        # Nothing is found while the server cannot be reached, which does
+        # not mean the objects are missing
+        health = getattr(trytond, 'health', None)
+        if health is not None and not health.is_available:
+            logger.error(
+                "trytond server could not be reached - the tryton objects "
+                "were not checked")
+            self.write_report(0, [], unreachable=True)
+            return
+
+        missing = []
+        for docname, lineno, type_, target, property in sorted(
+                lookups, key=lambda i: (i[0], i[1] or 0, str(i[2:]))):
+            if resolved[(CHECK_TYPES.get(type_, type_), target, property)]:
+                continue
+            logger.warning(
+                "{type_} {target} not found in Tryton.".format(
+                    type_=type_, target=target),
+                location=(docname, lineno))
+            missing.append({
+                'document': docname,
+                'source': self.env.doc2path(docname),
+                'line': lineno,
+                'type': type_,
+                'target': target,
+                'property': property,
+                })
+
+        self.write_report(len(targets), missing)
+
+    def write_report(self, checked, missing, unreachable=False):
+        report = {
+            'checked': checked,
+            'missing': missing,
+            'server_unreachable': unreachable,
+            }
+        with (Path(self.outdir) / REPORT_FILENAME).open(
+                'w', encoding='utf-8') as file:
+            dump(report, file, indent=1, sort_keys=True)
+
+        logger.info(
+            "checked {checked} tryton objects, {missing} missing".format(
+                checked=checked, missing=len(missing)))
+
+    def finish(self):
+        pass
+
+
+def setup_check(app, env, docnames):
+    # Documents read while checking only contain placeholder titles, so
+    # other builders must read them again
+    checking = app.builder.name == TrytonCheckBuilder.name
+    env.tryton_check = [] if checking else None
+    check_docs = getattr(env, 'tryton_check_docs', set())
+    if checking:
+        check_docs.update(docnames)
+    else:
+        check_docs.difference_update(docnames)
+    env.tryton_check_docs = check_docs
+
+
+def merge_check(app, env, docnames, other):
+    if env.tryton_check is not None:
+        env.tryton_check.extend(other.tryton_check or [])
+
+
+def get_check_outdated_docs(app, env, added, changed, removed):
+    if app.builder.name == TrytonCheckBuilder.name:
+        return list(env.found_docs)
+    return list(getattr(env, 'tryton_check_docs', set()) & env.found_docs)
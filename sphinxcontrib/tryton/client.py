@@ -1,13 +1,175 @@
 # This file is part of the sphinxcontrib-tryton extension.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from inspect import getmembers, isfunction
+from os import getpid
+from sphinx.util import logging
+from threading import Lock, local
+from time import monotonic
+
+from .exception import ClientBudgetExceededError
+from .trace import trace_span
 
 
 Area = namedtuple('Area', ('x', 'y', 'width', 'height'))
 Size = namedtuple('Size', ('width', 'height'))
 
+logger = logging.getLogger(__name__)
+
+_current = local()
+
+
+class ClientHealth(object):
+    "The health of a client, based on its failures to start."
+
+    def __init__(self, name, start_attempts, start_backoff):
+        self.name = name
+        self.start_attempts = start_attempts
+        self.start_backoff = start_backoff
+
+        self.failures = 0
+        self.retry_time = 0
+
+    @property
+    def state(self):
+        if self.failures >= self.start_attempts:
+            return 'disabled'
+        if self.failures and monotonic() < self.retry_time:
+            return 'waiting'
+        return 'ready'
+
+    def can_start(self):
+        return self.state == 'ready'
+
+    def record_success(self):
+        self.failures = 0
+        self.retry_time = 0
+
+    def record_failure(self):
+        self.failures += 1
+        self.retry_time = (
+            monotonic() + self.start_backoff * 2 ** (self.failures - 1))
+
+        if self.state == 'disabled':
+            logger.warning(
+                "{name} client disabled after {failures} failed attempts "
+                "to start it".format(name=self.name, failures=self.failures))
+
+
+class FigureTimer(object):
+    "The time taken to capture a figure, and the waits that took it."
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.start = monotonic()
+        self.waits = {}
+
+    @property
+    def elapsed(self):
+        return monotonic() - self.start
+
+    @property
+    def exceeded(self):
+        return self.budget is not None and self.elapsed > self.budget
+
+    def check(self):
+        if self.exceeded:
+            raise ClientBudgetExceededError(
+                "figure took longer than {budget}s".format(
+                    budget=self.budget))
+
+    def get_timeout(self, timeout):
+        if self.budget is None:
+            return timeout
+        return max(min(timeout, self.budget - self.elapsed), 0)
+
+    def add_wait(self, name, duration):
+        self.waits[name] = self.waits.get(name, 0) + duration
+
+    @property
+    def longest_wait(self):
+        if self.waits:
+            return max(self.waits.items(), key=lambda w: w[1])
+
+
+@contextmanager
+def figure_timer(budget=None):
+    timer = FigureTimer(budget)
+    previous, _current.timer = getattr(_current, 'timer', None), timer
+    try:
+        yield timer
+    finally:
+        _current.timer = previous
+
+
+@contextmanager
+def timed_wait(name, timeout):
+    # Waits are limited to what is left of the current figure's budget
+    timer = getattr(_current, 'timer', None)
+    if timer is None:
+        yield timeout
+        return
+
+    timer.check()
+    start = monotonic()
+    try:
+        yield timer.get_timeout(timeout)
+    finally:
+        timer.add_wait(name, monotonic() - start)
+    timer.check()
+
+
+class ImageWriter(object):
+    """Crops and writes the images captured by the clients in other threads,
+    so the clients can move on to the next figure in the meantime.
+    """
+
+    def __init__(self, workers=None):
+        self.executor = ThreadPoolExecutor(workers)
+        self.lock = Lock()
+        self.pending = OrderedDict()
+        self.pid = getpid()
+
+    def submit(self, filename, function, *args):
+        "Runs the function to write the image to the file."
+        with self.lock:
+            previous = self.pending.pop(filename, None)
+        # Figures can share an image, so it is only written once at a time
+        if previous:
+            wait([previous])
+        future = self.executor.submit(function, *args)
+        with self.lock:
+            self.pending[filename] = future
+        return future
+
+    def wait(self, filenames=None):
+        "Waits for the images to be written, and returns those that failed."
+        with self.lock:
+            if filenames is None:
+                filenames = list(self.pending)
+            futures = OrderedDict(
+                (f, self.pending.pop(f)) for f in filenames
+                if f in self.pending)
+
+        failed = OrderedDict()
+        for filename, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                failed[filename] = error
+        return failed
+
+
+def get_image_writer():
+    global _tryton_image_writer
+    # Parallel readers cannot use the threads of the process they forked from
+    writer = globals().get('_tryton_image_writer')
+    if writer is None or writer.pid != getpid():
+        writer = _tryton_image_writer = ImageWriter()
+    return writer
+
 
 class Client(object):
 
@@ -18,6 +180,8 @@ class Client(object):
         ('host', None),
         ('password', None),
         ('port', None),
+        ('start_attempts', 3),
+        ('start_backoff', 10),
         ('timeout', 60),
         ('user', None),
         ]
@@ -29,7 +193,8 @@ class Client(object):
         ]
 
     def __init__(self, host, user, password, database, port, timeout,
-                 default_size, force_update, **kwargs):
+                 default_size, force_update, start_attempts=3,
+                 start_backoff=10, **kwargs):
         self.database = database
         self.host = host
         self.user = user
@@ -41,6 +206,8 @@ class Client(object):
         self.force_update = force_update
 
         self.client_apply_method = ClientApplyMethod
+        self.health = ClientHealth(
+            self.config_prefix, int(start_attempts), float(start_backoff))
 
         self.client = None
 
@@ -57,6 +224,10 @@ class Client(object):
     def is_available(self):
         return self.client is not None
 
+    @property
+    def is_pooled(self):
+        return False
+
     @classmethod
     def add_config_values(cls, app):
         for name, default in cls.config_options:
@@ -70,7 +241,7 @@ class Client(object):
         client_template = cls.config_prefix + '_{option}'
         trytond_template = 'trytond_{option}'
 
-        for option, _ in cls.config_options:
+        for option, default in cls.config_options:
             client_opt = client_template.format(option=option)
             trytond_opt = trytond_template.format(option=option)
 
@@ -78,9 +249,16 @@ class Client(object):
                 result[option] = config[client_opt]
             elif trytond_opt in config and config[trytond_opt] is not None:
                 result[option] = config[trytond_opt]
+            else:
+                result[option] = default
 
         return result
 
+    @classmethod
+    def get_pool_config(cls, config, size):
+        "Returns the configuration for each client in a pool of clients."
+        return [config] * size
+
     @classmethod
     def is_configured(cls, config):
         client_template = cls.config_prefix + '_{option}'
@@ -96,6 +274,24 @@ class Client(object):
 
         return True
 
+    @contextmanager
+    def acquire(self):
+        yield self
+
+    def ensure_started(self):
+        if self.is_available:
+            return True
+        if not self.health.can_start():
+            return False
+
+        with trace_span('start', 'client', client=self.config_prefix):
+            self.start()
+        if self.is_available:
+            self.health.record_success()
+        else:
+            self.health.record_failure()
+        return self.is_available
+
     def start(self):
         pass
 
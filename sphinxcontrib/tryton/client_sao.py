@@ -2,30 +2,61 @@
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
 from functools import partial
+from io import BytesIO
 from sphinx.util import logging
 from urllib.parse import quote
 
-from .client import Area, AsyncClient, Client, Size
+from .client import (
+    Area, AsyncClient, Client, Size, get_image_writer, timed_wait)
 from .exception import ClientLoginError, ClientWebDriverError
+from .trace import trace_span
 
-try:
-    from PIL import Image
-except ImportError:
-    Image = None
-
-try:
-    from selenium import webdriver
-    from selenium.webdriver.support.ui import Select
-    from selenium.webdriver.support.wait import WebDriverWait
-    from selenium.webdriver.common.action_chains import ActionChains
-except ImportError:
-    webdriver = None
+ActionChains = Image = Select = WebDriverWait = webdriver = None
 
 logger = logging.getLogger(__name__)
 
 SUPPORTED_BROWSERS = ['Firefox']
 
 
+def import_webdriver():
+    # PIL and selenium are slow to import, so they are only imported once a
+    # sao client is actually started
+    global ActionChains, Image, Select, WebDriverWait, webdriver
+
+    if Image is None:
+        try:
+            from PIL import Image
+        except ImportError:
+            pass
+
+    if webdriver is None:
+        try:
+            from selenium import webdriver
+            from selenium.webdriver.support.ui import Select
+            from selenium.webdriver.support.wait import WebDriverWait
+            from selenium.webdriver.common.action_chains import ActionChains
+        except ImportError:
+            pass
+
+
+def write_image(screenshot, filename, area):
+    "Crops the screenshot to the area, and writes it to the file."
+    with trace_span('crop', 'figure'):
+        image = Image.open(BytesIO(screenshot))
+
+        x, y, width, height = area
+        image_width, image_height = image.size
+        if x + width > image_width:
+            width = image_width - x
+        if y + height > image_height:
+            height = image_height - y
+
+        image = image.crop((x, y, x + width, y + height))
+
+    with trace_span('encode', 'figure'):
+        image.save(filename, optimize=True)
+
+
 class ClientSao(Client, AsyncClient):
 
     config_options = Client.config_options.copy()
@@ -70,6 +101,7 @@ class ClientSao(Client, AsyncClient):
         self.client = None
 
     def get_webdriver(self, browser):
+        import_webdriver()
         if Image is None:
             raise ClientWebDriverError("pillow not available")
 
@@ -88,6 +120,10 @@ class ClientSao(Client, AsyncClient):
         return WebDriver()
 
     def login(self):
+        with trace_span('login', 'client', client=self.config_prefix):
+            self._login()
+
+    def _login(self):
         self.browser.get_url(self.get_base_url())
 
         database = self.browser.get_database_field()
@@ -153,17 +189,13 @@ class ClientSao(Client, AsyncClient):
         self.browser.set_window_size(width, height)
 
     def capture_image(self, filename, x, y, width, height):
-        self.browser.save_screenshot(filename)
-        image = Image.open(filename)
+        with trace_span('screenshot', 'figure'):
+            screenshot = self.browser.get_screenshot()
 
-        image_width, image_height = image.size
-        if x + width > image_width:
-            width = image_width - x
-        if y + height > image_height:
-            height = image_height - y
-
-        image = image.crop((x, y, x + width, y + height))
-        image.save(filename)
+        # The image is written while the browser moves on to the next figure
+        get_image_writer().submit(
+            filename, write_image, screenshot, filename,
+            Area(x, y, width, height))
 
     def open_view(self, model, title, view_id=None, record_id=None,
                   domain=None):
@@ -207,6 +239,13 @@ class Browser(object):
     def get_url(self, url):
         self.webdriver.get(url)
 
+    def wait(self, name, condition, message, until_not=False):
+        with timed_wait(name, self.timeout) as timeout:
+            wait = WebDriverWait(self.webdriver, timeout)
+            if until_not:
+                return wait.until_not(condition, message)
+            return wait.until(condition, message)
+
     @staticmethod
     def element_is_active(element, webdriver):
         return 'active' in element.get_attribute('class')
@@ -276,12 +315,14 @@ class Browser(object):
             '//*[@id="tablist"]//*[text()="{name}"]'.format(name=name))
 
     def get_database_field(self):
-        return WebDriverWait(self.webdriver, self.timeout).until(
+        return self.wait(
+            'get_database_field',
             self.find_database_field,
             "timed out waiting for the database field")
 
     def get_element_with_attribute(self, attribute, value):
-        return WebDriverWait(self.webdriver, self.timeout).until(
+        return self.wait(
+            'get_element_with_attribute',
             partial(self.find_element_with_attribute, attribute, value),
             "timed out waiting for the element with "
             "{attribute}='{value}'.".format(attribute=attribute, value=value))
@@ -304,17 +345,20 @@ class Browser(object):
             field)
 
     def get_login_field(self):
-        return WebDriverWait(self.webdriver, self.timeout).until(
+        return self.wait(
+            'get_login_field',
             self.find_login_field,
             "timed out waiting for the login field")
 
     def get_password_field(self):
-        return WebDriverWait(self.webdriver, self.timeout).until(
+        return self.wait(
+            'get_password_field',
             self.find_password_field,
             "timed out waiting for the password field")
 
     def get_selected_menu_item(self):
-        return WebDriverWait(self.webdriver, self.timeout).until(
+        return self.wait(
+            'get_selected_menu_item',
             self.find_selected_menu_item,
             "timed out waiting for the selected menu item")
 
@@ -400,8 +444,8 @@ class Browser(object):
             'arguments[0].removeAttribute(arguments[1]);',
             element, attribute)
 
-    def save_screenshot(self, filename):
-        self.webdriver.save_screenshot(filename)
+    def get_screenshot(self):
+        return self.webdriver.get_screenshot_as_png()
 
     def select_element(self, element):
         ActionChains(self.webdriver).move_to_element(element).perform()
@@ -435,32 +479,40 @@ class Browser(object):
 
     def wait_for_focus_on_field(self, name):
         field = self.get_field_element(name)
-        WebDriverWait(self.webdriver, self.timeout).until(
+        self.wait(
+            'wait_for_focus_on_field',
             partial(self.element_is_ancestor_of_focus, field),
             "timed out waiting for the field to be selected")
 
     def wait_for_login_to_complete(self):
-        WebDriverWait(self.webdriver, self.timeout).until(
+        self.wait(
+            'wait_for_login_to_complete',
             self.login_complete,
             "timed out waiting for the login to complete")
 
     def wait_for_main_menu_items_to_collapse(self):
-        WebDriverWait(self.webdriver, self.timeout).until(
+        self.wait(
+            'wait_for_main_menu_items_to_collapse',
             self.main_menu_items_collapsed,
             "timed out waiting for all the main menu items to collapse")
 
     def wait_for_main_menu_to_hide(self):
         main_menu = self.webdriver.find_element_by_xpath('//*[@id="menu"]/..')
-        WebDriverWait(self.webdriver, self.timeout).until_not(
+        self.wait(
+            'wait_for_main_menu_to_hide',
             partial(self.element_is_active, main_menu),
-            "timed out waiting for the main menu to be hidden")
+            "timed out waiting for the main menu to be hidden",
+            until_not=True)
 
     def wait_for_view_to_open(self, name):
-        WebDriverWait(self.webdriver, self.timeout).until(
+        self.wait(
+            'wait_for_view_to_open',
             partial(self.view_open, name),
             "timed out waiting for the view to open")
 
     def wait_for_windows_to_close(self):
-        WebDriverWait(self.webdriver, self.timeout).until_not(
+        self.wait(
+            'wait_for_windows_to_close',
             self.find_windows,
-            "timed out waiting for the windows to close")
+            "timed out waiting for the windows to close",
+            until_not=True)
@@ -1,15 +1,20 @@
 # This file is part of the sphinxcontrib-tryton extension.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
-from os import environ
+from contextlib import contextmanager
+from itertools import count
+from multiprocessing import Pipe, Process, Queue
+from os import environ, getpid
+from queue import Empty
 from sphinx.util import logging
 from threading import Event, Thread
-from time import sleep
+from time import monotonic, sleep
 from types import MethodType
 from urllib.parse import quote
 
-from .client import Area, AsyncClient, Client, ClientApplyMethod, Size
-from .exception import ClientLoginError, ClientTimeoutError
+from .client import (
+    Area, AsyncClient, Client, ClientApplyMethod, Size, timed_wait)
+from .exception import ClientError, ClientLoginError, ClientTimeoutError
 
 logger = logging.getLogger(__name__)
 
@@ -21,14 +26,38 @@ def wait_for_gtk_main_loop():
 
 class ClientTryton(Client):
 
+    config_options = Client.config_options.copy()
+    config_options += [
+        ('displays', None)]
     config_prefix = 'tryton'
 
-    def __init__(self, **kwargs):
+    def __init__(self, displays=None, **kwargs):
         super().__init__(**kwargs)
         self.client_apply_method = TrytonApplyMethod
         self.kwargs = kwargs
 
+        if isinstance(displays, str):
+            displays = displays.replace(',', ' ').split()
+        self.displays = displays
+        self.pool = []
+        self.pool_queue = None
+        self.pool_pid = None
+
+    @classmethod
+    def get_pool_config(cls, config, size):
+        # The desktop client can only be run once on each display
+        displays = config.get('displays')
+        if isinstance(displays, str):
+            displays = displays.replace(',', ' ').split()
+        if not displays:
+            return [config]
+        return [dict(config, displays=[d]) for d in displays[:size]]
+
     def start(self):
+        if self.displays:
+            self.start_pool()
+            return
+
         try:
             startup_event = Event()
             self.client = Tryton(startup_event=startup_event, **self.kwargs)
@@ -46,18 +75,95 @@ class ClientTryton(Client):
                 "tryton screenshots disabled: {err}".format(err=repr(err)))
             self.stop()
 
+    def start_pool(self):
+        if self.pool:
+            self.stop()
+
+        try:
+            self.client_apply_method = ClientApplyMethod
+            processes = [
+                TrytonProcess(display=display, **self.kwargs)
+                for display in self.displays]
+            for process in processes:
+                process.start()
+
+            self.pool = [p for p in processes if p.wait_for_startup()]
+            if not self.pool:
+                raise ClientLoginError(
+                    "no tryton clients could be started on {displays}".format(
+                        displays=', '.join(self.displays)))
+
+            self.pool_queue = Queue()
+            for index in range(len(self.pool)):
+                self.pool_queue.put(index)
+            self.pool_pid = getpid()
+            self.client = self.pool[0]
+
+        except Exception as err:
+            logger.warning(
+                "tryton screenshots disabled: {err}".format(err=repr(err)))
+            self.stop()
+
     def stop(self):
+        for client in (self.pool or [self.client]):
+            try:
+                client.quit()
+            except Exception as err:
+                logger.warning("error quitting client: {err}".format(
+                    err=repr(err)))
+        self.pool = []
+        self.pool_queue = None
+        self.client = None
+
+    @contextmanager
+    def acquire(self):
+        if not self.pool:
+            yield self
+            return
+
+        if not self.is_available:
+            raise ClientError("no tryton clients are left in the pool")
+        try:
+            index = self.pool_queue.get(timeout=self.timeout)
+        except Empty:
+            raise ClientTimeoutError(
+                "timed out waiting for a free tryton client")
+
+        client = self.client = self.pool[index]
+        try:
+            yield self
+        finally:
+            # A client that stopped responding may still send the reply it
+            # was waiting for, so it is not used again
+            if client.is_alive():
+                self.pool_queue.put(index)
+            else:
+                self.remove_from_pool(client)
+
+    def remove_from_pool(self, client):
+        logger.warning(
+            "tryton client on display {display} stopped responding - "
+            "removed from the pool".format(display=client.display))
+        # Only the process that started the client can end it, parallel
+        # readers just stop using it, and it is stopped with the pool
+        if getpid() != self.pool_pid:
+            return
         try:
-            self.client.quit()
+            client.terminate()
         except Exception as err:
             logger.warning("error quitting client: {err}".format(
                 err=repr(err)))
-        self.client = None
 
     @property
     def is_available(self):
+        if self.pool:
+            return any(c.is_alive() for c in self.pool)
         return super().is_available and self.client.is_alive()
 
+    @property
+    def is_pooled(self):
+        return bool(self.displays)
+
 
 class TrytonApplyMethod(ClientApplyMethod):
 
@@ -70,7 +176,9 @@ class TrytonApplyMethod(ClientApplyMethod):
         if self.result is None:
             return
 
-        if not self.result.wait(self.timeout):
+        with timed_wait(self.name, self.timeout) as timeout:
+            returned = self.result.wait(timeout)
+        if not returned:
             raise ClientTimeoutError(
                 "timed out waiting for {method} to return".format(
                     method=self.name))
@@ -331,3 +439,111 @@ class Tryton(Thread, AsyncClient):
         self.main.window.hide()
         self.tryton.rpc.logout()
         self.main.quit()
+
+
+class TrytonProcess(object):
+    "A Tryton client that runs in its own process on a separate X display."
+
+    def __init__(self, display, timeout, **kwargs):
+        self.display = display
+        self.timeout = timeout
+        self.running = False
+        self.request_ids = count()
+
+        self.connection, child_connection = Pipe()
+        self.process = Process(
+            target=run_tryton_process,
+            args=(child_connection, display, timeout, kwargs),
+            daemon=True)
+
+    def start(self):
+        self.process.start()
+
+    def wait_for_startup(self):
+        # Allow the client process to report its own startup timeout
+        if self.connection.poll(self.timeout + 1):
+            self.running = self.connection.recv()
+        if not self.running:
+            logger.warning(
+                "tryton client on display {display} could not be "
+                "started".format(display=self.display))
+        return self.running
+
+    def is_alive(self):
+        return self.running
+
+    def apply_method(self, name, result, args, kwargs):
+        # The pipe is shared by the parallel readers, so each request has an
+        # id that is unique across the forked processes
+        request_id = (getpid(), next(self.request_ids))
+        self.connection.send((request_id, name, args, kwargs))
+        with timed_wait(name, self.timeout) as timeout:
+            reply = self.receive(request_id, timeout)
+        if reply is None:
+            # Only a wait that was not cut short by the figure's budget means
+            # the client has stopped responding
+            if timeout >= self.timeout:
+                self.running = False
+            raise ClientTimeoutError(
+                "timed out waiting for {method} to return".format(
+                    method=name))
+
+        success, value = reply
+        if not success:
+            raise value
+        if result:
+            result.value = value
+
+    def receive(self, request_id, timeout):
+        # The replies to requests that were abandoned once a figure ran over
+        # its budget, by this or another reader, are discarded
+        deadline = monotonic() + timeout
+        while self.connection.poll(max(deadline - monotonic(), 0)):
+            reply_id, success, value = self.connection.recv()
+            if reply_id == request_id:
+                return success, value
+
+    def terminate(self):
+        self.running = False
+        self.process.terminate()
+        self.process.join(self.timeout)
+
+    def quit(self):
+        try:
+            if self.running:
+                self.apply_method('quit', None, (), {})
+        finally:
+            self.running = False
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(self.timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+
+
+def run_tryton_process(connection, display, timeout, client_kwargs):
+    environ['DISPLAY'] = display
+
+    startup_event = Event()
+    client = Tryton(startup_event=startup_event, **client_kwargs)
+    client.start()
+
+    started = startup_event.wait(timeout=timeout)
+    if started:
+        wait_for_gtk_main_loop()
+        started = client.is_alive()
+    connection.send(started)
+
+    while started:
+        request = connection.recv()
+        if request is None:
+            break
+
+        request_id, name, args, kwargs = request
+        method = TrytonApplyMethod(name=name, client=client, timeout=timeout)
+        try:
+            connection.send((request_id, True, method(*args, **kwargs)))
+        except Exception as err:
+            connection.send((request_id, False, ClientError(repr(err))))
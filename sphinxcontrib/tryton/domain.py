@@ -2,32 +2,208 @@
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
 from collections import OrderedDict
-from docutils.parsers.rst.directives import positive_int, unchanged, uri
+from docutils.parsers.rst.directives import (
+    choice, positive_int, unchanged, uri)
 from docutils.parsers.rst.directives.images import Figure
 from hashlib import sha1
+from json import dump, load
 from pathlib import Path
+from re import fullmatch
 from shutil import rmtree
 from sphinx import addnodes
 from sphinx.directives import ObjectDescription
 from sphinx.domains import Domain, ObjType
 from sphinx.locale import _
 from sphinx.roles import XRefRole
+from sphinx.transforms import SphinxTransform
 from sphinx.util import logging
 from sphinx.util.docutils import SphinxRole
 from sphinx.util.nodes import make_refnode
 from tempfile import mkdtemp
 from time import sleep
+from xml.sax.saxutils import escape
 
-from .client import Area, Client
-from .exception import RecordNotFoundError
+from .client import Area, Client, figure_timer, get_image_writer, timed_wait
+from .exception import (
+    ClientError, RecordNotFoundError, TrytondUnavailableError)
+from .inventory import get_inventory_title
+from .mockup import ViewMockup
+from .stats import rpc_phase
+from .trace import trace_span
 
 logger = logging.getLogger(__name__)
 
+SLOW_FIGURES_REPORTED = 10
+
+FIGURE_MODES = ('capture', 'draft', 'mockup')
+
+PLACEHOLDER = """\
+<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" \
+viewBox="0 0 {width} {height}">
+<rect width="100%" height="100%" fill="#f4f4f4" stroke="#999999" \
+stroke-width="4" stroke-dasharray="16 8"/>
+<text x="50%" y="{y}" text-anchor="middle" font-family="sans-serif" \
+font-size="24" fill="#666666">{lines}</text>
+</svg>
+"""
+
 
 def tryton_field_list(argument):
     return argument.strip().split(' ')
 
 
+def tryton_figure_mode(argument):
+    return choice(argument, FIGURE_MODES)
+
+
+def placeholder_size(value, default):
+    # Only sizes given in pixels can be used for the placeholder
+    size = fullmatch(r'([0-9.]+)(px)?', value or '')
+    return int(float(size.group(1))) if size else default
+
+
+def write_placeholder_png(filename, width, height, lines):
+    "Draws a placeholder for builders that cannot show SVG images."
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (width, height), '#f4f4f4')
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, width - 1, height - 1), outline='#999999', width=4)
+    y = height // 2 - 15 * (len(lines) - 1)
+    for i, line in enumerate(lines):
+        if hasattr(draw, 'textbbox'):
+            left, top, right, bottom = draw.textbbox((0, 0), line)
+            size = (right - left, bottom - top)
+        else:
+            size = draw.textsize(line)
+        draw.text(
+            ((width - size[0]) // 2, y + 30 * i - size[1] // 2), line,
+            fill='#666666')
+    image.save(str(filename))
+
+
+def format_wait(wait):
+    if not wait:
+        return ''
+    name, duration = wait
+    return " ({duration:.1f}s in {name})".format(
+        duration=duration, name=name)
+
+
+def note_dependency(env, type_, target):
+    dependencies = env.domaindata['tryton']['dependencies']
+    dependencies.setdefault(env.docname, set()).add((type_, target))
+
+
+def is_checking(env):
+    return getattr(env, 'tryton_check', None) is not None
+
+
+def note_check(env, type_, target, property=None, lineno=None):
+    env.tryton_check.append((env.docname, lineno, type_, target, property))
+
+
+def is_capturing(env):
+    return getattr(env, 'tryton_capture', None) is not None
+
+
+def note_capture(env, client, options, filename, lineno=None):
+    env.tryton_capture.append(
+        (env.docname, lineno, client, options, str(filename)))
+
+
+def get_property(env, type_, target, property=None, lineno=None):
+    note_dependency(env, type_, target)
+    lookups = env.domaindata['tryton']['lookups']
+    lookups.setdefault(env.docname, set()).add((type_, target, property))
+
+    # The tryton-check builder resolves all the targets together once the
+    # documents have been read
+    if is_checking(env):
+        note_check(env, type_, target, property, lineno)
+        return target
+    if is_capturing(env):
+        return target
+
+    with trace_span(
+            'resolve', 'role', document=env.docname, type=type_,
+            target=target):
+        return env.trytond.get_property(type_, target, property)
+
+
+def get_figure_targets(trytond, options):
+    "Looks up the menu item and view that are shown in a figure."
+    targets = {}
+    menu_item = options.get('menuitem', None)
+    if menu_item:
+        targets['menu_item_path'] = trytond.get_main_menu_item_path(
+            menu_item)
+
+    view = options.get('view', None)
+    if view:
+        params = trytond.get_view(view)
+        params['domain'] = options.get('domain', None)
+        targets['view'] = params
+    return targets
+
+
+def capture_figure(client, options, targets, filename):
+    """Captures an image of a figure's targets using the client.
+
+    Returns the area of the client's window that was captured.
+    """
+    area = Area(
+        0, 0,
+        options.get('width', client.default_size[0]),
+        options.get('height', client.default_size[1]))
+
+    with trace_span('prepare', 'figure'):
+        client.close_windows()
+        client.collapse_main_menu_items()
+        client.hide_main_menu()
+
+        client.resize_window(*area[2:])
+
+    with trace_span('navigate', 'figure'):
+        if 'menu_item_path' in targets:
+            client.select_main_menu_item(targets['menu_item_path'])
+
+        if 'view' in targets:
+            client.open_view(**targets['view'])
+
+            fields = options.get('fields', None)
+            if fields:
+                client.select_field(fields[0])
+                area = client.calculate_area(
+                    fields,
+                    options.get('padding', 0))
+
+    # Pause to let things settle down,
+    with trace_span('settle', 'figure'), \
+            timed_wait('settle', 1) as timeout:
+        sleep(timeout)
+
+    with trace_span('capture', 'figure'):
+        client.capture_image(str(filename), *area)
+    return area
+
+
+class WaitForFigureImages(SphinxTransform):
+    """Waits for the document's figures to be written, as they are written in
+    the background but must exist before the document's images are collected.
+    """
+
+    # Before the doctree-read event is emitted
+    default_priority = 870
+
+    def apply(self, **kwargs):
+        for filename, error in get_image_writer().wait().items():
+            logger.warning(
+                "tryton figure could not be written to {filename}: "
+                "{error}".format(filename=filename, error=repr(error)),
+                location=self.env.docname)
+
+
 class TrytonObject(ObjectDescription):
     "Description of a Tryton object."
 
@@ -35,7 +211,8 @@ class TrytonObject(ObjectDescription):
         internal_name = sig
         type_ = self.name.split(':')[-1]
 
-        name = self.env.trytond.get_property(type_, internal_name)
+        name = get_property(
+            self.env, type_, internal_name, lineno=self.lineno)
         if not name:
             logger.warning(
                 "{type_} {internal_name} not found in Tryton.".format(
@@ -56,7 +233,8 @@ class TrytonObject(ObjectDescription):
             signode['first'] = not(self.names)
             self.state.document.note_explicit_target(signode)
 
-            objects = self.env.domaindata['tryton']['objects']
+            domain = self.env.get_domain('tryton')
+            objects = domain.data['objects']
             if internal_name in objects:
                 logger.warning(
                     "duplicate tryton object description of {object}, "
@@ -64,7 +242,8 @@ class TrytonObject(ObjectDescription):
                         object=internal_name,
                         document=self.env.doc2path(objects[internal_name][0])),
                     location=(self.env.docname, self.lineno))
-            objects[internal_name] = (self.env.docname, self.objtype)
+            domain.note_object(
+                internal_name, self.env.docname, self.objtype, name)
 
         indextext = '{} ({})'.format(name, internal_name)
         if indextext:
@@ -81,8 +260,14 @@ class TrytonXRefRole(XRefRole):
         if '|' in target:
             target, property = target.split('|', 1)
 
+        # Objects from other projects are titled from their inventories
+        title = None
+        if property is None:
+            title = get_inventory_title(self.env, type_, target)
         try:
-            title = self.env.trytond.get_property(type_, target, property)
+            if title is None:
+                title = get_property(
+                    self.env, type_, target, property, self.lineno)
         except RecordNotFoundError:
             title = None
         if not title:
@@ -136,26 +321,43 @@ class TrytonFigure(Figure):
         'domain': unchanged,
         'menuitem': unchanged,
         'padding': positive_int,
+        'mode': tryton_figure_mode,
         })
 
     @classmethod
     def get_temp_dir(cls, env):
-        if not getattr(env, 'tryton_figure_temp_dir', None):
+        # The directory is removed at the end of each build, but is still in
+        # the environment saved for the next one
+        temp_dir = getattr(env, 'tryton_figure_temp_dir', None)
+        if not temp_dir or not Path(temp_dir).is_dir():
             env.tryton_figure_temp_dir = mkdtemp(
                 dir=env.srcdir, prefix='tmp-images-')
         return Path(env.tryton_figure_temp_dir)
 
+    @classmethod
+    def merge_temp_dir(cls, env, other):
+        temp_dir = getattr(other, 'tryton_figure_temp_dir', None)
+        if not temp_dir:
+            return
+        if not getattr(env, 'tryton_figure_temp_dir', None):
+            env.tryton_figure_temp_dir = temp_dir
+        elif temp_dir != env.tryton_figure_temp_dir:
+            if not hasattr(env, 'tryton_figure_merged_temp_dirs'):
+                env.tryton_figure_merged_temp_dirs = set()
+            env.tryton_figure_merged_temp_dirs.add(temp_dir)
+
     @classmethod
     def remove_temp_dir(cls, env):
         if hasattr(env, 'tryton_figure_temp_dir'):
             rmtree(env.tryton_figure_temp_dir, ignore_errors=True)
+            del env.tryton_figure_temp_dir
+        for temp_dir in getattr(env, 'tryton_figure_merged_temp_dirs', []):
+            rmtree(temp_dir, ignore_errors=True)
+        env.tryton_figure_merged_temp_dirs = set()
 
     @property
     def clients(self):
-        global _tryton_clients_in_use
-        if '_tryton_clients_in_use' not in globals():
-            _tryton_clients_in_use = OrderedDict()
-        return _tryton_clients_in_use
+        return get_clients_in_use()
 
     @property
     def config(self):
@@ -188,9 +390,16 @@ class TrytonFigure(Figure):
     def start_client(self, client):
         if not client:
             return
-        if not client.is_available:
-            client.start()
-        return client.is_available
+        return client.ensure_started()
+
+    def skip_image(self, client):
+        skipped = self.env.tryton_skipped_figures
+        name = client.__class__.__name__
+        skipped[name] = skipped.get(name, 0) + 1
+        logger.debug(
+            "[tryton] client '{client}' is {state} - figure skipped".format(
+                client=name, state=client.health.state),
+            location=(self.env.docname, self.lineno))
 
     def temp_filename(self, client):
         dir = self.get_temp_dir(self.env)
@@ -202,62 +411,203 @@ class TrytonFigure(Figure):
 
         return str(dir / filename)
 
+    def supports_svg(self):
+        builder = self.env.app.builder
+        return 'image/svg+xml' in builder.supported_image_types
+
+    def create_placeholder(self, client):
+        default_size = client.default_size if client else (1920, 1080)
+        width = placeholder_size(self.options.get('width'), default_size[0])
+        height = placeholder_size(
+            self.options.get('height'), default_size[1])
+
+        lines = ['draft {}'.format(self.name.replace('tryton:', ''))]
+        for option, label in [
+                ('view', 'view'), ('menuitem', 'menu item'),
+                ('fields', 'fields')]:
+            value = self.options.get(option)
+            if value:
+                if isinstance(value, list):
+                    value = ' '.join(value)
+                lines.append('{}: {}'.format(label, value))
+
+        if not self.supports_svg():
+            return self.write_temp_png('draft', width, height, lines)
+        return self.write_temp_image('draft', PLACEHOLDER.format(
+            width=width, height=height,
+            y=height // 2 - 15 * (len(lines) - 1),
+            lines=''.join(
+                '<tspan x="50%" dy="{dy}">{line}</tspan>'.format(
+                    dy=30 if i else 0, line=escape(line))
+                for i, line in enumerate(lines))))
+
+    def create_mockup(self, client):
+        # Mockups are only drawn as SVG images
+        if not self.supports_svg():
+            return self.create_placeholder(client)
+
+        view_id = self.options['view']
+        try:
+            view = self.env.trytond.get_view_architecture(view_id)
+        except Exception as err:
+            logger.warning(
+                "view {view} could not be read from Tryton - mockup could "
+                "not be created: {error}".format(
+                    view=view_id, error=repr(err)),
+                location=(self.env.docname, self.lineno))
+            return self.create_placeholder(client)
+        if not view:
+            logger.warning(
+                "view {view} not found in Tryton - "
+                "mockup could not be created".format(view=view_id),
+                location=(self.env.docname, self.lineno))
+            return self.create_placeholder(client)
+
+        default_size = client.default_size if client else (1920, 1080)
+        with trace_span(
+                'mockup', 'figure', document=self.env.docname,
+                line=self.lineno, view=view_id):
+            mockup = ViewMockup(
+                view['arch'], view['fields'], view['title'],
+                width=placeholder_size(
+                    self.options.get('width'), default_size[0]))
+            area = None
+            if self.options.get('fields'):
+                area = mockup.calculate_area(
+                    self.options['fields'], self.options.get('padding', 0))
+            return self.write_temp_image('mockup', mockup.to_svg(area))
+
+    def write_temp_png(self, prefix, width, height, lines):
+        dir = self.get_temp_dir(self.env)
+        option_hash = sha1(str(self.options).encode('utf-8')).digest().hex()
+        filename = dir / '{}-{}.png'.format(prefix, option_hash)
+        try:
+            write_placeholder_png(filename, width, height, lines)
+        except ImportError:
+            logger.warning(
+                "tryton figure skipped: the {builder} builder cannot show "
+                "SVG images, and Pillow is needed to draw a PNG "
+                "placeholder".format(builder=self.env.app.builder.name),
+                location=(self.env.docname, self.lineno))
+            return
+        return '/' + filename.relative_to(self.env.srcdir).as_posix()
+
+    def write_temp_image(self, prefix, source):
+        dir = self.get_temp_dir(self.env)
+        option_hash = sha1(str(self.options).encode('utf-8')).digest().hex()
+        filename = dir / '{}-{}.svg'.format(prefix, option_hash)
+        filename.write_text(source, encoding='utf-8')
+
+        # Absolute image paths are relative to the source directory
+        return '/' + filename.relative_to(self.env.srcdir).as_posix()
+
     def create_image(self, client, filename):
-        if not self.start_client(client):
+        if not client:
             logger.warning(
                 "client '{client}' is not available - "
                 "image could not be created".format(
                     client=client.__class__.__name__))
             return
+        if not self.start_client(client):
+            self.skip_image(client)
+            return
 
-        area = Area(
-            0, 0,
-            self.options.get('width', client.default_size[0]),
-            self.options.get('height', client.default_size[1]))
-
-        client.close_windows()
-        client.collapse_main_menu_items()
-        client.hide_main_menu()
-
-        client.resize_window(*area[2:])
-
-        menu_item = self.options.get('menuitem', None)
-        if menu_item:
-            menu_item_path = self.env.trytond.get_main_menu_item_path(
-                menu_item)
-            client.select_main_menu_item(menu_item_path)
-
-        view = self.options.get('view', None)
-        if view:
-            params = self.env.trytond.get_view(view)
-            params['domain'] = self.options.get('domain', None)
-            client.open_view(**params)
-
-            fields = self.options.get('fields', None)
-            if fields:
-                client.select_field(fields[0])
-                area = client.calculate_area(
-                    fields,
-                    self.options.get('padding', 0))
-                self.options['width'] = area.width
-                self.options['height'] = area.height
-
-        # Pause to let things settle down,
-        sleep(1)
+        budget = self.config.tryton_figure_budget
+        try:
+            with trace_span(
+                    'figure', 'figure', document=self.env.docname,
+                    line=self.lineno, view=self.options.get('view')), \
+                    client.acquire(), figure_timer(budget) as timer:
+                try:
+                    self.capture_image(client, filename)
+                except Exception:
+                    # Waits are cut short once the budget is used up
+                    if not timer.exceeded:
+                        raise
+                    logger.warning(
+                        "tryton figure abandoned after {elapsed:.1f}s, over "
+                        "its budget of {budget}s{wait}".format(
+                            elapsed=timer.elapsed, budget=budget,
+                            wait=format_wait(timer.longest_wait)),
+                        location=(self.env.docname, self.lineno))
+                self.note_time(timer)
+        except ClientError as err:
+            # The other figures are still built without this one's image
+            logger.warning(
+                "tryton figure could not be captured: {error}".format(
+                    error=repr(err)),
+                location=(self.env.docname, self.lineno))
+            self.skip_image(client)
+        except TrytondUnavailableError as err:
+            # The views and menu items shown cannot be looked up
+            logger.warning(
+                "tryton figure skipped: {error}".format(error=err),
+                location=(self.env.docname, self.lineno))
 
-        client.capture_image(str(filename), *area)
+    def note_time(self, timer):
+        self.env.tryton_figure_times.append((
+            self.env.docname, self.lineno, timer.elapsed,
+            timer.longest_wait))
+
+    def capture_image(self, client, filename):
+        targets = get_figure_targets(self.env.trytond, self.options)
+        area = capture_figure(client, self.options, targets, filename)
+        if self.options.get('view') and self.options.get('fields'):
+            self.options['width'] = str(area.width)
+            self.options['height'] = str(area.height)
+
+    def get_dependencies(self):
+        dependencies = []
+        if self.options.get('view'):
+            dependencies.append(('view', self.options['view']))
+        if self.options.get('menuitem'):
+            dependencies.append(('menu', self.options['menuitem']))
+        return dependencies
 
     def run(self):
         client = self.get_client(self.options.get('client', None))
 
-        if not self.arguments:
+        dependencies = self.get_dependencies()
+        for type_, target in dependencies:
+            note_dependency(self.env, type_, target)
+
+        if is_checking(self.env):
+            for type_, target in dependencies:
+                note_check(self.env, type_, target, lineno=self.lineno)
+            return []
+        changed_targets = getattr(self.env, 'tryton_changed_targets', set())
+        changed = bool(changed_targets.intersection(dependencies))
+
+        temporary = not self.arguments
+        if temporary:
             self.arguments.append(self.temp_filename(client))
         image_file = Path(self.env.relfn2path(
             uri(self.arguments[0]), self.env.docname)[1])
+        outdated = (
+            not image_file.exists() or changed or
+            (client and client.force_update))
+
+        mode = self.options.get('mode', self.config.tryton_figure_mode)
+        if is_capturing(self.env):
+            # The tryton-capture builder captures all the images together
+            # once the documents have been read, images that are only kept
+            # for this build are not worth capturing up front
+            if mode == 'capture' and outdated and not temporary:
+                note_capture(
+                    self.env, client and client.__class__.__name__.lower(),
+                    dict(self.options), image_file, self.lineno)
+            return []
 
-        if not image_file.exists() or (client and client.force_update):
+        if mode == 'mockup' and self.options.get('view'):
+            self.arguments[0] = self.create_mockup(client)
+        elif mode in ('draft', 'mockup'):
+            if not image_file.exists():
+                self.arguments[0] = self.create_placeholder(client)
+        elif outdated:
             self.create_image(client, image_file)
 
+        if not self.arguments[0]:
+            return []
         return super().run()
 
 
@@ -310,18 +660,43 @@ class TrytonDomain(Domain):
         'wizard': TrytonXRefRole(),
         }
     initial_data = {
+        'dependencies': {},
+        'docobjects': {},
+        'fingerprints': {},
+        'lookups': {},
         'objects': {},
+        'titles': {},
         }
 
+    def note_object(self, fullname, docname, objtype, title=None):
+        self.data['objects'][fullname] = (docname, objtype)
+        self.data['docobjects'].setdefault(docname, set()).add(fullname)
+        self.data['titles'][fullname] = title
+
     def clear_doc(self, docname):
-        for fullname, (objdoc, objtype) in list(self.data['objects'].items()):
-            if objdoc == docname:
-                del self.data['objects'][fullname]
+        # Objects that were described again in another document now belong
+        # to that document, and must not be removed with this one
+        objects = self.data['objects']
+        for fullname in self.data['docobjects'].pop(docname, ()):
+            if fullname in objects and objects[fullname][0] == docname:
+                del objects[fullname]
+                self.data['titles'].pop(fullname, None)
+        self.data['dependencies'].pop(docname, None)
+        self.data['lookups'].pop(docname, None)
 
     def merge_domaindata(self, docnames, otherdata):
-        for fullname, (objdoc, objtype) in otherdata['objects'].items():
-            if objdoc in docnames:
-                self.data['objects'][fullname] = (objdoc, objtype)
+        for docname in docnames:
+            for fullname in otherdata['docobjects'].get(docname, ()):
+                objdoc, objtype = otherdata['objects'][fullname]
+                if objdoc == docname:
+                    self.note_object(
+                        fullname, objdoc, objtype,
+                        otherdata['titles'].get(fullname))
+            if docname in otherdata['dependencies']:
+                self.data['dependencies'][docname] = (
+                    otherdata['dependencies'][docname])
+            if docname in otherdata['lookups']:
+                self.data['lookups'][docname] = otherdata['lookups'][docname]
 
     def resolve_xref(self, env, fromdocname, builder,
                      typ, target, node, contnode):
@@ -346,12 +721,159 @@ class TrytonDomain(Domain):
             yield (refname, refname, type, docname, refname, 1)
 
 
+def get_clients_in_use():
+    global _tryton_clients_in_use
+    if '_tryton_clients_in_use' not in globals():
+        _tryton_clients_in_use = OrderedDict()
+    return _tryton_clients_in_use
+
+
+def setup_start_pooled_clients(app, env, docnames):
+    if not docnames or is_checking(env) or is_capturing(env):
+        return
+
+    # Pooled clients are started before any documents are read so that
+    # parallel readers share the same pool of clients
+    clients = get_clients_in_use()
+    configured = OrderedDict()
+    for TrytonClient in Client.__subclasses__():
+        name = TrytonClient.__name__.lower()
+        if name in clients:
+            configured[name] = clients[name]
+        elif TrytonClient.is_configured(app.config):
+            config = TrytonClient.get_config(app.config)
+            configured[name] = TrytonClient(**config)
+
+    if not any(c.is_pooled for c in configured.values()):
+        return
+
+    clients.update(configured)
+    for client in clients.values():
+        if client.is_pooled:
+            client.ensure_started()
+
+
+def setup_skipped_figures(app, env, docnames):
+    env.tryton_skipped_figures = {}
+
+
+def merge_skipped_figures(app, env, docnames, other):
+    for name, count in getattr(other, 'tryton_skipped_figures', {}).items():
+        skipped = env.tryton_skipped_figures
+        skipped[name] = skipped.get(name, 0) + count
+
+
+def setup_figure_times(app, env, docnames):
+    env.tryton_figure_times = []
+
+
+def merge_figure_times(app, env, docnames, other):
+    env.tryton_figure_times.extend(getattr(other, 'tryton_figure_times', []))
+
+
+def get_outdated_docs(app, env, added, changed, removed):
+    env.tryton_changed_targets = set()
+
+    data = env.domaindata['tryton']
+    targets = set().union(*data['dependencies'].values())
+    if not targets or not getattr(app, 'trytond', None):
+        return []
+
+    with rpc_phase(app, 'get_outdated_docs'):
+        fingerprints = app.trytond.get_fingerprints(targets)
+    if fingerprints is None:
+        return []
+
+    changed_targets = set(
+        t for t in targets
+        if t in data['fingerprints'] and
+        data['fingerprints'][t] != fingerprints.get(t))
+    data['fingerprints'] = fingerprints
+    env.tryton_changed_targets = changed_targets
+
+    reread = added | changed | removed
+    return [
+        docname for docname, doc_targets in data['dependencies'].items()
+        if docname not in reread and changed_targets & doc_targets]
+
+
+def update_fingerprints(app, env):
+    data = env.domaindata['tryton']
+    targets = set().union(*data['dependencies'].values())
+    missing = targets - set(data['fingerprints'])
+    if missing and getattr(app, 'trytond', None):
+        with rpc_phase(app, 'update_fingerprints'):
+            fingerprints = app.trytond.get_fingerprints(missing)
+        if fingerprints:
+            data['fingerprints'].update(fingerprints)
+    data['fingerprints'] = {
+        t: f for t, f in data['fingerprints'].items() if t in targets}
+
+
+def get_lookups_manifest(app):
+    return Path(app.doctreedir) / 'tryton-lookups.json'
+
+
+def setup_prefetch(app, env, docnames):
+    if is_capturing(env):
+        return
+    try:
+        with get_lookups_manifest(app).open(encoding='utf-8') as file:
+            manifest = load(file)
+    except (OSError, ValueError):
+        return
+
+    lookups = set()
+    for docname in docnames:
+        lookups.update(tuple(k) for k in manifest.get(docname, []))
+    if lookups:
+        with rpc_phase(app, 'setup_prefetch'):
+            env.trytond.prefetch(lookups)
+
+
+def write_lookups_manifest(app, env):
+    lookups = env.domaindata['tryton']['lookups']
+    manifest = {
+        docname: sorted(doc_lookups, key=str)
+        for docname, doc_lookups in lookups.items() if doc_lookups}
+    try:
+        with get_lookups_manifest(app).open('w', encoding='utf-8') as file:
+            dump(manifest, file, indent=1, sort_keys=True)
+    except OSError as err:
+        logger.warning(
+            "could not write the tryton lookups manifest: {error}".format(
+                error=repr(err)))
+
+
+def merge_temp_figures(app, env, docnames, other):
+    TrytonFigure.merge_temp_dir(env, other)
+
+
 def cleanup_temp_figures(app, exception):
     TrytonFigure.remove_temp_dir(app.env)
 
 
+def report_skipped_figures(app, env):
+    skipped = getattr(env, 'tryton_skipped_figures', {})
+    for name, count in sorted(skipped.items()):
+        logger.warning(
+            "{count} tryton figure(s) skipped because client '{client}' "
+            "was not available".format(count=count, client=name))
+
+
+def report_slow_figures(app, env):
+    times = sorted(
+        getattr(env, 'tryton_figure_times', []), key=lambda t: -t[2])
+    if not times:
+        return
+    logger.info("slowest tryton figures:")
+    for docname, lineno, elapsed, wait in times[:SLOW_FIGURES_REPORTED]:
+        logger.info("{elapsed:8.1f}s  {location}{wait}".format(
+            elapsed=elapsed,
+            location='{}:{}'.format(env.doc2path(docname), lineno),
+            wait=format_wait(wait)))
+
+
 def cleanup_stop_clients(app, exception):
-    global _tryton_clients_in_use
-    if '_tryton_clients_in_use' in globals():
-        for client in _tryton_clients_in_use.values():
-            client.stop()
+    for client in get_clients_in_use().values():
+        client.stop()
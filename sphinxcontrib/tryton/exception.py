@@ -7,6 +7,10 @@ class ClientError(Exception):
     pass
 
 
+class ClientBudgetExceededError(ClientError):
+    pass
+
+
 class ClientLoginError(ClientError):
     pass
 
@@ -33,3 +37,7 @@ class DatabaseInitialisationFailedError(TrytondError):
 
 class RecordNotFoundError(TrytondError):
     pass
+
+
+class TrytondUnavailableError(TrytondError):
+    pass
@@ -0,0 +1,96 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from docutils import nodes
+from json import dump, load, loads
+from pathlib import Path
+from sphinx.util import logging, requests
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_FILENAME = 'tryton-inventory.json'
+INVENTORY_VERSION = 1
+
+
+def write_inventory(app, exception):
+    if exception or app.builder.format != 'html':
+        return
+
+    domain = app.env.get_domain('tryton')
+    objects = {}
+    for fullname, (docname, objtype) in domain.data['objects'].items():
+        objects[fullname] = {
+            'type': objtype,
+            'uri': '{uri}#{anchor}'.format(
+                uri=app.builder.get_target_uri(docname), anchor=fullname),
+            'title': domain.data['titles'].get(fullname),
+            }
+
+    inventory = {
+        'project': app.config.project,
+        'version': INVENTORY_VERSION,
+        'objects': objects,
+        }
+    try:
+        with (Path(app.outdir) / INVENTORY_FILENAME).open(
+                'w', encoding='utf-8') as file:
+            dump(inventory, file, indent=1, sort_keys=True)
+    except OSError as err:
+        logger.warning(
+            "could not write the tryton inventory: {error}".format(
+                error=repr(err)))
+
+
+def fetch_inventory(app, uri, location):
+    if location is None:
+        location = uri.rstrip('/') + '/' + INVENTORY_FILENAME
+
+    if '://' in location:
+        response = requests.get(location, config=app.config)
+        response.raise_for_status()
+        return loads(response.text)
+
+    with (Path(app.confdir) / location).open(encoding='utf-8') as file:
+        return load(file)
+
+
+def load_inventories(app):
+    app.tryton_inventory = {}
+    mapping = app.config.tryton_inventory_mapping or {}
+    for name, (uri, location) in sorted(mapping.items()):
+        try:
+            inventory = fetch_inventory(app, uri, location)
+            if inventory.get('version') != INVENTORY_VERSION:
+                raise ValueError("unsupported inventory version")
+        except Exception as err:
+            logger.warning(
+                "could not load the tryton inventory for {name}: "
+                "{error}".format(name=name, error=repr(err)))
+            continue
+
+        for fullname, item in inventory['objects'].items():
+            app.tryton_inventory.setdefault(fullname, dict(
+                item,
+                project=inventory.get('project') or name,
+                uri=uri.rstrip('/') + '/' + item['uri']))
+
+
+def get_inventory_title(env, type_, target):
+    item = getattr(env.app, 'tryton_inventory', {}).get(target)
+    if item and item['type'] == type_:
+        return item['title']
+
+
+def resolve_inventory_reference(app, env, node, contnode):
+    if node.get('refdomain') != 'tryton':
+        return
+
+    item = getattr(app, 'tryton_inventory', {}).get(node['reftarget'])
+    if not item or item['type'] != node['reftype']:
+        return
+
+    reftitle = '(in {project})'.format(project=item['project'])
+    newnode = nodes.reference(
+        '', '', internal=False, refuri=item['uri'], reftitle=reftitle)
+    newnode.append(contnode)
+    return newnode
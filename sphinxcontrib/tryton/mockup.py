@@ -0,0 +1,290 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from .client import Area
+
+ROW_HEIGHT = 34
+TITLE_HEIGHT = 40
+SPACING = 4
+CHAR_WIDTH = 7
+
+# The number of rows taken by the widgets of each type of field
+FIELD_ROWS = {
+    'many2many': 6,
+    'one2many': 6,
+    'text': 4,
+    }
+
+# The number of columns spanned by default, if not the whole row
+ROW_SPANNING = ('notebook', 'separator')
+
+STYLE = """\
+<style>
+text { font-family: sans-serif; font-size: 13px; fill: #333333; }
+.title { font-size: 16px; fill: #ffffff; }
+.heading { font-weight: bold; }
+.window { fill: #ffffff; }
+.titlebar { fill: #267396; }
+.widget { fill: #ffffff; stroke: #b4b4b4; }
+.readonly { fill: #f0f0f0; stroke: #b4b4b4; }
+.frame { fill: none; stroke: #d2d2d2; }
+.tab { fill: #f4f4f4; stroke: #d2d2d2; }
+.button { fill: #e6e6e6; stroke: #a0a0a0; }
+.header { fill: #eaeaea; stroke: #b4b4b4; }
+.line { stroke: #d2d2d2; }
+</style>
+"""
+
+
+class ViewMockup(object):
+    """A drawing of a view, laid out from its architecture.
+
+    The ``fields`` are the definitions of the view's fields, as returned by
+    ``fields_view_get``, and are used for the labels and the widgets.
+    """
+
+    def __init__(self, arch, fields, title=None, width=1920):
+        self.root = ElementTree.fromstring(arch)
+        self.fields = fields
+        self.title = title
+        self.width = width
+
+        self.shapes = []
+        self.field_areas = {}
+
+        top = TITLE_HEIGHT if title else 0
+        if self.root.tag == 'tree':
+            height = self.layout_tree(self.root, SPACING, top + SPACING)
+        elif self.root.tag == 'form':
+            height = self.layout_grid(
+                self.root, SPACING, top + SPACING, width - 2 * SPACING)
+        else:
+            height = ROW_HEIGHT
+            self.text(
+                '{} view'.format(self.root.tag), SPACING * 2, top + SPACING)
+        self.height = top + height + 2 * SPACING
+
+    def string(self, element):
+        if element.get('string') is not None:
+            return element.get('string')
+        field = self.fields.get(element.get('name'), {})
+        return field.get('string', element.get('name') or '')
+
+    def note_area(self, name, x, y, width, height):
+        if name:
+            self.field_areas.setdefault(name, []).append(
+                Area(int(x), int(y), int(width), int(height)))
+
+    def rect(self, class_, x, y, width, height):
+        self.shapes.append(
+            '<rect class="{}" x="{:.0f}" y="{:.0f}" width="{:.0f}" '
+            'height="{:.0f}"/>'.format(class_, x, y, width, height))
+
+    def line(self, x1, y1, x2, y2):
+        self.shapes.append(
+            '<line class="line" x1="{:.0f}" y1="{:.0f}" x2="{:.0f}" '
+            'y2="{:.0f}"/>'.format(x1, y1, x2, y2))
+
+    def text(self, text, x, y, anchor='start', class_=None):
+        self.shapes.append(
+            '<text{} x="{:.0f}" y="{:.0f}" text-anchor="{}">{}</text>'.format(
+                ' class="{}"'.format(class_) if class_ else '',
+                x, y + ROW_HEIGHT / 2 + 5, anchor, escape(text)))
+
+    def layout_grid(self, element, x, y, width):
+        "Lays out the children of the element, and returns their height."
+        columns = int(element.get('col', 4))
+        column_width = width / columns
+
+        column = 0
+        row_y = y
+        row_height = 0
+        for child in element:
+            if child.tag == 'newline':
+                column, row_y, row_height = 0, row_y + row_height, 0
+                continue
+            if child.get('invisible') in ('1', 'true'):
+                continue
+
+            default_colspan = columns if child.tag in ROW_SPANNING else 1
+            colspan = min(int(child.get('colspan', default_colspan)), columns)
+            if column and column + colspan > columns:
+                column, row_y, row_height = 0, row_y + row_height, 0
+
+            height = self.layout_element(
+                child, x + column * column_width, row_y,
+                colspan * column_width)
+            row_height = max(row_height, height)
+            column += colspan
+        return row_y + row_height - y
+
+    def layout_element(self, element, x, y, width):
+        method = getattr(self, 'layout_{}'.format(element.tag), None)
+        if method is None:
+            return 0
+        return method(element, x, y, width)
+
+    def layout_label(self, element, x, y, width):
+        string = self.string(element)
+        if string and element.get('string') is None:
+            string += ':'
+        self.text(string, x + width - SPACING, y, anchor='end')
+        self.note_area(element.get('name'), x, y, width, ROW_HEIGHT)
+        return ROW_HEIGHT
+
+    def layout_field(self, element, x, y, width):
+        field = self.fields.get(element.get('name'), {})
+        type_ = field.get('type')
+        height = FIELD_ROWS.get(type_, 1) * ROW_HEIGHT
+        left, top = x + SPACING, y + SPACING
+        inner_width = width - 2 * SPACING
+        inner_height = height - 2 * SPACING
+
+        if type_ == 'boolean':
+            self.rect('widget', left, top + 4, 18, 18)
+        elif type_ in ('one2many', 'many2many'):
+            self.rect('widget', left, top, inner_width, inner_height)
+            self.rect('header', left, top, inner_width, ROW_HEIGHT - 8)
+            for row in range(2, FIELD_ROWS[type_]):
+                self.line(
+                    left, top + row * ROW_HEIGHT - 8,
+                    left + inner_width, top + row * ROW_HEIGHT - 8)
+        else:
+            readonly = field.get('readonly') or element.get('readonly') == '1'
+            self.rect(
+                'readonly' if readonly else 'widget',
+                left, top, inner_width, inner_height)
+            if type_ in ('many2one', 'selection', 'reference'):
+                self.text(
+                    '▾' if type_ == 'selection' else '…',
+                    left + inner_width - SPACING * 2, y, anchor='end')
+        self.note_area(element.get('name'), x, y, width, height)
+        return height
+
+    def layout_separator(self, element, x, y, width):
+        self.text(self.string(element), x + SPACING, y, class_='heading')
+        self.line(
+            x + SPACING, y + ROW_HEIGHT - SPACING,
+            x + width - SPACING, y + ROW_HEIGHT - SPACING)
+        self.note_area(element.get('name'), x, y, width, ROW_HEIGHT)
+        return ROW_HEIGHT
+
+    def layout_button(self, element, x, y, width):
+        self.rect(
+            'button', x + SPACING, y + SPACING, width - 2 * SPACING,
+            ROW_HEIGHT - 2 * SPACING)
+        self.text(self.string(element), x + width / 2, y, anchor='middle')
+        self.note_area(element.get('name'), x, y, width, ROW_HEIGHT)
+        return ROW_HEIGHT
+
+    def layout_image(self, element, x, y, width):
+        size = min(int(element.get('size', 24)), ROW_HEIGHT - 2 * SPACING)
+        self.rect('frame', x + SPACING, y + SPACING, size, size)
+        return ROW_HEIGHT
+
+    def layout_group(self, element, x, y, width):
+        string = element.get('string')
+        if not string:
+            return self.layout_grid(element, x, y, width)
+
+        inner_height = self.layout_grid(
+            element, x + SPACING, y + ROW_HEIGHT, width - 2 * SPACING)
+        height = ROW_HEIGHT + inner_height + SPACING
+        self.rect(
+            'frame', x + SPACING, y + ROW_HEIGHT / 2, width - 2 * SPACING,
+            height - ROW_HEIGHT / 2)
+        self.text(string, x + 3 * SPACING, y, class_='heading')
+        return height
+
+    def layout_notebook(self, element, x, y, width):
+        pages = [
+            p for p in element
+            if p.tag == 'page' and p.get('invisible') not in ('1', 'true')]
+        if not pages:
+            return 0
+
+        # Only the first page is shown, like when the view is opened
+        tab_x = x + SPACING
+        for index, page in enumerate(pages):
+            string = self.string(page)
+            tab_width = len(string) * CHAR_WIDTH + 6 * SPACING
+            self.rect(
+                'window' if index == 0 else 'tab', tab_x, y + SPACING,
+                tab_width, ROW_HEIGHT - SPACING)
+            self.text(
+                string, tab_x + tab_width / 2, y + SPACING / 2,
+                anchor='middle', class_='heading' if index == 0 else None)
+            tab_x += tab_width
+
+        inner_height = self.layout_grid(
+            pages[0], x + SPACING, y + ROW_HEIGHT + SPACING,
+            width - 2 * SPACING)
+        height = ROW_HEIGHT + inner_height + 2 * SPACING
+        self.rect(
+            'frame', x + SPACING, y + ROW_HEIGHT, width - 2 * SPACING,
+            height - ROW_HEIGHT)
+        return height
+
+    def layout_tree(self, element, x, y):
+        columns = [
+            c for c in element
+            if c.tag in ('field', 'button')
+            and c.get('tree_invisible') not in ('1', 'true')]
+        width = self.width - 2 * SPACING
+        column_width = width / max(len(columns), 1)
+        rows = 10
+
+        self.rect('widget', x, y, width, rows * ROW_HEIGHT)
+        self.rect('header', x, y, width, ROW_HEIGHT)
+        for index, column in enumerate(columns):
+            column_x = x + index * column_width
+            self.text(
+                self.string(column), column_x + 2 * SPACING, y,
+                class_='heading')
+            if index:
+                self.line(column_x, y, column_x, y + rows * ROW_HEIGHT)
+            self.note_area(
+                column.get('name'), column_x, y, column_width,
+                rows * ROW_HEIGHT)
+        for row in range(2, rows):
+            self.line(x, y + row * ROW_HEIGHT, x + width, y + row * ROW_HEIGHT)
+        return rows * ROW_HEIGHT
+
+    def calculate_area(self, fields, padding=0):
+        "Returns the area around the fields, like the clients do."
+        areas = [a for f in fields for a in self.field_areas.get(f, [])]
+        if not areas:
+            return Area(0, 0, self.width, self.height)
+
+        left = min(a.x for a in areas)
+        top = min(a.y for a in areas)
+        right = max(a.x + a.width for a in areas)
+        bottom = max(a.y + a.height for a in areas)
+        left, top = max(left - padding, 0), max(top - padding, 0)
+        right = min(right + padding, self.width)
+        bottom = min(bottom + padding, self.height)
+        return Area(left, top, right - left, bottom - top)
+
+    def to_svg(self, area=None):
+        "Returns the mockup, or the area of it, as an SVG image."
+        if area is None:
+            area = Area(0, 0, self.width, self.height)
+
+        title = []
+        if self.title:
+            title = [
+                '<rect class="titlebar" x="0" y="0" width="{}" '
+                'height="{}"/>'.format(self.width, TITLE_HEIGHT),
+                '<text class="title" x="{}" y="{}">{}</text>'.format(
+                    SPACING * 3, TITLE_HEIGHT / 2 + 6, escape(self.title)),
+                ]
+        return '\n'.join([
+            '<svg xmlns="http://www.w3.org/2000/svg" width="{2}" '
+            'height="{3}" viewBox="{0} {1} {2} {3}">'.format(*area),
+            STYLE.rstrip('\n'),
+            '<rect class="window" x="0" y="0" width="{}" '
+            'height="{}"/>'.format(self.width, self.height),
+            ] + title + self.shapes + ['</svg>', ''])
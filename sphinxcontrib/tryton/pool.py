@@ -0,0 +1,123 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+
+TRANSLATION_TYPES = ['field', 'help', 'model', 'selection']
+
+
+class PoolIntrospection(object):
+    "Answers lookups from the classes registered in a local trytond pool."
+
+    def __init__(self, config):
+        self.config = config
+        self.default_language = None
+        self.translations = {}
+
+    def get_model(self, model_name):
+        try:
+            return self.config.pool.get(model_name)
+        except KeyError:
+            return None
+
+    def get_property(self, type_, name, property=None, language=None):
+        method = getattr(self, '_get_property_{}'.format(type_), None)
+        if method is None:
+            return NotImplemented
+        args = [name]
+        if property:
+            args.append(property)
+        return method(*args, language=language)
+
+    def get_default_language(self):
+        if self.default_language is None:
+            from trytond.config import config
+            self.default_language = config.get(
+                'database', 'language', default='en')
+        return self.default_language
+
+    def translate(self, name, ttype, language, source=None):
+        if language is None or source is None:
+            return source
+        # The strings in the code are already in the database's language
+        if language == self.get_default_language():
+            return source
+        return self.get_translations(language).get(
+            (name, ttype, source)) or source
+
+    def get_translations(self, language):
+        # All the strings of a language are read together, in a single
+        # transaction, the first time one of them is needed
+        if language not in self.translations:
+            from trytond.transaction import Transaction
+            with Transaction().start(
+                    self.config.database_name, self.config.user,
+                    readonly=True):
+                Translation = self.config.pool.get('ir.translation')
+                rows = Translation.search_read([
+                        ('lang', '=', language),
+                        ('type', 'in', TRANSLATION_TYPES),
+                        ('value', 'not in', ['', None]),
+                        ('fuzzy', '=', False),
+                        ], fields_names=['name', 'type', 'src', 'value'])
+            self.translations[language] = {
+                (r['name'], r['type'], r['src']): r['value'] for r in rows}
+        return self.translations[language]
+
+    def _get_property_field(self, field_name, property='field_description',
+                            language=None):
+        model_name, field_name = field_name.rsplit('.', 1)
+        model = self.get_model(model_name)
+        if model is None:
+            return
+
+        ttypes = {'field_description': 'field', 'help': 'help'}
+        if property not in ttypes:
+            return NotImplemented
+
+        field = model._fields.get(field_name)
+        if field is None:
+            return
+
+        attribute = 'string' if property == 'field_description' else 'help'
+        field_str = self.translate(
+            '{model},{field}'.format(model=model_name, field=field_name),
+            ttypes[property], language, getattr(field, attribute, None))
+
+        if property == 'field_description':
+            model_str = self._get_property_model(model_name, language=language)
+            return '{model}.{field}'.format(model=model_str, field=field_str)
+
+        return field_str
+
+    def _get_property_model(self, model_name, property='name', language=None):
+        if property != 'name':
+            return NotImplemented
+
+        model = self.get_model(model_name)
+        if model is None:
+            return
+
+        return self.translate(
+            '{model},name'.format(model=model_name), 'model', language,
+            model._get_name())
+
+    def _get_property_option(self, option, property='name', language=None):
+        model_name, field_name, option_name = option.rsplit('.', 2)
+        model = self.get_model(model_name)
+        field = model._fields.get(field_name) if model else None
+        selection = getattr(field, 'selection', None)
+        if not isinstance(selection, (list, tuple)):
+            # Missing fields and dynamic selections are left to the server
+            return NotImplemented
+
+        field_str = self._get_property_field(
+            '{model}.{field}'.format(model=model_name, field=field_name),
+            language=language)
+
+        for value, name in selection:
+            if value == option_name:
+                name = self.translate(
+                    '{model},{field}'.format(
+                        model=model_name, field=field_name),
+                    'selection', language, name)
+                return '{field}.{option}'.format(field=field_str, option=name)
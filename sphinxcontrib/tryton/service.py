@@ -0,0 +1,423 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from multiprocessing import connection as ipc
+from os import getpid, urandom
+from pathlib import Path
+from pickle import dumps, loads
+from queue import Queue
+from shutil import rmtree
+from socket import AF_UNIX, socket
+from sphinx.application import Sphinx
+from sphinx.util import logging
+from tempfile import mkdtemp
+from threading import Event, Lock, Thread
+from types import SimpleNamespace
+
+from .client import Client, Size, get_image_writer
+from .domain import get_clients_in_use
+from .exception import ClientError, TrytondError, TrytondUnavailableError
+from .trytond import cleanup_trytond
+
+logger = logging.getLogger(__name__)
+
+# The methods that builds can call on the service's trytond connection
+TRYTOND_METHODS = (
+    'flush_cached_properties',
+    'get_fingerprints',
+    'get_main_menu_item_path',
+    'get_modules',
+    'get_property',
+    'get_view',
+    'get_view_architecture',
+    'prefetch',
+    )
+
+# Like with trytond, these return None if the service cannot be reached
+TRYTOND_OPTIONAL_METHODS = (
+    'flush_cached_properties',
+    'get_fingerprints',
+    'get_property',
+    'prefetch',
+    )
+
+CLIENT_METHODS = (
+    'calculate_area',
+    'capture_image',
+    'close_windows',
+    'collapse_main_menu_items',
+    'get_window_size',
+    'hide_main_menu',
+    'open_view',
+    'resize_window',
+    'select_field',
+    'select_main_menu_item',
+    )
+
+
+def get_service_address(confdir, filename):
+    return str(Path(confdir or '.') / filename)
+
+
+def get_service_key(address):
+    return Path(address + '.key')
+
+
+class ServiceConnection(object):
+    "A connection from a build, or one of its readers, to the service."
+
+    def __init__(self, address):
+        self.address = address
+        self.connection = None
+        self.pid = None
+        self.lock = Lock()
+
+    def __getstate__(self):
+        return {'address': self.address}
+
+    def __setstate__(self, state):
+        self.__init__(state['address'])
+
+    def connect(self):
+        # Forked readers must not share their parent's connection
+        if self.connection is None or self.pid != getpid():
+            key = get_service_key(self.address).read_bytes()
+            self.connection = ipc.Client(self.address, 'AF_UNIX', authkey=key)
+            self.pid = getpid()
+
+    def call(self, target, method, *args, **kwargs):
+        with self.lock:
+            try:
+                self.connect()
+                self.connection.send((target, method, args, kwargs))
+                status, value = self.connection.recv()
+            except (ipc.AuthenticationError, EOFError, OSError) as err:
+                self.connection = None
+                raise TrytondUnavailableError(
+                    "tryton build service not available at {address}: "
+                    "{error}".format(
+                        address=self.address, error=repr(err))) from err
+        if status == 'error':
+            raise value
+        return value
+
+
+class ServiceTrytond(object):
+    "Uses the trytond connection of a build service."
+
+    stats = None
+
+    def __init__(self, address, language=None):
+        self.service = ServiceConnection(address)
+        self.language = language
+
+    def begin(self):
+        self.service.call(('service',), 'begin')
+
+    def __getattr__(self, name):
+        if name not in TRYTOND_METHODS:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            try:
+                return self.service.call(
+                    ('trytond', self.language), name, *args, **kwargs)
+            except TrytondUnavailableError:
+                if name not in TRYTOND_OPTIONAL_METHODS:
+                    raise
+                return None
+        return call
+
+
+class ServiceClient(object):
+    "Uses a client that is kept running by a build service."
+
+    def __init__(self, service, name, default_size, force_update, **kwargs):
+        self.service = service
+        self.name = name
+        self.default_size = Size(*default_size)
+        self.force_update = force_update
+        self.health = SimpleNamespace(state='not started')
+
+    @property
+    def is_pooled(self):
+        return False
+
+    @contextmanager
+    def acquire(self):
+        yield self
+
+    def ensure_started(self):
+        try:
+            started, self.health.state = self.service.call(
+                ('client', self.name), 'ensure_started')
+        except TrytondUnavailableError as err:
+            logger.warning(str(err))
+            self.health.state = 'unavailable'
+            return False
+        return started
+
+    def stop(self):
+        # The service keeps the client running for the next build
+        pass
+
+    def __getattr__(self, name):
+        if name not in CLIENT_METHODS:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            try:
+                return self.service.call(
+                    ('client', self.name), name, *args, **kwargs)
+            except TrytondUnavailableError as err:
+                raise ClientError(str(err)) from err
+        return call
+
+
+class BuildService(object):
+    """Answers the requests of builds using a trytond connection and clients
+    that are kept open between builds.
+    """
+
+    def __init__(self, app, address):
+        self.app = app
+        self.address = address
+        self.clients = {}
+        self.validator = None
+        self.fingerprints = {}
+        self.requests = Queue()
+        self.listener = None
+        self.stopped = Event()
+
+    @property
+    def trytond(self):
+        return self.app.trytond
+
+    def start(self):
+        if Path(self.address).exists():
+            self.remove_stale_socket()
+
+        # Only the user running the service can read the key to connect
+        authkey = urandom(32)
+        key = get_service_key(self.address)
+        if key.exists():
+            key.unlink()
+        key.touch(mode=0o600)
+        key.write_bytes(authkey)
+
+        self.listener = ipc.Listener(self.address, 'AF_UNIX', authkey=authkey)
+        Thread(target=self.accept, daemon=True).start()
+
+    def remove_stale_socket(self):
+        with socket(AF_UNIX) as sock:
+            try:
+                sock.connect(self.address)
+            except ConnectionRefusedError:
+                Path(self.address).unlink()
+                return
+        raise TrytondError(
+            "a tryton build service is already running at {address}".format(
+                address=self.address))
+
+    def serve_forever(self):
+        # Requests are handled one at a time by this thread, as the trytond
+        # connection can only be used by the thread that opened it
+        self.begin()
+        while True:
+            connection, request = self.requests.get()
+            if request is None:
+                break
+            try:
+                connection.send(self.handle(request))
+            except OSError:
+                continue
+        self.stop()
+
+    def accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except ipc.AuthenticationError:
+                continue
+            except OSError:
+                return
+            Thread(
+                target=self.receive, args=(connection,), daemon=True).start()
+
+    def receive(self, connection):
+        while True:
+            try:
+                request = connection.recv()
+            except (EOFError, OSError):
+                request = None
+            if request is None or self.stopped.is_set():
+                connection.close()
+                return
+            self.requests.put((connection, request))
+
+    def shutdown(self):
+        self.requests.put((None, None))
+
+    def handle(self, request):
+        target, method, args, kwargs = request
+        try:
+            if target[0] == 'service' and method in ('begin', 'shutdown'):
+                value = getattr(self, method)()
+            elif target[0] == 'trytond' and method in TRYTOND_METHODS:
+                self.trytond.language = target[1]
+                value = getattr(self.trytond, method)(*args, **kwargs)
+                if method == 'get_fingerprints' and value:
+                    self.forget_changed(value)
+            elif target[0] == 'client' and method == 'ensure_started':
+                client = self.get_client(target[1])
+                value = (client.ensure_started(), client.health.state)
+            elif target[0] == 'client' and method in CLIENT_METHODS:
+                value = getattr(self.get_client(target[1]), method)(
+                    *args, **kwargs)
+                if method == 'capture_image':
+                    self.wait_for_image(args[0])
+            else:
+                raise TrytondError(
+                    "unknown request {method}".format(method=method))
+        except Exception as err:
+            # Not all exceptions can be recreated by the build
+            try:
+                loads(dumps(err))
+            except Exception:
+                err = TrytondError(repr(err))
+            return ('error', err)
+        return ('ok', value)
+
+    def begin(self):
+        # Builds may be hours apart, so the metadata is only kept while the
+        # same modules are activated on the server
+        self.trytond.flush_cached_properties()
+        self.trytond.cache_validator = None
+        validator = self.trytond.get_cache_validator()
+        if validator != self.validator:
+            self.trytond.properties.clear()
+            self.trytond.models.clear()
+            self.trytond.module_orders.clear()
+            self.validator = validator
+
+    def forget_changed(self, fingerprints):
+        # The objects used by a build may have changed on the server since
+        # they were loaded for an earlier build
+        changed = set(
+            t for t, f in fingerprints.items()
+            if self.fingerprints.get(t, f) != f)
+        if changed:
+            self.trytond.forget_targets(changed)
+        self.fingerprints.update(fingerprints)
+
+    def wait_for_image(self, filename):
+        # The build expects the image to exist once it has been captured
+        failed = get_image_writer().wait([filename])
+        if filename in failed:
+            raise failed[filename]
+
+    def get_client(self, name):
+        if name not in self.clients:
+            for TrytonClient in Client.__subclasses__():
+                if TrytonClient.__name__.lower() == name:
+                    self.clients[name] = TrytonClient(
+                        **TrytonClient.get_config(self.app.config))
+                    break
+            else:
+                raise ClientError(
+                    "client '{client}' is not available".format(client=name))
+        return self.clients[name]
+
+    def stop(self):
+        self.stopped.set()
+        self.listener.close()
+        for client in self.clients.values():
+            client.stop()
+        cleanup_trytond(self.app, None)
+        for filename in (Path(self.address), get_service_key(self.address)):
+            if filename.exists():
+                filename.unlink()
+
+
+def is_service_running():
+    return globals().get('_tryton_service_running', False)
+
+
+def initialise_service(app, config):
+    # The service itself connects to trytond directly
+    if not config.tryton_service or is_service_running():
+        return
+    if getattr(app, 'trytond', None):
+        return
+
+    address = get_service_address(app.confdir, config.tryton_service)
+    trytond = ServiceTrytond(address, config.language)
+    try:
+        trytond.begin()
+    except TrytondError as err:
+        logger.warning(
+            "{error} - connecting to the trytond server directly".format(
+                error=err))
+        return
+    app.trytond = trytond
+
+
+def setup_service_clients(app, env, docnames):
+    trytond = getattr(app, 'trytond', None)
+    if not isinstance(trytond, ServiceTrytond):
+        return
+
+    clients = get_clients_in_use()
+    for TrytonClient in Client.__subclasses__():
+        name = TrytonClient.__name__.lower()
+        if name not in clients and TrytonClient.is_configured(app.config):
+            clients[name] = ServiceClient(
+                trytond.service, name, **TrytonClient.get_config(app.config))
+
+
+def main(argv=None):
+    global _tryton_service_running
+
+    parser = ArgumentParser(
+        prog='tryton-service',
+        description="Keeps a connection to the trytond server, and the "
+        "clients used for figures, open for the builds of a Sphinx project.")
+    parser.add_argument('sourcedir')
+    parser.add_argument(
+        '-c', dest='confdir', help="the directory containing conf.py")
+    parser.add_argument(
+        '-D', dest='define', action='append', default=[],
+        metavar='setting=value', help="override a setting in conf.py")
+    parser.add_argument(
+        '--stop', action='store_true', help="stop the running service")
+    args = parser.parse_args(argv)
+
+    confoverrides = dict(d.split('=', 1) for d in args.define)
+    temp_dir = mkdtemp(prefix='tryton-service-')
+    _tryton_service_running = True
+    try:
+        app = Sphinx(
+            args.sourcedir, args.confdir or args.sourcedir, temp_dir,
+            temp_dir, 'dummy', confoverrides=confoverrides)
+        if not app.config.tryton_service:
+            parser.error("tryton_service is not set in the configuration")
+        address = get_service_address(app.confdir, app.config.tryton_service)
+
+        if args.stop:
+            ServiceConnection(address).call(('service',), 'shutdown')
+            return 0
+
+        service = BuildService(app, address)
+        service.start()
+        logger.info(
+            "tryton build service listening on {address}".format(
+                address=address))
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            service.stop()
+    finally:
+        rmtree(temp_dir, ignore_errors=True)
+    return 0
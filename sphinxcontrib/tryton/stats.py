@@ -0,0 +1,173 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from collections import namedtuple
+from contextlib import contextmanager
+from json import dump
+from os import getpid
+from pathlib import Path
+from sphinx.util import logging
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILENAME = 'tryton-rpc-stats.json'
+
+Call = namedtuple(
+    'Call', ('model', 'method', 'duration', 'document', 'target', 'pid'))
+
+
+class RPCStats(object):
+    "Records the requests made to the trytond server."
+
+    def __init__(self):
+        self.calls = []
+        self.document = None
+        self.target = None
+
+    @contextmanager
+    def for_document(self, document):
+        previous, self.document = self.document, document
+        try:
+            yield
+        finally:
+            self.document = previous
+
+    @contextmanager
+    def for_target(self, target):
+        previous, self.target = self.target, target
+        try:
+            yield
+        finally:
+            self.target = previous
+
+    def record(self, model, method, duration):
+        self.calls.append(Call(
+            model, method, duration, self.document, self.target, getpid()))
+
+    def merge(self, calls):
+        # Forked readers start with a copy of the calls made before the fork
+        self.calls.extend(c for c in calls if c.pid != getpid())
+
+    def instrument(self, config):
+        get_proxy = config.get_proxy
+
+        def instrumented_get_proxy(name, *args, **kwargs):
+            return InstrumentedProxy(
+                get_proxy(name, *args, **kwargs), name, self)
+
+        config.get_proxy = instrumented_get_proxy
+
+    def summary(self, limit=10):
+        def totals(key):
+            result = {}
+            for call in self.calls:
+                name = key(call)
+                count, duration = result.get(name, (0, 0))
+                result[name] = (count + 1, duration + call.duration)
+            return [
+                {'name': n, 'calls': c, 'time': d}
+                for n, (c, d) in sorted(
+                    result.items(), key=lambda i: (-i[1][1], str(i[0])))]
+
+        return {
+            'calls': len(self.calls),
+            'time': sum(c.duration for c in self.calls),
+            'methods': totals(lambda c: '{}.{}'.format(c.model, c.method)),
+            'documents': totals(lambda c: c.document)[:limit],
+            'targets': totals(
+                lambda c: ' '.join(c.target) if c.target else None)[:limit],
+            'slowest': [
+                c._asdict() for c in sorted(
+                    self.calls, key=lambda c: -c.duration)[:limit]],
+            }
+
+    def report(self, filename=None):
+        summary = self.summary()
+        lines = [
+            "tryton rpc summary: {calls} calls in {time:.3f}s".format(
+                **summary),
+            "{:>8} {:>10}  {}".format('calls', 'time (s)', 'method')]
+        for item in summary['methods']:
+            lines.append("{calls:>8} {time:>10.3f}  {name}".format(**item))
+        lines.append("{:>8} {:>10}  {}".format('calls', 'time (s)', 'target'))
+        for item in summary['targets']:
+            lines.append("{calls:>8} {time:>10.3f}  {name}".format(**item))
+        for line in lines:
+            logger.info(line)
+
+        if filename:
+            summary['all'] = [c._asdict() for c in self.calls]
+            with open(str(filename), 'w', encoding='utf-8') as file:
+                dump(summary, file, indent=1)
+
+
+class InstrumentedProxy(object):
+
+    def __init__(self, proxy, model_name, stats):
+        self._proxy = proxy
+        self._model_name = model_name
+        self._stats = stats
+
+    def __getattr__(self, name):
+        method = getattr(self._proxy, name)
+
+        def call(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._stats.record(
+                    self._model_name, name, perf_counter() - start)
+
+        return call
+
+
+def get_rpc_stats(app):
+    return getattr(getattr(app, 'trytond', None), 'stats', None)
+
+
+@contextmanager
+def rpc_phase(app, name):
+    "Labels the requests made while the build is not reading a document."
+    stats = get_rpc_stats(app)
+    if stats is None:
+        yield
+        return
+    with stats.for_document('<{name}>'.format(name=name)):
+        yield
+
+
+def setup_rpc_stats(app, env, docnames):
+    # The calls are kept with the environment so the calls made by parallel
+    # readers are returned to the main process
+    stats = get_rpc_stats(app)
+    env.tryton_rpc_calls = stats.calls if stats else None
+
+
+def note_rpc_document(app, docname, source):
+    stats = get_rpc_stats(app)
+    if stats:
+        stats.document = docname
+
+
+def clear_rpc_document(app, doctree):
+    stats = get_rpc_stats(app)
+    if stats:
+        stats.document = None
+
+
+def merge_rpc_stats(app, env, docnames, other):
+    stats = get_rpc_stats(app)
+    if stats and getattr(other, 'tryton_rpc_calls', None):
+        stats.merge(other.tryton_rpc_calls)
+
+
+def clear_rpc_stats(app, env):
+    env.tryton_rpc_calls = None
+
+
+def report_rpc_stats(app, exception):
+    stats = get_rpc_stats(app)
+    if stats:
+        stats.report(Path(app.outdir) / REPORT_FILENAME)
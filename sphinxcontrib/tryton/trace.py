@@ -0,0 +1,97 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from contextlib import contextmanager
+from json import dump
+from os import getpid
+from pathlib import Path
+from sphinx.util import logging
+from threading import get_ident
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+
+class Tracer(object):
+    "Records spans in the Chrome trace event format."
+
+    def __init__(self):
+        self.events = []
+
+    @contextmanager
+    def span(self, name, category, **args):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': int(start * 1000000),
+                'dur': int((perf_counter() - start) * 1000000),
+                'pid': getpid(),
+                'tid': get_ident(),
+                'args': {k: str(v) for k, v in args.items()},
+                })
+
+    def merge(self, events):
+        # Forked readers start with a copy of the events from before the fork
+        pid = getpid()
+        self.events.extend(e for e in events if e['pid'] != pid)
+
+    def write(self, filename):
+        with open(str(filename), 'w', encoding='utf-8') as file:
+            dump({
+                'traceEvents': sorted(self.events, key=lambda e: e['ts']),
+                'displayTimeUnit': 'ms',
+                }, file)
+
+
+def get_tracer():
+    return globals().get('_tryton_tracer')
+
+
+@contextmanager
+def trace_span(name, category='tryton', **args):
+    tracer = get_tracer()
+    if tracer is None:
+        yield
+    else:
+        with tracer.span(name, category, **args):
+            yield
+
+
+def initialise_trace(app, config):
+    global _tryton_tracer
+    _tryton_tracer = Tracer() if config.tryton_trace_file else None
+
+
+def setup_trace(app, env, docnames):
+    # The events are kept with the environment so the events recorded by
+    # parallel readers are returned to the main process
+    tracer = get_tracer()
+    env.tryton_trace_events = tracer.events if tracer else None
+
+
+def merge_trace(app, env, docnames, other):
+    tracer = get_tracer()
+    if tracer and getattr(other, 'tryton_trace_events', None):
+        tracer.merge(other.tryton_trace_events)
+
+
+def clear_trace(app, env):
+    env.tryton_trace_events = None
+
+
+def write_trace(app, exception):
+    tracer = get_tracer()
+    if tracer is None:
+        return
+    filename = Path(app.confdir) / app.config.tryton_trace_file
+    try:
+        tracer.write(filename)
+    except OSError as err:
+        logger.warning(
+            "could not write the tryton trace file: {error}".format(
+                error=repr(err)))
@@ -1,19 +1,189 @@
 # This file is part of the sphinxcontrib-tryton extension.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
-from functools import lru_cache
+from collections import defaultdict
+from contextlib import contextmanager
+from hashlib import sha1
+from http.client import HTTPException
+from json import dumps, loads
 from os import environ
-from proteus import Model, Wizard, config as proteus_config
+from socket import create_connection
 from sphinx.util import logging
+from threading import Event, Lock, Thread
 from urllib.parse import quote
 from warnings import catch_warnings, filterwarnings
+from xmlrpc.client import ProtocolError
 
+from .cache import MetadataCache
 from .exception import (
     DatabaseAlreadyExistsError, DatabaseInitialisationFailedError,
-    RecordNotFoundError)
+    RecordNotFoundError, TrytondUnavailableError)
+from .pool import PoolIntrospection
+from .stats import RPCStats
+from .trace import trace_span
+
+try:
+    from os import register_at_fork
+except ImportError:
+    register_at_fork = None
+
+Model = Wizard = proteus_config = None
 
 logger = logging.getLogger(__name__)
 
+TRANSPORT_ERRORS = (HTTPException, OSError, ProtocolError)
+
+
+def import_proteus():
+    # Builds that do not use any tryton objects should not pay for importing
+    # proteus, so it is only imported when connecting to the server
+    global Model, Wizard, proteus_config
+
+    if Model is None:
+        from proteus import Model
+    if Wizard is None:
+        from proteus import Wizard
+    if proteus_config is None:
+        from proteus import config as proteus_config
+
+
+def close_xmlrpc_connection():
+    # Parallel readers are forked, so they must not share the persistent
+    # connection to the xmlrpc server with their parent
+    if proteus_config is None:
+        return
+    try:
+        server = getattr(proteus_config.get_config(), 'server', None)
+    except AttributeError:
+        return
+    if server is not None:
+        server('close')()
+
+
+if register_at_fork:
+    register_at_fork(after_in_child=close_xmlrpc_connection)
+
+
+def get_target_model(type_, target):
+    if type_ == 'model':
+        return target
+    if type_ == 'option':
+        return target.rsplit('.', 2)[0]
+    if type_ in ('button', 'field'):
+        return target.rsplit('.', 1)[0]
+
+
+def sort_modules(parents):
+    """Sort the modules so each one comes after all of its parents.
+
+    Returns the sorted module names, and the names of the modules that could
+    not be sorted because of missing parents or dependency cycles.
+    """
+    children = defaultdict(list)
+    waiting = {}
+    for name, module_parents in parents.items():
+        waiting[name] = len(module_parents)
+        for parent in module_parents:
+            children[parent].append(name)
+
+    # Each round only contains the modules whose last parent was sorted in
+    # the previous round, so each module and dependency is only visited once
+    result = []
+    level = [n for n in ('ir', 'res') if n in parents]
+    ready = [n for n, c in waiting.items() if not c and n not in level]
+    if not level:
+        level, ready = sorted(ready), []
+    while level:
+        result.extend(level)
+        for name in level:
+            for child in children[name]:
+                waiting[child] -= 1
+                if not waiting[child] and child not in ('ir', 'res'):
+                    ready.append(child)
+        level, ready = sorted(ready), []
+
+    unsorted = set(parents) - set(result)
+    missing = {
+        n: sorted(p for p in parents[n] if p not in parents)
+        for n in unsorted}
+    missing = {n: p for n, p in missing.items() if p}
+
+    # Removing the modules that nothing unsorted depends on, until none are
+    # left, leaves just the modules in, or between, dependency cycles
+    cycle = set(unsorted)
+    dependants = {
+        n: len([c for c in children[n] if c in cycle]) for n in cycle}
+    leaves = [n for n, c in dependants.items() if not c]
+    while leaves:
+        name = leaves.pop()
+        cycle.discard(name)
+        for parent in parents[name]:
+            if parent in cycle:
+                dependants[parent] -= 1
+                if not dependants[parent]:
+                    leaves.append(parent)
+
+    return result, {'missing': missing, 'cycle': sorted(cycle)}
+
+
+class TrytondHealth(object):
+    "The health of the connection to the trytond server."
+
+    def __init__(self, max_failures, probe_interval, probe):
+        self.max_failures = max_failures
+        self.probe_interval = probe_interval
+        self.probe = probe
+
+        self.failures = 0
+        self.lock = Lock()
+        self.probe_thread = None
+        self.stopped = Event()
+
+    @property
+    def is_available(self):
+        return self.failures < self.max_failures
+
+    def record_success(self):
+        # The failures are also updated by the probe's thread
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            failures = self.failures
+        if failures == self.max_failures:
+            logger.warning(
+                "trytond server unavailable after {failures} failed "
+                "requests - tryton objects will not be resolved until it "
+                "can be reached again".format(failures=failures))
+            self.start_probe()
+
+    def mark_unavailable(self):
+        with self.lock:
+            self.failures = max(self.failures, self.max_failures)
+        self.start_probe()
+
+    def start_probe(self):
+        with self.lock:
+            if self.probe_thread and self.probe_thread.is_alive():
+                return
+            self.probe_thread = Thread(target=self.run_probe, daemon=True)
+            self.probe_thread.start()
+
+    def run_probe(self):
+        while not self.stopped.wait(self.probe_interval):
+            try:
+                self.probe()
+            except Exception:
+                continue
+            logger.info("trytond server is available again")
+            self.record_success()
+            return
+
+    def stop(self):
+        self.stopped.set()
+
 
 class Trytond(object):
 
@@ -23,27 +193,210 @@ class Trytond(object):
         ('database', None),
         ('host', None),
         ('activate_modules', None),
+        ('cache_file', None),
+        ('languages', None),
+        ('max_failures', 3),
+        ('native_pool', False),
         ('password', None),
         ('port', 8000),
+        ('probe_interval', 10),
+        ('rpc_stats', False),
         ('ssl_context', None),
         ('user', 'admin'),
         ]
 
-    def __init__(self, connection_type, **kwargs):
-        method = getattr(self, '_init_{}_connection'.format(connection_type))
+    def __init__(self, connection_type, max_failures=3, probe_interval=10,
+                 cache_file=None, language=None, languages=None,
+                 native_pool=False, activate_modules=None, rpc_stats=False,
+                 **kwargs):
+        self.connection_type = connection_type
+        self.connection = kwargs
+        self.modules_to_activate = activate_modules
+        self.native_pool = native_pool
+        self.native = None
+        self.language = language
+        self.languages = list(languages or [])
+        self.connected = False
+        self.models = {}
+        self.module_orders = {}
+        self.properties = {}
+        self.uncached = set()
+        self.max_failures = int(max_failures)
+        self.probe_interval = float(probe_interval)
+        self.health = TrytondHealth(
+            self.max_failures, self.probe_interval, self.probe)
+        self.stats = RPCStats() if rpc_stats else None
+
+        self.cache = None
+        self.cache_validator = None
+        if cache_file:
+            self.cache = MetadataCache(cache_file, self.get_cache_namespace())
+
+    def __getstate__(self):
+        # The connection details and cache are not saved with the environment
+        state = self.__dict__.copy()
+        state.pop('connection', None)
+        state.pop('health', None)
+        state.pop('models', None)
+        state.pop('module_orders', None)
+        state.pop('native', None)
+        state.pop('properties', None)
+        state.pop('stats', None)
+        state.pop('uncached', None)
+        state.pop('cache', None)
+        state.pop('cache_validator', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.connection = {}
+        self.connected = False
+        self.models = {}
+        self.module_orders = {}
+        self.native = None
+        self.properties = {}
+        self.uncached = set()
+        self.stats = None
+        self.cache = None
+        self.cache_validator = None
+        self.health = TrytondHealth(
+            self.max_failures, self.probe_interval, self.probe)
+
+    def connect(self):
+        import_proteus()
+
+        activate_modules, self.modules_to_activate = (
+            self.modules_to_activate, None)
+        if activate_modules is not None:
+            with trace_span('create database', 'trytond'):
+                if not self.create_database():
+                    activate_modules = None
+
+        method = getattr(
+            self, '_init_{}_connection'.format(self.connection_type))
         try:
-            method(**kwargs)
+            with trace_span(
+                    'connect', 'trytond', connection=self.connection_type):
+                method(**self.connection)
         except Exception as err:
             logger.warning(
                 "could not connect to Trytond server: {error}".format(
                     error=repr(err)))
+            self.health.mark_unavailable()
+            return
+        self.connected = True
+        if self.stats:
+            self.stats.instrument(proteus_config.get_config())
+
+        if activate_modules:
+            with trace_span('activate modules', 'trytond'):
+                self.activate_modules(activate_modules)
+
+    def ensure_connected(self):
+        if not self.connected and self.health.is_available:
+            self.connect()
+
+    def create_database(self):
+        try:
+            self.initialise_database(self.connection['database'])
+        except DatabaseAlreadyExistsError:
+            logger.warning(
+                "database already exists - skipping module activation")
+            return False
+        except DatabaseInitialisationFailedError as err:
+            logger.warning(
+                "database could not be created: {error} - "
+                "skipping module activation".format(error=repr(err)))
+            return False
+        return True
+
+    def get_cache_namespace(self):
+        server = [self.connection_type] + [
+            self.connection.get(n)
+            for n in ('config_file', 'database', 'host', 'port', 'user')]
+        return sha1(dumps(server, default=str).encode('utf-8')).hexdigest()
+
+    def get_cache_validator(self):
+        if self.cache_validator is None:
+            try:
+                with self.rpc():
+                    modules = self.search_read(
+                        'ir.module', [('state', '=', 'activated')],
+                        ['name', 'write_date', 'create_date'])
+            except Exception:
+                return None
+            versions = sorted(
+                (m['name'], str(m.get('write_date') or m.get('create_date')))
+                for m in modules)
+            self.cache_validator = sha1(
+                dumps(versions).encode('utf-8')).hexdigest()
+        return self.cache_validator
+
+    def get_cached_properties(self, keys):
+        if not self.cache:
+            return {}
+        return self.cache.get_many(keys, self.get_cache_validator())
+
+    def set_cached_properties(self, properties):
+        if self.cache and properties:
+            self.cache.set_many(properties, self.get_cache_validator())
+
+    def flush_cached_properties(self):
+        # The properties found since the last flush are written in a single
+        # transaction, instead of locking the cache on each lookup
+        uncached, self.uncached = self.uncached, set()
+        self.set_cached_properties({
+            k: self.properties[k] for k in uncached if k in self.properties})
+
+    def get_languages(self):
+        return [self.language] + [
+            lang for lang in self.languages if lang != self.language]
+
+    @contextmanager
+    def set_language(self, language):
+        if language is None:
+            yield
+            return
+        with proteus_config.get_config().set_context(language=language):
+            yield
+
+    def probe(self):
+        method = getattr(
+            self, '_probe_{}_connection'.format(self.connection_type))
+        method(**self.connection)
+
+    @contextmanager
+    def for_target(self, *target):
+        if self.stats is None:
+            yield
+        else:
+            with self.stats.for_target(target):
+                yield
+
+    @contextmanager
+    def rpc(self):
+        if not self.health.is_available:
+            raise TrytondUnavailableError("trytond server is unavailable")
+        if not self.connected:
+            self.connect()
+            if not self.connected:
+                raise TrytondUnavailableError("trytond server is unavailable")
+
+        try:
+            yield
+        except TRANSPORT_ERRORS as err:
+            self.health.record_failure()
+            raise TrytondUnavailableError(repr(err)) from err
+        self.health.record_success()
 
     def _init_trytond_connection(self, user, config_file, database=':memory:',
                                  **kwargs):
-        proteus_config.set_trytond(
+        config = proteus_config.set_trytond(
             database=database,
             user=user,
             config_file=config_file)
+        if self.native_pool:
+            self.native = PoolIntrospection(config)
 
     def _init_xmlrpc_connection(self, host, user, password, database='tryton',
                                 ssl_context=None, port=8000, **kwargs):
@@ -53,6 +406,13 @@ class Trytond(object):
                 port=int(port), database=quote(database)),
             context=ssl_context)
 
+    def _probe_trytond_connection(self, **kwargs):
+        pass
+
+    def _probe_xmlrpc_connection(self, host, port=8000, **kwargs):
+        timeout = self.health.probe_interval
+        create_connection((host, int(port)), timeout).close()
+
     @classmethod
     def add_config_values(cls, app):
         for name, default in cls.config_options:
@@ -105,46 +465,316 @@ class Trytond(object):
         Wizard('ir.module.activate_upgrade').execute('upgrade')
 
     def get_modules(self, domain):
-        Module = Model.get('ir.module')
-        modules = Module.find(domain)
+        with self.rpc(), self.for_target('modules'):
+            modules = self.search_read(
+                'ir.module', domain,
+                ['name', 'state', 'write_date', 'create_date'])
+
+            # The order only changes when the state of the modules does
+            key = ('modules', dumps(domain, default=str))
+            validator = sha1(dumps(sorted(
+                (m['name'], m['state'],
+                 str(m.get('write_date') or m.get('create_date')))
+                for m in modules)).encode('utf-8')).hexdigest()
+            if (key, validator) not in self.module_orders:
+                cached = (
+                    self.cache.get_many([key], validator)
+                    if self.cache else {})
+                if key in cached:
+                    order = loads(cached[key])
+                else:
+                    order = self._get_modules_order(modules)
+                    if self.cache and order is not None:
+                        self.cache.set_many({key: dumps(order)}, validator)
+                self.module_orders[(key, validator)] = order
 
-        def walk_graph(graph):
-            roots = ['ir', 'res']
-            while roots:
-                for root in roots:
-                    for node in graph:
-                        graph[node].discard(root)
-                    del graph[root]
-                    yield root
-                roots = sorted([n for n, p in graph.items() if not p])
-            assert not graph, "module graph is disconnected"
+        order = self.module_orders[(key, validator)]
+        if order is None:
+            raise ValueError("the module dependency graph cannot be sorted")
+        return list(order)
 
-        graph = {m.name: set(p.name for p in m.parents) for m in modules}
+    def _get_modules_order(self, modules):
+        names = {m['id']: m['name'] for m in modules}
+        parents = {n: set() for n in names.values()}
+        for row in self.search_read(
+                'ir.module.dependency', [('module', 'in', list(names))],
+                ['module', 'name']):
+            parents[names[row['module']]].add(row['name'])
 
-        return list(walk_graph(graph))
+        order, unsorted = sort_modules(parents)
+        for name, missing in sorted(unsorted['missing'].items()):
+            logger.warning(
+                "tryton module {name} depends on modules that are not "
+                "available: {missing}".format(
+                    name=name, missing=', '.join(missing)))
+        if unsorted['cycle']:
+            logger.warning(
+                "tryton modules have cyclic dependencies: {modules}".format(
+                    modules=', '.join(unsorted['cycle'])))
+        if unsorted['missing'] or unsorted['cycle']:
+            return None
+        return order
 
-    @lru_cache(maxsize=1024)
     def get_property(self, type_, name, property=None):
-        method = getattr(self, '_get_property_{}'.format(type_))
-        args = [name]
-        if property:
-            args.append(property)
-        return method(*args)
+        key = (self.language, type_, name, property)
+        if key in self.properties:
+            return self.properties[key]
+        try:
+            with self.rpc(), self.set_language(self.language), \
+                    self.for_target(type_, name):
+                return self._get_property(type_, name, property)
+        except TrytondUnavailableError:
+            return None
 
-    def get_record(self, model_name, domain=None, id=None):
+    def _get_property(self, type_, name, property=None):
+        key = (self.language, type_, name, property)
+        if key not in self.properties and self.native:
+            value = self.native.get_property(
+                type_, name, property, self.language)
+            if value is not NotImplemented:
+                self.properties[key] = value
+        if key not in self.properties:
+            self.properties.update(self.get_cached_properties([key]))
+        if key not in self.properties:
+            method = getattr(self, '_get_property_{}'.format(type_))
+            args = [name]
+            if property:
+                args.append(property)
+            self.properties[key] = method(*args)
+            self.uncached.add(key)
+        return self.properties[key]
+
+    def prefetch(self, lookups, languages=None):
+        if languages is None:
+            languages = self.get_languages()
+        lookups = set(
+            (lang,) + tuple(k) for lang in languages for k in lookups)
+        lookups -= set(self.properties)
+        if self.native:
+            for key in list(lookups):
+                value = self.native.get_property(*key[1:], language=key[0])
+                if value is not NotImplemented:
+                    self.properties[key] = value
+                    lookups.remove(key)
+        self.properties.update(self.get_cached_properties(lookups))
+        lookups -= set(self.properties)
+        if not lookups:
+            return
+
+        by_language = defaultdict(set)
+        for language, type_, name, property in lookups:
+            by_language[language].add((type_, name, property))
+
+        known = set(self.properties)
         try:
-            RecordModel = Model.get(model_name)
+            with self.rpc(), self.for_target('prefetch'):
+                for language in languages:
+                    if by_language[language]:
+                        with self.set_language(language):
+                            self._prefetch(language, by_language[language])
+        except TrytondUnavailableError:
+            pass
         except Exception as err:
-            raise RecordNotFoundError(
-                "model '{model}' not found".format(model=model_name)) from err
+            logger.warning(
+                "could not prefetch tryton objects: {error}".format(
+                    error=repr(err)))
+        self.uncached.update(k for k in self.properties if k not in known)
+        self.flush_cached_properties()
+
+    def _prefetch(self, language, lookups):
+        by_type = defaultdict(set)
+        for type_, name, property in lookups:
+            by_type[type_].add((name, property))
+        # Option labels include the description of their field
+        by_type['field'].update(
+            (n.rsplit('.', 1)[0], None) for n, _ in by_type['option'])
+
+        def readable(model_name, properties):
+            fields = Model.get(model_name)._fields
+            return [
+                p for p in properties
+                if fields.get(p, {}).get('type') in ('char', 'text')]
+
+        def store(type_, name, property, value):
+            self.properties[(language, type_, name, property)] = value
+
+        # The rows are read in the language of the context, so the labels
+        # come back translated and each table is read once per language.
+        # ir.model is read first as the fields and buttons refer to their
+        # model by id and the field labels start with the model label.
+        model_names = set(n for n, _ in by_type['model'])
+        model_names.update(
+            n.rsplit('.', 1)[0] for t in ('button', 'field')
+            for n, _ in by_type[t])
+        models = {}
+        if model_names:
+            properties = set(p or 'name' for _, p in by_type['model'])
+            properties.add('name')
+            properties = readable('ir.model', properties)
+            for row in self.search_read(
+                    'ir.model', [('model', 'in', list(model_names))],
+                    ['model'] + properties):
+                models[row['model']] = row
+            for name, property in by_type['model'] | {
+                    (n, None) for n in model_names}:
+                if (property or 'name') in properties:
+                    row = models.get(name, {})
+                    store('model', name, property, row.get(property or 'name'))
+
+        if by_type['field']:
+            properties = set(
+                p or 'field_description' for _, p in by_type['field'])
+            properties = readable('ir.model.field', properties)
+            model_ids = {r['id']: m for m, r in models.items()}
+            field_names = set(
+                n.rsplit('.', 1)[1] for n, _ in by_type['field'])
+            fields = {}
+            for row in self.search_read(
+                    'ir.model.field', [
+                        ('model', 'in', list(model_ids)),
+                        ('name', 'in', list(field_names))],
+                    ['model', 'name'] + properties):
+                fields['{model}.{field}'.format(
+                    model=model_ids[row['model']], field=row['name'])] = row
+            for name, property in by_type['field']:
+                field_property = property or 'field_description'
+                if field_property not in properties:
+                    continue
+                row = fields.get(name)
+                value = row[field_property] if row else None
+                if row and field_property == 'field_description':
+                    value = '{model}.{field}'.format(
+                        model=self.properties[(
+                            language, 'model', name.rsplit('.', 1)[0], None)],
+                        field=value)
+                store('field', name, property, value)
 
-        if id is not None:
-            return RecordModel(id)
+        if by_type['button']:
+            properties = readable(
+                'ir.model.button',
+                set(p or 'string' for _, p in by_type['button']))
+            model_ids = {r['id']: m for m, r in models.items()}
+            buttons = {}
+            for row in self.search_read(
+                    'ir.model.button', [
+                        ('model', 'in', list(model_ids)),
+                        ('name', 'in', list(set(
+                            n.rsplit('.', 1)[1]
+                            for n, _ in by_type['button'])))],
+                    ['model', 'name'] + properties):
+                buttons['{model}.{button}'.format(
+                    model=model_ids[row['model']], button=row['name'])] = row
+            for name, property in by_type['button']:
+                button_property = property or 'string'
+                if button_property in properties:
+                    row = buttons.get(name, {})
+                    store('button', name, property, row.get(button_property))
 
-        if domain is not None:
-            records = RecordModel.find(domain, limit=1)
-            if records:
-                return records[0]
+        if by_type['option']:
+            selections = defaultdict(set)
+            for name, _ in by_type['option']:
+                model_name, field_name, _ = name.rsplit('.', 2)
+                selections[model_name].add(field_name)
+            definitions = {}
+            for model_name, field_names in selections.items():
+                try:
+                    definitions[model_name] = self.fields_get(
+                        model_name, sorted(field_names))
+                except TRANSPORT_ERRORS:
+                    raise
+                except Exception:
+                    # Missing models are reported when resolved one by one
+                    continue
+            for name, property in by_type['option']:
+                model_name, field_name, option_name = name.rsplit('.', 2)
+                selection = definitions.get(model_name, {}).get(
+                    field_name, {}).get('selection')
+                if not isinstance(selection, (list, tuple)):
+                    continue
+                field = self.properties.get((
+                    language, 'field', name.rsplit('.', 1)[0], None))
+                labels = dict((o, n) for o, n in selection)
+                value = None
+                if option_name in labels:
+                    value = '{field}.{option}'.format(
+                        field=field, option=labels[option_name])
+                store('option', name, property, value)
+
+        if by_type['wizard']:
+            properties = readable(
+                'ir.action.wizard',
+                set(p or 'name' for _, p in by_type['wizard']))
+            wizards = {}
+            for row in self.search_read(
+                    'ir.action.wizard', [('wiz_name', 'in', list(set(
+                        n for n, _ in by_type['wizard'])))],
+                    ['wiz_name'] + properties):
+                wizards.setdefault(row['wiz_name'], row)
+            for name, property in by_type['wizard']:
+                wizard_property = property or 'name'
+                if wizard_property in properties:
+                    row = wizards.get(name, {})
+                    store('wizard', name, property, row.get(wizard_property))
+
+        xml_ids = set(
+            n for t in ('data', 'menu') for n, _ in by_type[t] if '.' in n)
+        if xml_ids:
+            records = {}
+            for row in self.search_read(
+                    'ir.model.data', [
+                        ('module', 'in', list(set(
+                            n.split('.', 1)[0] for n in xml_ids))),
+                        ('fs_id', 'in', list(set(
+                            n.split('.', 1)[1] for n in xml_ids)))],
+                    ['module', 'fs_id', 'model', 'db_id']):
+                name = '{module}.{fs_id}'.format(**row)
+                if name in xml_ids:
+                    records[name] = (row['model'], row['db_id'])
+
+            defaults = {'data': 'name', 'menu': 'complete_name'}
+            wanted = defaultdict(set)
+            for type_, default in defaults.items():
+                for name, property in by_type[type_]:
+                    if name not in records:
+                        if name in xml_ids:
+                            store(type_, name, property, None)
+                        continue
+                    model_name, db_id = records[name]
+                    if type_ == 'menu' and model_name != 'ir.ui.menu':
+                        store(type_, name, property, None)
+                        continue
+                    wanted[model_name].add(
+                        (type_, name, property, property or default))
+
+            for model_name, items in wanted.items():
+                properties = readable(model_name, set(i[3] for i in items))
+                ids = list(set(records[i[1]][1] for i in items))
+                values = {
+                    row['id']: row for row in self.search_read(
+                        model_name, [('id', 'in', ids)], properties)}
+                for type_, name, property, record_property in items:
+                    if record_property in properties:
+                        row = values.get(records[name][1], {})
+                        store(type_, name, property, row.get(record_property))
+
+    def get_record(self, model_name, domain=None, id=None):
+        with self.rpc():
+            try:
+                RecordModel = Model.get(model_name)
+            except TRANSPORT_ERRORS:
+                raise
+            except Exception as err:
+                raise RecordNotFoundError(
+                    "model '{model}' not found".format(
+                        model=model_name)) from err
+
+            if id is not None:
+                return RecordModel(id)
+
+            if domain is not None:
+                records = RecordModel.find(domain, limit=1)
+                if records:
+                    return records[0]
 
     def get_data_record(self, xml_id, domain=None):
         module_name, fs_id = xml_id.split('.', 1)
@@ -159,24 +789,212 @@ class Trytond(object):
         return self.get_record(record.model, id=record.db_id)
 
     def get_main_menu_item_path(self, xml_id):
-        menuitem = self.get_data_record(xml_id)
-        path = [menuitem.id]
-        while menuitem.parent:
-            menuitem = menuitem.parent
-            path.append(menuitem.id)
+        with self.for_target('menu', xml_id):
+            menuitem = self.get_data_record(xml_id)
+            path = [menuitem.id]
+            while menuitem.parent:
+                menuitem = menuitem.parent
+                path.append(menuitem.id)
         path.reverse()
         return path
 
     def get_view(self, xml_id):
-        view = self.get_data_record(xml_id)
-        action = self.get_record('ir.action.act_window', domain=[
-            ('res_model', '=', view.model)])
+        with self.for_target('view', xml_id):
+            view = self.get_data_record(xml_id)
+            action = self.get_record('ir.action.act_window', domain=[
+                ('res_model', '=', view.model)])
         return {
             'view_id': view.id,
             'model': view.model,
             'title': action.name,
             }
 
+    def get_view_architecture(self, xml_id):
+        try:
+            with self.rpc(), self.set_language(self.language), \
+                    self.for_target('view', xml_id):
+                view = self.get_data_record(xml_id)
+                if view is None:
+                    return None
+                action = self.get_record('ir.action.act_window', domain=[
+                    ('res_model', '=', view.model)])
+                RecordModel = Model.get(view.model)
+                result = RecordModel._proxy.fields_view_get(
+                    view.id, view.type, RecordModel._config.context)
+        except TrytondUnavailableError:
+            return None
+        return {
+            'model': view.model,
+            'title': action.name if action else None,
+            'type': result.get('type', view.type),
+            'arch': result['arch'],
+            'fields': result['fields'],
+            }
+
+    def get_model_metadata(self, model_name):
+        key = (self.language, model_name)
+        if key not in self.models:
+            self.models[key] = self._load_model_metadata(model_name)
+        return self.models[key]
+
+    def _load_model_metadata(self, model_name):
+        def readable(model_name):
+            return [
+                n for n, f in Model.get(model_name)._fields.items()
+                if f.get('type') in ('char', 'selection', 'text')]
+
+        models = self.search_read(
+            'ir.model', [('model', '=', model_name)],
+            ['model'] + readable('ir.model'))
+        if not models:
+            return
+        model = models[0]
+
+        fields = {
+            row['name']: row for row in self.search_read(
+                'ir.model.field', [('model', '=', model['id'])],
+                ['name', 'ttype'] + readable('ir.model.field'))}
+
+        # The selections are only loaded once an option is looked up
+        return {
+            'model': model,
+            'fields': fields,
+            'selections': None,
+            }
+
+    def _load_model_selections(self, model_name, metadata):
+        selection_fields = sorted(
+            n for n, f in metadata['fields'].items()
+            if f.get('ttype') in ('multiselection', 'selection'))
+        selections = {}
+        if selection_fields:
+            try:
+                selections = {
+                    n: f.get('selection') for n, f in self.fields_get(
+                        model_name, selection_fields).items()}
+            except TRANSPORT_ERRORS:
+                raise
+            except Exception as err:
+                logger.warning(
+                    "selections of model '{model}' could not be read: "
+                    "{error}".format(model=model_name, error=err))
+        metadata['selections'] = selections
+        return selections
+
+    def fields_get(self, model_name, fields_names):
+        RecordModel = Model.get(model_name)
+        return RecordModel._proxy.fields_get(
+            fields_names, RecordModel._config.context)
+
+    def search_read(self, model_name, domain, fields_names):
+        RecordModel = Model.get(model_name)
+        return RecordModel._proxy.search_read(
+            domain, 0, None, None, fields_names, RecordModel._config.context)
+
+    def forget_targets(self, targets):
+        "Forgets what was loaded about the targets, so it is looked up again"
+        targets = set(tuple(t) for t in targets)
+        models = set(get_target_model(*t) for t in targets) - {None}
+        for key in list(self.properties):
+            if key[1:3] in targets:
+                del self.properties[key]
+                self.uncached.discard(key)
+        for key in list(self.models):
+            if key[1] in models:
+                del self.models[key]
+
+    def get_fingerprints(self, targets):
+        try:
+            with self.rpc():
+                return self._get_fingerprints(targets)
+        except TrytondUnavailableError:
+            return None
+        except Exception as err:
+            logger.warning(
+                "could not check tryton objects for changes: {error}".format(
+                    error=repr(err)))
+            return None
+
+    def _get_fingerprints(self, targets):
+        def last_change(row):
+            dates = [row.get('write_date'), row.get('create_date')]
+            return str(max((d for d in dates if d), default=''))
+
+        models = {
+            t: get_target_model(*t) for t in targets
+            if get_target_model(*t)}
+        wizards = {t: t[1] for t in targets if t[0] == 'wizard'}
+        xml_ids = {
+            t: t[1].split('.', 1) for t in targets
+            if t[0] in ('data', 'menu', 'view') and '.' in t[1]}
+
+        model_changes = {}
+        if models:
+            model_ids = {}
+            for row in self.search_read(
+                    'ir.model', [('model', 'in', list(set(models.values())))],
+                    ['model', 'write_date', 'create_date']):
+                model_ids[row['id']] = row['model']
+                model_changes[row['model']] = [last_change(row)]
+            for row in self.search_read(
+                    'ir.model.field', [('model', 'in', list(model_ids))],
+                    ['model', 'write_date', 'create_date']):
+                model_changes[model_ids[row['model']]].append(
+                    last_change(row))
+
+        wizard_changes = {}
+        if wizards:
+            for row in self.search_read(
+                    'ir.action.wizard',
+                    [('wiz_name', 'in', list(set(wizards.values())))],
+                    ['wiz_name', 'write_date', 'create_date']):
+                wizard_changes[row['wiz_name']] = [last_change(row)]
+
+        data_changes, module_changes = {}, {}
+        if xml_ids:
+            modules = list(set(m for m, _ in xml_ids.values()))
+            for row in self.search_read(
+                    'ir.module', [('name', 'in', modules)],
+                    ['name', 'write_date', 'create_date']):
+                module_changes[row['name']] = last_change(row)
+
+            records = {}
+            for row in self.search_read(
+                    'ir.model.data', [
+                        ('module', 'in', modules),
+                        ('fs_id', 'in', list(set(
+                            f for _, f in xml_ids.values())))],
+                    ['module', 'fs_id', 'model', 'db_id', 'write_date',
+                     'create_date']):
+                key = (row['module'], row['fs_id'])
+                data_changes[key] = [last_change(row)]
+                records.setdefault(row['model'], {})[row['db_id']] = key
+            for model_name in set(records) & {'ir.ui.menu', 'ir.ui.view'}:
+                for row in self.search_read(
+                        model_name, [('id', 'in', list(records[model_name]))],
+                        ['write_date', 'create_date']):
+                    key = records[model_name][row['id']]
+                    data_changes[key].append(last_change(row))
+
+        result = {}
+        for target in targets:
+            if target in models:
+                changes = model_changes.get(models[target])
+            elif target in wizards:
+                changes = wizard_changes.get(wizards[target])
+            elif target in xml_ids:
+                module, fs_id = xml_ids[target]
+                changes = data_changes.get((module, fs_id))
+                if changes is not None:
+                    changes = changes + [module_changes.get(module, '')]
+            else:
+                continue
+            if changes is not None:
+                changes = '{count}:{last}'.format(
+                    count=len(changes), last=max(changes))
+            result[target] = changes
+        return result
+
     def _get_property_button(self, button_name, property='string'):
         model_name, button_name = button_name.rsplit('.', 1)
         model = self.get_record('ir.model', domain=[
@@ -194,15 +1012,16 @@ class Trytond(object):
     def _get_property_field(self, field_name, property='field_description'):
         model_name, field_name = field_name.rsplit('.', 1)
 
-        model = self.get_record('ir.model', domain=[
-            ('model', '=', model_name)])
-        field = self.get_record('ir.model.field', domain=[
-            ('model', '=', model.id if model else -1),
-            ('name', '=', field_name)])
+        metadata = self.get_model_metadata(model_name)
+        field = metadata['fields'].get(field_name) if metadata else None
         if field is None:
             return
 
-        field_str = getattr(field, property)
+        if property in field:
+            field_str = field[property]
+        else:
+            field_str = getattr(self.get_record(
+                'ir.model.field', id=field['id']), property)
 
         if property == 'field_description':
             model_str = self.get_property('model', model_name)
@@ -215,20 +1034,31 @@ class Trytond(object):
         return getattr(menu, property, None)
 
     def _get_property_model(self, model_name, property='name'):
-        model = self.get_record('ir.model', domain=[
-            ('model', '=', model_name)])
+        metadata = self.get_model_metadata(model_name)
+        if metadata is None:
+            return
+        if property in metadata['model']:
+            return metadata['model'][property]
+        model = self.get_record('ir.model', id=metadata['model']['id'])
         return getattr(model, property, None)
 
     def _get_property_option(self, option, property='name'):
         model_name, field_name, option_name = option.rsplit('.', 2)
 
-        try:
-            RecordModel = Model.get(model_name)
-            selection = RecordModel._fields[field_name]['selection']
-        except Exception as err:
+        # The selections are read with the model's other fields, in the
+        # current language, as proteus caches the model definition in the
+        # language it was first loaded in
+        metadata = self.get_model_metadata(model_name)
+        selections = {}
+        if metadata:
+            selections = metadata['selections']
+            if selections is None:
+                selections = self._load_model_selections(model_name, metadata)
+        selection = selections.get(field_name)
+        if not isinstance(selection, (list, tuple)):
             raise RecordNotFoundError(
                 "field '{model}.{field}' not found".format(
-                    model=model_name, field=field_name)) from err
+                    model=model_name, field=field_name))
 
         field = self._get_property_field(
             '{model}.{field}'.format(model=model_name, field=field_name))
@@ -247,26 +1077,43 @@ def initialise_trytond(app, config):
     if getattr(app, 'trytond', None):
         return
 
-    trytond_config = Trytond.get_config(config)
-    activate_modules = trytond_config.get('activate_modules')
-    if activate_modules is not None:
-        try:
-            Trytond.initialise_database(trytond_config['database'])
-        except DatabaseAlreadyExistsError:
-            activate_modules = None
-            logger.warning(
-                "database already exists - skipping module activation")
-        except DatabaseInitialisationFailedError as err:
-            activate_modules = None
-            logger.warning(
-                "database could not be created: {error} - "
-                "skipping module activation".format(error=repr(err)))
-
-    app.trytond = Trytond(**trytond_config)
-
-    if activate_modules:
-        app.trytond.activate_modules(activate_modules)
+    # The server is only connected to when it is first needed
+    app.trytond = Trytond(
+        language=config.language, **Trytond.get_config(config))
 
 
 def setup_env(app, env, docnames):
     env.trytond = app.trytond
+
+
+def setup_connect(app, env, docnames):
+    # Parallel readers are forked from this process, so they must find the
+    # database created, and its modules activated, instead of each doing so
+    trytond = getattr(app, 'trytond', None)
+    ensure_connected = getattr(trytond, 'ensure_connected', None)
+    if not docnames or not ensure_connected:
+        return
+    if (app.parallel > 1
+            or getattr(trytond, 'modules_to_activate', None) is not None):
+        ensure_connected()
+
+
+def write_cached_properties(app, *args):
+    flush_cached_properties = getattr(
+        getattr(app, 'trytond', None), 'flush_cached_properties', None)
+    if flush_cached_properties:
+        flush_cached_properties()
+
+
+def write_reader_cached_properties(app, doctree):
+    # Forked readers exit before env-updated, so each writes the properties
+    # it found once it has read a document
+    if app.parallel > 1:
+        write_cached_properties(app)
+
+
+def cleanup_trytond(app, exception):
+    write_cached_properties(app)
+    health = getattr(getattr(app, 'trytond', None), 'health', None)
+    if health:
+        health.stop()
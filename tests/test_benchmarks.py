@@ -0,0 +1,98 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from unittest import SkipTest, TestCase
+from xmlrpc.client import Fault, ServerProxy
+
+from benchmarks import metadata
+from benchmarks.backend import FakeDatabase, generate_fixtures
+from benchmarks.server import StandInServer
+
+
+class TestFakeDatabase(TestCase):
+
+    def setUp(self):
+        self.database = FakeDatabase(generate_fixtures(models=2, fields=2))
+
+    def test_search_read(self):
+        rows = self.database.call('ir.model', 'search_read', (
+            [('model', 'in', ['bench.model1'])], 0, None, None,
+            ['model', 'name'], {}))
+        self.assertEqual(
+            [(r['model'], r['name']) for r in rows],
+            [('bench.model1', 'Bench Model 1')])
+
+    def test_read(self):
+        ids = self.database.call('ir.ui.menu', 'search', (
+            [('name', '=', 'Menu 1')], 0, 1, None, {}))
+        rows = self.database.call(
+            'ir.ui.menu', 'read', (ids, ['complete_name'], {}))
+        self.assertEqual(rows[0]['complete_name'], 'Bench / Menu 1')
+
+    def test_fields_get(self):
+        fields = self.database.call(
+            'bench.model0', 'fields_get', (['state'], {}))
+        self.assertEqual(fields['state']['type'], 'selection')
+        self.assertEqual(
+            fields['state']['selection'][0], ('option0', 'Option 0'))
+
+    def test_missing_model(self):
+        with self.assertRaises(KeyError):
+            self.database.call('missing.model', 'fields_get', (None, {}))
+
+
+class TestStandInServer(TestCase):
+
+    def setUp(self):
+        database = FakeDatabase(generate_fixtures(models=2, fields=2))
+        self.server = StandInServer(database, database_name='bench')
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.proxy = ServerProxy(
+            'http://localhost:{}/bench/'.format(self.server.port),
+            allow_none=True, use_builtin_types=True)
+        self.addCleanup(self.proxy('close'))
+
+    def test_search_read(self):
+        rows = self.proxy.model.ir.model.search_read(
+            [('model', '=', 'bench.model0')], 0, None, None, ['name'], {})
+        self.assertEqual([r['name'] for r in rows], ['Bench Model 0'])
+        self.assertEqual(self.server.requests, 1)
+
+    def test_list_methods(self):
+        methods = self.proxy.system.listMethods()
+        self.assertIn('model.bench.model1.fields_get', methods)
+
+    def test_missing_model(self):
+        with self.assertRaises(Fault):
+            self.proxy.model.missing.model.fields_get(None, {})
+
+
+class TestMetadataBenchmark(TestCase):
+
+    def test_run(self):
+        results = dict(metadata.run(documents=2, references=10, models=3))
+        self.assertEqual(results['cold']['warnings'], 0)
+        self.assertEqual(results['prefetch']['warnings'], 0)
+        self.assertGreater(results['cold']['rpc_calls'], 0)
+        self.assertLess(
+            results['prefetch']['rpc_calls'], results['cold']['rpc_calls'])
+
+    def test_run_server(self):
+        results = dict(metadata.run(
+            documents=1, references=10, models=3, server=True))
+        self.assertEqual(results['cold']['warnings'], 0)
+        self.assertGreater(results['cold']['rpc_calls'], 0)
+
+
+class TestFiguresBenchmark(TestCase):
+
+    def test_run(self):
+        try:
+            from benchmarks import figures
+        except ImportError:
+            raise SkipTest("Pillow and selenium are not available.")
+        result = figures.run(figures=3)
+        self.assertEqual(result['warnings'], 0)
+        self.assertEqual(result['figures'], 3)
+        self.assertGreater(result['bytes'], 0)
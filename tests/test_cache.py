@@ -0,0 +1,60 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from pathlib import Path
+from pickle import dumps, loads
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from sphinxcontrib.tryton.cache import MetadataCache
+
+
+class TestMetadataCache(TestCase):
+
+    def setUp(self):
+        self.temp_dir = mkdtemp()
+        self.addCleanup(rmtree, self.temp_dir, ignore_errors=True)
+        self.filename = Path(self.temp_dir) / 'metadata.sqlite'
+        self.cache = MetadataCache(self.filename, 'namespace')
+
+    def test_get_set(self):
+        "Test values stored in the cache can be retrieved."
+        key = ('field', 'model.name.field_name', None)
+        self.cache.set_many({key: 'Model.Field'}, 'validator')
+        self.assertEqual(
+            self.cache.get_many([key], 'validator'), {key: 'Model.Field'})
+
+    def test_shared(self):
+        "Test values are shared between caches using the same file."
+        key = ('model', 'model.name', 'name')
+        self.cache.set_many({key: 'Model'}, 'validator')
+        other = MetadataCache(self.filename, 'namespace')
+        self.assertEqual(other.get_many([key], 'validator'), {key: 'Model'})
+
+    def test_validator(self):
+        "Test values stored with a different validator are ignored."
+        key = ('model', 'model.name', None)
+        self.cache.set_many({key: 'Model'}, 'old')
+        self.assertEqual(self.cache.get_many([key], 'new'), {})
+        self.assertEqual(self.cache.get_many([key], None), {})
+
+    def test_namespace(self):
+        "Test values from a different server are ignored."
+        key = ('model', 'model.name', None)
+        self.cache.set_many({key: 'Model'}, 'validator')
+        other = MetadataCache(self.filename, 'other')
+        self.assertEqual(other.get_many([key], 'validator'), {})
+
+    def test_uncacheable(self):
+        "Test values that cannot be stored are left out of the cache."
+        key = ('data', 'module.xml_id', 'parent')
+        self.cache.set_many({key: object()}, 'validator')
+        self.assertEqual(self.cache.get_many([key], 'validator'), {})
+
+    def test_pickle(self):
+        "Test the cache can be pickled without its connection."
+        key = ('model', 'model.name', None)
+        self.cache.set_many({key: 'Model'}, 'validator')
+        cache = loads(dumps(self.cache))
+        self.assertEqual(cache.get_many([key], 'validator'), {key: 'Model'})
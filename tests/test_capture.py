@@ -0,0 +1,192 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from pathlib import Path
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+from sphinx_testing import with_app
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from sphinxcontrib.tryton.capture import get_capture_outdated_docs, main
+from sphinxcontrib.tryton.client_sao import ClientSao
+from sphinxcontrib.tryton.client_tryton import ClientTryton
+from sphinxcontrib.tryton.domain import get_clients_in_use
+from sphinxcontrib.tryton.trytond import Trytond
+
+
+class MockTrytond(object):
+    def __init__(self, **kwargs):
+        self.lookups = []
+
+    @classmethod
+    def get_config(cls, config):
+        return Trytond.get_config(config)
+
+    def get_property(self, type_, name, property=None):
+        self.lookups.append((type_, name, property))
+        return (property or name).title()
+
+    def get_fingerprints(self, targets):
+        return {t: 'fingerprint' for t in targets}
+
+    def get_view(self, xml_id):
+        if 'missing' in xml_id:
+            raise ValueError(xml_id)
+        return {'view_id': 1, 'model': 'model.name', 'title': 'Models'}
+
+    def get_main_menu_item_path(self, xml_id):
+        return [1, 2]
+
+
+def capture_figure(client, options, targets, filename):
+    Path(filename).write_bytes(b'')
+
+
+class TestTrytonCaptureBuilder(TestCase):
+
+    def setUp(self):
+        trytond_patcher = patch(
+            'sphinxcontrib.tryton.trytond.Trytond', MockTrytond)
+        trytond_patcher.start()
+        self.addCleanup(trytond_patcher.stop)
+        self.addCleanup(get_clients_in_use().clear)
+
+    @with_app(
+        buildername='tryton-capture', srcdir='tests/doc/basic/',
+        write_docstring=True,
+        confoverrides={
+            'sao_browser': 'firefox', 'sao_database': 'database',
+            'sao_host': 'localhost', 'sao_user': 'admin',
+            'tryton_capture_workers': 2})
+    def test_capture(self, app, status, warning):
+        """
+        Model :tryton:model:`model.name`.
+
+        .. tryton:figure:: view.png
+            :view: module.view_form
+
+        .. tryton:figure:: menu.png
+            :menuitem: module.menu
+
+        .. tryton:view:: module.view_form view.png
+
+        .. tryton:figure:: existing.png
+            :view: module.view_form
+
+        .. tryton:figure:: missing.png
+            :view: module.missing_view
+
+        .. tryton:figure::
+            :view: module.view_form
+        """
+        (app.srcdir / 'existing.png').write_bytes(b'')
+        with patch.object(ClientSao, 'ensure_started', return_value=True), \
+                patch.object(ClientSao, 'stop') as stop, \
+                patch(
+                    'sphinxcontrib.tryton.capture.capture_figure',
+                    side_effect=capture_figure) as capture:
+            app.builder.build_all()
+
+        targets = {
+            Path(c[0][3]).name: c[0][2] for c in capture.call_args_list}
+        self.assertEqual(targets, {
+            'view.png': {'view': {
+                'view_id': 1, 'model': 'model.name', 'title': 'Models',
+                'domain': None}},
+            'menu.png': {'menu_item_path': [1, 2]},
+            })
+        self.assertEqual(stop.call_count, 2)
+        self.assertEqual(app.trytond.lookups, [])
+        self.assertRegex(
+            warning.getvalue(),
+            r'index.rst:15: WARNING: tryton figure could not be captured: '
+            r'ValueError')
+        self.assertIn(
+            'captured 2 tryton figure(s), 1 failed', status.getvalue())
+        self.assertFalse((app.outdir / 'index.html').exists())
+
+        # Other builders must read the documents again to show the images
+        self.assertEqual(app.env.tryton_capture_docs, {'index'})
+        html_app = Mock(**{'builder.name': 'html'})
+        self.assertEqual(
+            get_capture_outdated_docs(html_app, app.env, set(), set(), set()),
+            ['index'])
+
+    @with_app(
+        srcdir='tests/doc/basic/', write_docstring=True,
+        confoverrides={
+            'sao_browser': 'firefox', 'sao_database': 'database',
+            'sao_host': 'localhost', 'sao_user': 'admin'})
+    def test_capture_shared_environment(self, app, status, warning):
+        """
+        .. tryton:figure:: view.png
+            :view: module.view_form
+        """
+        (app.srcdir / 'view.png').write_bytes(b'')
+        app.build()
+
+        # The view changes on the server, the capture updates the build's
+        # environment so the build does not capture the image again
+        with patch.object(
+                MockTrytond, 'get_fingerprints',
+                lambda self, targets: {t: 'changed' for t in targets}), \
+                patch.object(ClientSao, 'ensure_started', return_value=True), \
+                patch.object(ClientSao, 'stop'), \
+                patch(
+                    'sphinxcontrib.tryton.capture.capture_figure',
+                    side_effect=capture_figure) as capture, \
+                patch(
+                    'sphinxcontrib.tryton.domain.TrytonFigure.create_image'
+                    ) as create_image:
+            with docutils_namespace():
+                Sphinx(
+                    app.srcdir, app.confdir, app.outdir / 'capture',
+                    app.doctreedir, 'tryton-capture',
+                    status=status, warning=warning).build()
+            with docutils_namespace():
+                Sphinx(
+                    app.srcdir, app.confdir, app.outdir, app.doctreedir,
+                    'html', status=status, warning=warning).build()
+        self.assertEqual(capture.call_count, 1)
+        create_image.assert_not_called()
+
+    def test_pool_config(self):
+        config = {'host': 'localhost'}
+        self.assertEqual(ClientSao.get_pool_config(config, 2), [config] * 2)
+        self.assertEqual(ClientTryton.get_pool_config(config, 2), [config])
+        self.assertEqual(
+            ClientTryton.get_pool_config(
+                dict(config, displays=':91, :92, :93'), 2),
+            [dict(config, displays=[':91']), dict(config, displays=[':92'])])
+
+    def test_main(self):
+        with patch(
+                'sphinxcontrib.tryton.capture.build_main',
+                return_value=0) as build_main:
+            self.assertEqual(main(['-w', '3', '-D', 'a=b', 'docs']), 0)
+        build_main.assert_called_once_with([
+            '-b', 'tryton-capture',
+            '-d', 'docs/_build/tryton-capture/.doctrees',
+            '-D', 'tryton_capture_workers=3',
+            '-D', 'a=b', 'docs', 'docs/_build/tryton-capture'])
+
+    def test_main_outputdir(self):
+        "Test the doctree directory defaults to the output directory"
+        with patch(
+                'sphinxcontrib.tryton.capture.build_main',
+                return_value=0) as build_main:
+            main(['docs', 'docs/_build/html'])
+        build_main.assert_called_once_with([
+            '-b', 'tryton-capture', '-d', 'docs/_build/html/.doctrees',
+            '-D', 'tryton_capture_workers=1', 'docs', 'docs/_build/html'])
+
+    def test_main_doctreedir(self):
+        "Test the capture can update the environment of any build"
+        with patch(
+                'sphinxcontrib.tryton.capture.build_main',
+                return_value=0) as build_main:
+            main(['-d', 'build/doctrees', 'docs', 'build/capture'])
+        build_main.assert_called_once_with([
+            '-b', 'tryton-capture', '-d', 'build/doctrees',
+            '-D', 'tryton_capture_workers=1', 'docs', 'build/capture'])
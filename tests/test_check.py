@@ -0,0 +1,100 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from json import loads
+from sphinx_testing import with_app
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from sphinxcontrib.tryton.check import get_check_outdated_docs
+from sphinxcontrib.tryton.domain import get_clients_in_use
+from sphinxcontrib.tryton.trytond import Trytond
+
+
+class MockTrytond(object):
+    def __init__(self, **kwargs):
+        self.prefetched = None
+        self.lookups = []
+
+    @classmethod
+    def get_config(cls, config):
+        return Trytond.get_config(config)
+
+    def get_property(self, type_, name, property=None):
+        self.lookups.append((type_, name, property))
+        if 'missing' not in name:
+            return (property or name).title()
+
+    def get_fingerprints(self, targets):
+        return {t: 'fingerprint' for t in targets}
+
+    def prefetch(self, lookups):
+        self.prefetched = set(lookups)
+
+
+class TestTrytonCheckBuilder(TestCase):
+
+    def setUp(self):
+        trytond_patcher = patch(
+            'sphinxcontrib.tryton.trytond.Trytond', MockTrytond)
+        trytond_patcher.start()
+        self.addCleanup(trytond_patcher.stop)
+        self.addCleanup(get_clients_in_use().clear)
+
+    @with_app(
+        buildername='tryton-check', srcdir='tests/doc/basic/',
+        write_docstring=True)
+    def test_check(self, app, status, warning):
+        """
+        .. tryton:model:: model.name
+
+        Field :tryton:field:`model.name.missing_field`.
+
+        .. tryton:figure::
+            :view: module.missing_view
+        """
+        app.builder.build_all()
+
+        self.assertEqual(app.trytond.prefetched, {
+            ('model', 'model.name', None),
+            ('field', 'model.name.missing_field', None),
+            ('data', 'module.missing_view', None)})
+        self.assertEqual(len(app.trytond.lookups), 3)
+
+        report = loads(
+            (app.outdir / 'tryton-check.json').read_text(encoding='utf-8'))
+        self.assertEqual(report['checked'], 3)
+        self.assertEqual(
+            [(m['type'], m['target'], m['line']) for m in report['missing']],
+            [('field', 'model.name.missing_field', 4),
+             ('view', 'module.missing_view', 6)])
+        self.assertRegex(
+            warning.getvalue(),
+            r'index.rst:4: WARNING: field model.name.missing_field not found')
+        self.assertFalse((app.outdir / 'index.html').exists())
+
+        # Other builders must read the checked documents again
+        self.assertEqual(app.env.tryton_check_docs, {'index'})
+        html_app = Mock(**{'builder.name': 'html'})
+        self.assertEqual(
+            get_check_outdated_docs(html_app, app.env, set(), set(), set()),
+            ['index'])
+
+    @with_app(
+        buildername='tryton-check', srcdir='tests/doc/basic/',
+        write_docstring=True)
+    def test_check_unreachable(self, app, status, warning):
+        """
+        .. tryton:model:: model.name
+        """
+        app.trytond.health = SimpleNamespace(is_available=False)
+        app.builder.build_all()
+
+        report = loads(
+            (app.outdir / 'tryton-check.json').read_text(encoding='utf-8'))
+        self.assertEqual(report['missing'], [])
+        self.assertTrue(report['server_unreachable'])
+        self.assertRegex(
+            warning.getvalue(),
+            r'ERROR: trytond server could not be reached')
@@ -0,0 +1,167 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from sphinx.util.logging import skip_warningiserror
+from threading import Event, Timer
+from unittest import TestCase
+from unittest.mock import patch
+
+from sphinxcontrib.tryton.client import (
+    Client, ClientHealth, ImageWriter, figure_timer, timed_wait)
+from sphinxcontrib.tryton.exception import ClientBudgetExceededError
+
+
+class MockClient(Client):
+    config_prefix = 'mock'
+
+    def __init__(self, **kwargs):
+        kwargs = dict(self.config_options, **kwargs)
+        super().__init__(**kwargs)
+        self.starts = 0
+
+    def start(self):
+        self.starts += 1
+
+
+class TestClientHealth(TestCase):
+
+    def setUp(self):
+        monotonic_patcher = patch(
+            'sphinxcontrib.tryton.client.monotonic', return_value=100)
+        self.monotonic = monotonic_patcher.start()
+        self.addCleanup(monotonic_patcher.stop)
+
+    def test_health_ready(self):
+        "Test a client without any failures can be started."
+        health = ClientHealth('mock', start_attempts=3, start_backoff=10)
+        self.assertEqual(health.state, 'ready')
+        self.assertTrue(health.can_start())
+
+    def test_health_backoff(self):
+        "Test a client is not started again until the backoff has passed."
+        health = ClientHealth('mock', start_attempts=3, start_backoff=10)
+        health.record_failure()
+        self.assertEqual(health.state, 'waiting')
+
+        self.monotonic.return_value = 110
+        self.assertEqual(health.state, 'ready')
+
+        health.record_failure()
+        self.monotonic.return_value = 125
+        self.assertEqual(health.state, 'waiting')
+        self.monotonic.return_value = 130
+        self.assertEqual(health.state, 'ready')
+
+    def test_health_disabled(self):
+        "Test a client is disabled after too many failures."
+        health = ClientHealth('mock', start_attempts=2, start_backoff=0)
+        health.record_failure()
+        with skip_warningiserror():
+            health.record_failure()
+        self.assertEqual(health.state, 'disabled')
+        self.assertFalse(health.can_start())
+
+    def test_health_success(self):
+        "Test a successful start resets the failures."
+        health = ClientHealth('mock', start_attempts=2, start_backoff=10)
+        health.record_failure()
+        health.record_success()
+        self.assertEqual(health.state, 'ready')
+
+    def test_ensure_started(self):
+        "Test a failing client is only started while it is healthy."
+        client = MockClient(start_attempts=1)
+        with skip_warningiserror():
+            self.assertFalse(client.ensure_started())
+        self.assertFalse(client.ensure_started())
+        self.assertEqual(client.starts, 1)
+        self.assertEqual(client.health.state, 'disabled')
+
+
+class TestFigureTimer(TestCase):
+
+    def setUp(self):
+        monotonic_patcher = patch(
+            'sphinxcontrib.tryton.client.monotonic', return_value=100)
+        self.monotonic = monotonic_patcher.start()
+        self.addCleanup(monotonic_patcher.stop)
+
+    def test_wait_without_timer(self):
+        "Test waits outside of a figure use the whole timeout."
+        with timed_wait('wait', 60) as timeout:
+            self.assertEqual(timeout, 60)
+
+    def test_waits(self):
+        "Test the time spent in each wait is recorded."
+        with figure_timer() as timer:
+            for name, duration in [('open', 5), ('focus', 1), ('open', 2)]:
+                with timed_wait(name, 60) as timeout:
+                    self.assertEqual(timeout, 60)
+                    self.monotonic.return_value += duration
+
+        self.assertEqual(timer.elapsed, 8)
+        self.assertEqual(timer.waits, {'open': 7, 'focus': 1})
+        self.assertEqual(timer.longest_wait, ('open', 7))
+
+    def test_budget(self):
+        "Test waits are limited to the budget, and stop once it is used."
+        with figure_timer(budget=10) as timer:
+            self.monotonic.return_value += 4
+            with timed_wait('open', 60) as timeout:
+                self.assertEqual(timeout, 6)
+                self.monotonic.return_value += 3
+            with self.assertRaises(ClientBudgetExceededError):
+                with timed_wait('focus', 60) as timeout:
+                    self.monotonic.return_value += 4
+        self.assertTrue(timer.exceeded)
+
+
+class TestImageWriter(TestCase):
+
+    def setUp(self):
+        self.writer = ImageWriter(workers=2)
+        self.addCleanup(self.writer.executor.shutdown)
+        self.written = []
+
+    def write(self, filename, started=None, release=None):
+        if started:
+            started.set()
+        if release:
+            release.wait(5)
+        if filename == 'broken.png':
+            raise OSError(filename)
+        self.written.append(filename)
+
+    def test_wait(self):
+        "Test waiting for the images to be written"
+        release = Event()
+        self.writer.submit('first.png', self.write, 'first.png', None, release)
+        self.writer.submit('second.png', self.write, 'second.png')
+        self.writer.submit('broken.png', self.write, 'broken.png')
+
+        failed = self.writer.wait(['second.png', 'broken.png'])
+        self.assertEqual(list(failed), ['broken.png'])
+        self.assertEqual(self.written, ['second.png'])
+
+        release.set()
+        self.assertEqual(self.writer.wait(), {})
+        self.assertEqual(self.written, ['second.png', 'first.png'])
+
+    def test_same_image(self):
+        "Test an image is only written once at a time"
+        started, release, release_second = Event(), Event(), Event()
+        self.writer.submit(
+            'image.png', self.write, 'image.png', started, release)
+        started.wait(5)
+
+        # The second write is only submitted once the first has finished
+        timer = Timer(0.1, release.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.writer.submit(
+            'image.png', self.write, 'image.png', None, release_second)
+        self.assertEqual(self.written, ['image.png'])
+
+        release_second.set()
+        self.writer.wait()
+        self.assertEqual(self.written, ['image.png', 'image.png'])
@@ -9,6 +9,7 @@ from sphinx.util.logging import skip_warningiserror
 from tempfile import mkdtemp
 from unittest import SkipTest, TestCase
 
+from sphinxcontrib.tryton.client import get_image_writer
 from sphinxcontrib.tryton.client_sao import ClientSao
 
 
@@ -122,4 +123,5 @@ class TestClientSao(TestCase):
 
         self.sao.capture_image(str(filename), *area)
 
+        self.assertEqual(get_image_writer().wait(), {})
         self.assertTrue(filename.exists())
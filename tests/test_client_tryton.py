@@ -9,8 +9,11 @@ from sys import exc_info
 from tempfile import mkdtemp
 from threading import Event
 from unittest import SkipTest, TestCase
+from unittest.mock import Mock, patch
 
-from sphinxcontrib.tryton.client_tryton import ClientTryton
+from sphinxcontrib.tryton.client import figure_timer
+from sphinxcontrib.tryton.client_tryton import ClientTryton, TrytonProcess
+from sphinxcontrib.tryton.exception import ClientBudgetExceededError
 
 
 def skipIfClientNotAvailable(func):
@@ -158,3 +161,120 @@ class TestClientTryton(TestCase):
         self.tryton.capture_image(str(filename), *area)
 
         self.assertTrue(filename.exists())
+
+
+class TestClientTrytonPool(TestCase):
+
+    def setUp(self):
+        process_patcher = patch(
+            'sphinxcontrib.tryton.client_tryton.TrytonProcess')
+        self.TrytonProcess = process_patcher.start()
+        self.addCleanup(process_patcher.stop)
+        self.TrytonProcess.side_effect = lambda display, **kwargs: Mock(
+            display=display,
+            **{'wait_for_startup.return_value': display != ':93',
+               'is_alive.return_value': True})
+
+        config = dict(ClientTryton.config_options)
+        config['displays'] = ':91, :92 :93'
+        self.tryton = ClientTryton(**config)
+
+    def test_start_pool(self):
+        "Test a client is started on each display."
+        self.tryton.start()
+        self.assertTrue(self.tryton.is_pooled)
+        self.assertTrue(self.tryton.is_available)
+        self.assertEqual(
+            [c.display for c in self.tryton.pool], [':91', ':92'])
+
+    def test_acquire_pool(self):
+        "Test clients in the pool are reserved and released."
+        self.tryton.start()
+        with self.tryton.acquire():
+            first = self.tryton.client
+            with self.tryton.acquire():
+                self.assertIsNot(self.tryton.client, first)
+        with self.tryton.acquire():
+            self.assertIsNot(self.tryton.client, first)
+
+    def test_remove_from_pool(self):
+        "Test clients that stop responding are not used again."
+        self.tryton.start()
+        with skip_warningiserror():
+            with self.tryton.acquire():
+                first = self.tryton.client
+                first.is_alive.return_value = False
+        first.terminate.assert_called_once_with()
+
+        for i in range(3):
+            with self.tryton.acquire():
+                self.assertIsNot(self.tryton.client, first)
+        self.assertTrue(self.tryton.is_available)
+
+        self.tryton.pool[1].is_alive.return_value = False
+        self.assertFalse(self.tryton.is_available)
+
+    def test_remove_from_pool_reader(self):
+        "Test parallel readers leave stopping the clients to the build."
+        self.tryton.start()
+        with skip_warningiserror(), patch(
+                'sphinxcontrib.tryton.client_tryton.getpid',
+                return_value=-1):
+            with self.tryton.acquire():
+                first = self.tryton.client
+                first.is_alive.return_value = False
+        first.terminate.assert_not_called()
+
+        self.tryton.stop()
+        first.quit.assert_called_once_with()
+
+    def test_restart_pool(self):
+        "Test starting the pool again stops the previous clients."
+        self.tryton.start()
+        pool = self.tryton.pool
+        self.tryton.start()
+        for client in pool:
+            client.quit.assert_called_once_with()
+        self.assertEqual(len(self.tryton.pool), 2)
+        self.assertFalse(set(pool) & set(self.tryton.pool))
+
+    def test_stop_pool(self):
+        "Test stopping the pool quits every client."
+        self.tryton.start()
+        pool = self.tryton.pool
+        self.tryton.stop()
+        for client in pool:
+            client.quit.assert_called_once_with()
+        self.assertFalse(self.tryton.is_available)
+
+
+class TestTrytonProcess(TestCase):
+
+    def setUp(self):
+        process_patcher = patch('sphinxcontrib.tryton.client_tryton.Process')
+        Process = process_patcher.start()
+        self.addCleanup(process_patcher.stop)
+
+        self.process = TrytonProcess(display=':91', timeout=5)
+        self.process.running = True
+        self.child = Process.call_args[1]['args'][0]
+
+    def test_budget_exceeded(self):
+        "Test a figure over its budget leaves the client in step."
+        with self.assertRaises(ClientBudgetExceededError):
+            with figure_timer(budget=0.01):
+                self.process.apply_method('open_view', None, (), {})
+        self.assertTrue(self.process.is_alive())
+
+        # The client may be used next by another reader, which is only given
+        # the reply to its own request
+        abandoned = self.child.recv()[0]
+        self.child.send((abandoned, True, 'abandoned'))
+        with patch(
+                'sphinxcontrib.tryton.client_tryton.getpid',
+                return_value=-1):
+            self.child.send(((-1, 1), True, (800, 600)))
+            result = Mock()
+            self.process.apply_method('get_window_size', result, (), {})
+        self.assertEqual(result.value, (800, 600))
+        self.assertEqual(self.child.recv()[:2], ((-1, 1), 'get_window_size'))
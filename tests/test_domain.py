@@ -1,10 +1,19 @@
 # This file is part of the sphinxcontrib-tryton extension.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
+from pathlib import Path
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
 from sphinx_testing import with_app
+from time import sleep
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
+from sphinxcontrib.tryton.client import get_image_writer, timed_wait
+from sphinxcontrib.tryton.domain import (
+    get_clients_in_use, get_outdated_docs, setup_prefetch)
+from sphinxcontrib.tryton.exception import (
+    ClientTimeoutError, TrytondUnavailableError)
 from sphinxcontrib.tryton.trytond import Trytond
 
 
@@ -26,6 +35,20 @@ class MockTrytond(object):
     def get_property(self, type_, name, property=None):
         return (property or name).title()
 
+    def get_fingerprints(self, targets):
+        return {t: 'fingerprint' for t in targets}
+
+    def get_view_architecture(self, xml_id):
+        if '.' not in xml_id:
+            raise ValueError(xml_id)
+        if xml_id == 'module.view_form':
+            return {
+                'model': 'model.name', 'title': 'Models', 'type': 'form',
+                'arch': (
+                    '<form><label name="name"/><field name="name"/></form>'),
+                'fields': {'name': {'string': 'Name', 'type': 'char'}},
+                }
+
 
 class TestTrytonDomain(TestCase):
 
@@ -34,6 +57,7 @@ class TestTrytonDomain(TestCase):
             'sphinxcontrib.tryton.trytond.Trytond', MockTrytond)
         self.MockTrytond = trytond_patcher.start()
         self.addCleanup(trytond_patcher.stop)
+        self.addCleanup(get_clients_in_use().clear)
 
     @with_basic_app()
     def test_directive_button(self, app, status, warning):
@@ -82,6 +106,334 @@ class TestTrytonDomain(TestCase):
             warning.getvalue(),
             r'WARNING: image file not readable:')
 
+    @with_app(
+        srcdir='tests/doc/basic/', write_docstring=True,
+        confoverrides={
+            'sao_browser': 'unsupported', 'sao_database': 'database',
+            'sao_host': 'localhost', 'sao_user': 'admin',
+            'sao_start_attempts': 1})
+    def test_directive_figure_skipped(self, app, status, warning):
+        """
+        .. tryton:figure:: first.png
+
+        .. tryton:figure:: second.png
+        """
+        app.builder.build_all()
+        self.assertEqual(
+            warning.getvalue().count('sao screenshots disabled'), 1)
+        self.assertRegex(
+            warning.getvalue(),
+            r'WARNING: 2 tryton figure\(s\) skipped because client '
+            r'\'ClientSao\' was not available')
+
+    @with_app(
+        srcdir='tests/doc/basic/', write_docstring=True,
+        confoverrides={'tryton_figure_budget': 0.01})
+    def test_directive_figure_budget(self, app, status, warning):
+        """
+        .. tryton:figure:: slow.png
+        """
+        def capture_image(client, filename):
+            with timed_wait('wait_for_view_to_open', 60):
+                sleep(0.02)
+
+        with patch(
+                'sphinxcontrib.tryton.domain.TrytonFigure.get_client',
+                return_value=MagicMock()), \
+                patch(
+                    'sphinxcontrib.tryton.domain.TrytonFigure.capture_image',
+                    side_effect=capture_image):
+            app.builder.build_all()
+
+        self.assertRegex(
+            warning.getvalue(),
+            r'index.rst:2: WARNING: tryton figure abandoned after 0.0s, '
+            r'over its budget of 0.01s \(0.0s in wait_for_view_to_open\)')
+        self.assertRegex(
+            status.getvalue(),
+            r'slowest tryton figures:\s*0.0s  .*index.rst:2 '
+            r'\(0.0s in wait_for_view_to_open\)')
+
+    @with_basic_app('allow-warnings')
+    def test_directive_figure_client_error(self, app, status, warning):
+        """
+        .. tryton:figure:: failed.png
+        """
+        with patch(
+                'sphinxcontrib.tryton.domain.TrytonFigure.get_client',
+                return_value=MagicMock(force_update=False)), \
+                patch(
+                    'sphinxcontrib.tryton.domain.TrytonFigure.capture_image',
+                    side_effect=ClientTimeoutError('timed out')):
+            app.builder.build_all()
+
+        self.assertRegex(
+            warning.getvalue(),
+            r'index.rst:2: WARNING: tryton figure could not be captured: '
+            r'ClientTimeoutError')
+        self.assertRegex(
+            warning.getvalue(),
+            r'WARNING: 1 tryton figure\(s\) skipped because client')
+
+    @with_basic_app('allow-warnings')
+    def test_directive_figure_trytond_unavailable(self, app, status, warning):
+        """
+        .. tryton:figure:: unavailable.png
+            :view: module.view_form
+        """
+        with patch(
+                'sphinxcontrib.tryton.domain.TrytonFigure.get_client',
+                return_value=MagicMock(force_update=False)), \
+                patch(
+                    'sphinxcontrib.tryton.domain.get_figure_targets',
+                    side_effect=TrytondUnavailableError(
+                        'trytond server is unavailable')):
+            app.builder.build_all()
+
+        self.assertRegex(
+            warning.getvalue(),
+            r'index.rst:2: WARNING: tryton figure skipped: trytond server '
+            r'is unavailable')
+
+    @with_app(srcdir='tests/doc/basic/', write_docstring=True)
+    def test_directive_figure_background(self, app, status, warning):
+        """
+        .. tryton:figure:: written.png
+
+        .. tryton:figure:: broken.png
+        """
+        def write(filename):
+            sleep(0.05)
+            if filename.name == 'broken.png':
+                raise OSError(str(filename))
+            filename.write_bytes(b'')
+
+        def capture_image(client, filename):
+            get_image_writer().submit(str(filename), write, filename)
+
+        with patch(
+                'sphinxcontrib.tryton.domain.TrytonFigure.get_client',
+                return_value=MagicMock(force_update=False)), \
+                patch(
+                    'sphinxcontrib.tryton.domain.TrytonFigure.capture_image',
+                    side_effect=capture_image):
+            app.builder.build_all()
+
+        self.assertTrue((app.srcdir / 'written.png').exists())
+        self.assertNotRegex(
+            warning.getvalue(), r'image file not readable: written.png')
+        self.assertRegex(
+            warning.getvalue(),
+            r'index.rst: WARNING: tryton figure could not be written to '
+            r'.*broken.png: OSError')
+
+    @with_app(
+        srcdir='tests/doc/basic/', write_docstring=True,
+        confoverrides={'tryton_figure_mode': 'draft'})
+    def test_directive_figure_draft(self, app, status, warning):
+        """
+        .. tryton:figure:: missing.png
+            :view: module.view_form
+            :fields: name code
+            :width: 400
+
+        .. tryton:figure:: existing.png
+            :view: module.view_form
+        """
+        (app.srcdir / 'existing.png').write_bytes(b'')
+        with patch(
+                'sphinxcontrib.tryton.domain.TrytonFigure.create_image'
+                ) as create_image:
+            app.builder.build_all()
+        create_image.assert_not_called()
+
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertRegex(source, r'<img [^>]*src="_images/draft-[0-9a-f]+.svg')
+        self.assertRegex(source, r'<img [^>]*src="_images/existing.png')
+
+        placeholder, = Path(app.outdir, '_images').glob('draft-*.svg')
+        source = placeholder.read_text(encoding='utf-8')
+        self.assertIn('width="400" height="1080"', source)
+        self.assertIn('view: module.view_form', source)
+        self.assertIn('fields: name code', source)
+
+    @with_app(
+        buildername='latex', srcdir='tests/doc/basic/', write_docstring=True,
+        warningiserror=False,
+        confoverrides={'tryton_figure_mode': 'draft'})
+    def test_directive_figure_draft_latex(self, app, status, warning):
+        """
+        .. tryton:view:: module.view_form
+            :fields: name
+
+        .. tryton:figure:: missing.png
+            :menuitem: module.menu
+        """
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            app.builder.build_all()
+            self.assertEqual(
+                warning.getvalue().count(
+                    'WARNING: tryton figure skipped: the latex builder cannot '
+                    'show SVG images'), 2)
+            return
+
+        app.builder.build_all()
+        self.assertFalse(list(Path(app.outdir).glob('*.svg')))
+        self.assertEqual(len(list(Path(app.outdir).glob('draft-*.png'))), 2)
+
+    @with_app(
+        buildername='latex', srcdir='tests/doc/basic/', write_docstring=True,
+        warningiserror=False,
+        confoverrides={'tryton_figure_mode': 'mockup'})
+    def test_directive_figure_mockup_latex(self, app, status, warning):
+        """
+        .. tryton:view:: module.view_form
+            :fields: name
+        """
+        with patch.object(
+                self.MockTrytond, 'get_view_architecture') as architecture, \
+                patch(
+                    'sphinxcontrib.tryton.domain.write_placeholder_png',
+                    side_effect=ImportError):
+            app.builder.build_all()
+        architecture.assert_not_called()
+        self.assertRegex(
+            warning.getvalue(),
+            r'index.rst:2: WARNING: tryton figure skipped: the latex builder '
+            r'cannot show SVG images')
+
+    @with_app(
+        srcdir='tests/doc/basic/', write_docstring=True,
+        confoverrides={'tryton_figure_mode': 'draft'})
+    def test_directive_figure_draft_rebuild(self, app, status, warning):
+        """
+        .. tryton:figure:: missing.png
+            :view: module.view_form
+        """
+        app.build()
+        source = app.srcdir / 'index.rst'
+        source.write_text(
+            source.read_text(encoding='utf-8') + '\nEdited.\n',
+            encoding='utf-8')
+
+        # The next build starts from the saved environment
+        with docutils_namespace():
+            rebuild = Sphinx(
+                app.srcdir, app.confdir, app.outdir, app.doctreedir, 'html',
+                confoverrides={'tryton_figure_mode': 'draft'},
+                status=status, warning=warning)
+            rebuild.build()
+        html = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertIn('Edited.', html)
+        self.assertRegex(html, r'<img [^>]*src="_images/draft-[0-9a-f]+.svg')
+
+    @with_app(
+        srcdir='tests/doc/basic/', write_docstring=True,
+        warningiserror=False,
+        confoverrides={'tryton_figure_mode': 'mockup'})
+    def test_directive_figure_mockup(self, app, status, warning):
+        """
+        .. tryton:view:: module.view_form
+            :fields: name
+
+        .. tryton:view:: module.missing
+
+        .. tryton:figure:: menu.png
+            :menuitem: module.menu
+
+        .. tryton:view:: view_form
+        """
+        with patch(
+                'sphinxcontrib.tryton.domain.TrytonFigure.create_image'
+                ) as create_image:
+            app.builder.build_all()
+        create_image.assert_not_called()
+
+        mockup, = Path(app.outdir, '_images').glob('mockup-*.svg')
+        source = mockup.read_text(encoding='utf-8')
+        self.assertIn('>Name:</text>', source)
+        self.assertIn('viewBox="4 44 ', source)
+        self.assertEqual(
+            len(list(Path(app.outdir, '_images').glob('draft-*.svg'))), 3)
+        self.assertRegex(
+            warning.getvalue(),
+            r'index.rst:5: WARNING: view module.missing not found in Tryton '
+            r'- mockup could not be created')
+        self.assertRegex(
+            warning.getvalue(),
+            r'index.rst:10: WARNING: view view_form could not be read from '
+            r'Tryton - mockup could not be created: ValueError')
+
+    @with_basic_app()
+    def test_outdated_docs(self, app, status, warning):
+        """
+        Tryton model :tryton:model:`model.name`.
+
+        Tryton field :tryton:field:`model.name.field_name`.
+        """
+        app.builder.build_all()
+        dependencies = app.env.domaindata['tryton']['dependencies']
+        self.assertEqual(dependencies['index'], {
+            ('model', 'model.name'), ('field', 'model.name.field_name')})
+
+        outdated = get_outdated_docs(app, app.env, set(), set(), set())
+        self.assertEqual(outdated, [])
+
+        with patch.object(app.trytond, 'get_fingerprints', return_value={
+                ('model', 'model.name'): 'changed',
+                ('field', 'model.name.field_name'): 'fingerprint'}):
+            outdated = get_outdated_docs(app, app.env, set(), set(), set())
+        self.assertEqual(outdated, ['index'])
+        self.assertEqual(
+            app.env.tryton_changed_targets, {('model', 'model.name')})
+
+    @with_basic_app()
+    def test_clear_and_merge_objects(self, app, status, warning):
+        """
+        .. tryton:model:: model.name
+
+        .. tryton:field:: model.name.field_name
+        """
+        app.builder.build_all()
+        domain = app.env.get_domain('tryton')
+        self.assertEqual(
+            domain.data['docobjects']['index'],
+            {'model.name', 'model.name.field_name'})
+
+        # An object described again in another document moves to it
+        domain.note_object('model.name', 'other', 'model')
+        other_data = {
+            'dependencies': {}, 'lookups': {},
+            'objects': dict(domain.data['objects']),
+            'titles': dict(domain.data['titles']),
+            'docobjects': {
+                d: set(n) for d, n in domain.data['docobjects'].items()}}
+
+        domain.clear_doc('index')
+        self.assertEqual(list(domain.data['objects']), ['model.name'])
+        self.assertNotIn('index', domain.data['docobjects'])
+
+        domain.clear_doc('other')
+        domain.merge_domaindata(['index'], other_data)
+        self.assertEqual(domain.data['objects'], {
+            'model.name.field_name': ('index', 'field')})
+
+    @with_basic_app()
+    def test_prefetch(self, app, status, warning):
+        """
+        Tryton field :tryton:field:`model.name.field_name|help`.
+        """
+        app.builder.build_all()
+        manifest = app.doctreedir / 'tryton-lookups.json'
+        self.assertIn('model.name.field_name', manifest.read_text())
+
+        with patch.object(app.trytond, 'prefetch', create=True) as prefetch:
+            setup_prefetch(app, app.env, ['index'])
+        prefetch.assert_called_once_with(
+            {('field', 'model.name.field_name', 'help')})
+
     @with_basic_app()
     def test_directive_menu(self, app, status, warning):
         ".. tryton:menu:: module.xml_id"
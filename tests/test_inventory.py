@@ -0,0 +1,101 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from json import dump, loads
+from pathlib import Path
+from shutil import rmtree
+from sphinx_testing import with_app
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import patch
+
+from sphinxcontrib.tryton.domain import get_clients_in_use
+from sphinxcontrib.tryton.inventory import load_inventories, write_inventory
+from sphinxcontrib.tryton.trytond import Trytond
+
+
+def with_basic_app():
+    return with_app(
+        srcdir='tests/doc/basic/',
+        warningiserror=True,
+        write_docstring=True)
+
+
+class MockTrytond(object):
+    def __init__(self, **kwargs):
+        self.lookups = []
+
+    @classmethod
+    def get_config(cls, config):
+        return Trytond.get_config(config)
+
+    def get_property(self, type_, name, property=None):
+        self.lookups.append((type_, name, property))
+        return (property or name).title()
+
+    def get_fingerprints(self, targets):
+        return {t: 'fingerprint' for t in targets}
+
+
+class TestTrytonInventory(TestCase):
+
+    def setUp(self):
+        trytond_patcher = patch(
+            'sphinxcontrib.tryton.trytond.Trytond', MockTrytond)
+        trytond_patcher.start()
+        self.addCleanup(trytond_patcher.stop)
+        self.addCleanup(get_clients_in_use().clear)
+
+        self.temp_dir = Path(mkdtemp())
+        self.addCleanup(rmtree, str(self.temp_dir), ignore_errors=True)
+
+    @with_basic_app()
+    def test_write_inventory(self, app, status, warning):
+        """
+        .. tryton:model:: model.name
+        """
+        app.builder.build_all()
+        write_inventory(app, None)
+
+        inventory = loads(
+            (app.outdir / 'tryton-inventory.json').read_text(encoding='utf-8'))
+        self.assertEqual(inventory['project'], 'sphinxcontrib-tryton test')
+        self.assertEqual(inventory['objects'], {
+            'model.name': {
+                'type': 'model',
+                'uri': 'index.html#model.name',
+                'title': 'Model.Name',
+                }})
+
+    @with_basic_app()
+    def test_inventory_reference(self, app, status, warning):
+        """
+        Other :tryton:model:`other.model`.
+
+        Local :tryton:model:`model.name`.
+        """
+        inventory = self.temp_dir / 'tryton-inventory.json'
+        with inventory.open('w', encoding='utf-8') as file:
+            dump({
+                'project': 'Other',
+                'version': 1,
+                'objects': {
+                    'other.model': {
+                        'type': 'model',
+                        'uri': 'models.html#other.model',
+                        'title': 'Other Model',
+                        }},
+                }, file)
+        app.config.tryton_inventory_mapping = {
+            'other': ('https://example.org/other/', str(inventory))}
+        load_inventories(app)
+
+        app.builder.build_all()
+        source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.assertRegex(
+            source,
+            r'<a class="reference external" '
+            r'href="https://example.org/other/models.html#other.model" '
+            r'title="\(in Other\)">.*Other</span> <span class="pre">Model')
+        self.assertEqual(
+            app.trytond.lookups, [('model', 'model.name', None)])
@@ -0,0 +1,73 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from unittest import TestCase
+from xml.etree import ElementTree
+
+from sphinxcontrib.tryton.client import Area
+from sphinxcontrib.tryton.mockup import ROW_HEIGHT, ViewMockup
+
+FIELDS = {
+    'name': {'string': 'Name', 'type': 'char'},
+    'code': {'string': 'Code', 'type': 'char'},
+    'comment': {'string': 'Comment', 'type': 'text'},
+    'lines': {'string': 'Lines', 'type': 'one2many'},
+    }
+
+FORM = """
+<form>
+    <label name="name"/>
+    <field name="name"/>
+    <label name="code"/>
+    <field name="code"/>
+    <notebook>
+        <page string="General" id="general">
+            <separator name="comment" colspan="4"/>
+            <field name="comment" colspan="4"/>
+        </page>
+        <page string="Lines &amp; Taxes" id="lines">
+            <field name="lines" colspan="4"/>
+        </page>
+    </notebook>
+</form>
+"""
+
+
+class TestViewMockup(TestCase):
+
+    def test_form(self):
+        mockup = ViewMockup(FORM, FIELDS, 'Records', width=800)
+        svg = ElementTree.fromstring(mockup.to_svg())
+        texts = [t.text for t in svg.iter('{http://www.w3.org/2000/svg}text')]
+        self.assertEqual(texts, [
+            'Records', 'Name:', 'Code:', 'General', 'Lines & Taxes',
+            'Comment'])
+        self.assertEqual(svg.get('width'), '800')
+
+    def test_field_areas(self):
+        mockup = ViewMockup(FORM, FIELDS, width=800)
+        self.assertEqual(mockup.field_areas['name'], [
+            Area(4, 4, 198, ROW_HEIGHT), Area(202, 4, 198, ROW_HEIGHT)])
+        comment = mockup.field_areas['comment'][-1]
+        self.assertEqual(comment.height, 4 * ROW_HEIGHT)
+        self.assertNotIn('lines', mockup.field_areas)
+
+    def test_calculate_area(self):
+        mockup = ViewMockup(FORM, FIELDS, width=800)
+        self.assertEqual(
+            mockup.calculate_area(['name', 'code'], padding=10),
+            Area(0, 0, 800, ROW_HEIGHT + 14))
+        self.assertEqual(
+            mockup.calculate_area(['missing']),
+            Area(0, 0, 800, mockup.height))
+
+        svg = ElementTree.fromstring(mockup.to_svg(Area(0, 0, 400, 50)))
+        self.assertEqual(svg.get('viewBox'), '0 0 400 50')
+
+    def test_tree(self):
+        mockup = ViewMockup(
+            '<tree><field name="name"/><field name="code"/></tree>',
+            FIELDS, width=600)
+        svg = ElementTree.fromstring(mockup.to_svg())
+        texts = [t.text for t in svg.iter('{http://www.w3.org/2000/svg}text')]
+        self.assertEqual(texts, ['Name', 'Code'])
@@ -0,0 +1,139 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from unittest import TestCase
+from unittest.mock import MagicMock, Mock, patch
+
+from sphinxcontrib.tryton.pool import PoolIntrospection
+from sphinxcontrib.tryton.trytond import Trytond
+
+
+class MockModel(object):
+    "Model Name"
+
+    _fields = {
+        'field_name': Mock(string='Field', help='Help'),
+        'state': Mock(string='State', selection=[('open', 'Open')]),
+        'dynamic': Mock(string='Dynamic', selection='get_selection'),
+        }
+
+    @classmethod
+    def _get_name(cls):
+        return cls.__doc__
+
+
+class TestPoolIntrospection(TestCase):
+
+    def setUp(self):
+        def get(name):
+            if name == 'model.name':
+                return MockModel
+            raise KeyError(name)
+
+        self.config = Mock(**{'pool.get.side_effect': get})
+        self.native = PoolIntrospection(self.config)
+
+    def test_get_property_model(self):
+        "Test the name of a model is read from its class."
+        self.assertEqual(
+            self.native.get_property('model', 'model.name'), 'Model Name')
+        self.assertIsNone(self.native.get_property('model', 'missing.name'))
+
+    def test_get_property_field(self):
+        "Test field descriptions and help are read from the field."
+        get_property = self.native.get_property
+        self.assertEqual(
+            get_property('field', 'model.name.field_name'),
+            'Model Name.Field')
+        self.assertEqual(
+            get_property('field', 'model.name.field_name', 'help'), 'Help')
+        self.assertIsNone(get_property('field', 'model.name.missing'))
+
+    def test_get_property_option(self):
+        "Test selection labels are read from the field."
+        get_property = self.native.get_property
+        self.assertEqual(
+            get_property('option', 'model.name.state.open'),
+            'Model Name.State.Open')
+        self.assertIsNone(get_property('option', 'model.name.state.closed'))
+
+    def test_not_implemented(self):
+        "Test lookups that need the database are left to the server."
+        get_property = self.native.get_property
+        self.assertIs(
+            get_property('menu', 'module.menu_xml_id'), NotImplemented)
+        self.assertIs(
+            get_property('model', 'model.name', 'info'), NotImplemented)
+        self.assertIs(
+            get_property('option', 'model.name.dynamic.value'),
+            NotImplemented)
+
+    def test_translate(self):
+        "Test strings are translated into the requested language."
+        def translate(name, ttype, language, source):
+            return '{}:{}'.format(language, source)
+
+        with patch.object(
+                self.native, 'translate', side_effect=translate) as tr:
+            self.assertEqual(
+                self.native.get_property(
+                    'field', 'model.name.field_name', language='fr'),
+                'fr:Model Name.fr:Field')
+        tr.assert_any_call('model.name,field_name', 'field', 'fr', 'Field')
+        tr.assert_any_call('model.name,name', 'model', 'fr', 'Model Name')
+
+    def test_translate_default_language(self):
+        "Test strings in the database's language are not looked up."
+        with patch.object(
+                self.native, 'get_default_language', return_value='en'):
+            self.assertEqual(
+                self.native.translate(
+                    'model.name,name', 'model', 'en', 'Model Name'),
+                'Model Name')
+        self.config.pool.get.assert_not_called()
+
+    def test_translations_loaded_once(self):
+        "Test the translations of a language are read in one query."
+        Translation = Mock(**{'search_read.return_value': [{
+            'name': 'model.name,name', 'type': 'model', 'src': 'Model Name',
+            'value': 'Nom du modèle'}]})
+        self.config.pool.get.side_effect = None
+        self.config.pool.get.return_value = Translation
+        transaction = MagicMock()
+        with patch.dict('sys.modules', {
+                    'trytond': Mock(), 'trytond.transaction': transaction}), \
+                patch.object(
+                    self.native, 'get_default_language', return_value='en'):
+            translate = self.native.translate
+            self.assertEqual(
+                translate('model.name,name', 'model', 'fr', 'Model Name'),
+                'Nom du modèle')
+            self.assertEqual(
+                translate('model.name,state', 'field', 'fr', 'State'),
+                'State')
+        Translation.search_read.assert_called_once()
+        transaction.Transaction.return_value.start.assert_called_once()
+
+    def test_trytond_native_pool_disabled(self):
+        "Test lookups are only answered from the pool when it is enabled."
+        with patch('sphinxcontrib.tryton.trytond.proteus_config'):
+            trytond = Trytond(
+                connection_type='trytond', config_file='config_file',
+                database='database', user='user')
+            trytond.connect()
+        self.assertIsNone(trytond.native)
+
+    def test_trytond_uses_native_pool(self):
+        "Test Trytond answers lookups from the pool without the server."
+        with patch('sphinxcontrib.tryton.trytond.proteus_config') as config:
+            config.set_trytond.return_value = self.config
+            trytond = Trytond(
+                connection_type='trytond', config_file='config_file',
+                database='database', user='user', native_pool=True)
+            trytond.connect()
+
+        with patch.object(trytond, 'search_read') as search_read:
+            self.assertEqual(
+                trytond.get_property('field', 'model.name.field_name'),
+                'Model Name.Field')
+        search_read.assert_not_called()
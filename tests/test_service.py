@@ -0,0 +1,192 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from pathlib import Path
+from pickle import dumps, loads
+from tempfile import TemporaryDirectory
+from threading import Thread
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from sphinxcontrib.tryton.client import Area
+from sphinxcontrib.tryton.exception import (
+    ClientError, RecordNotFoundError, TrytondError, TrytondUnavailableError)
+from sphinxcontrib.tryton.service import (
+    BuildService, ServiceClient, ServiceTrytond, initialise_service)
+
+
+class UnpicklableError(Exception):
+    def __init__(self, code, message):
+        super().__init__()
+
+
+class MockTrytond(object):
+    def __init__(self):
+        self.language = None
+        self.cache_validator = None
+        self.validator = 'first'
+        self.health = None
+        self.properties = {}
+        self.models = {}
+        self.module_orders = {}
+        self.fingerprint = 'first'
+        self.forgotten = []
+
+    def flush_cached_properties(self):
+        pass
+
+    def get_fingerprints(self, targets):
+        return {tuple(t): self.fingerprint for t in targets}
+
+    def forget_targets(self, targets):
+        self.forgotten.append(targets)
+
+    def get_cache_validator(self):
+        self.cache_validator = self.validator
+        return self.cache_validator
+
+    def get_property(self, type_, name, property=None):
+        return '{}:{}'.format(self.language, name)
+
+    def get_view(self, xml_id):
+        if xml_id == 'module.missing':
+            raise RecordNotFoundError(xml_id)
+        if xml_id == 'module.broken':
+            raise UnpicklableError(1, xml_id)
+        return {'view_id': 1, 'model': 'model.name', 'title': 'Models'}
+
+
+class MockClient(object):
+    def __init__(self):
+        self.health = SimpleNamespace(state='running')
+        self.calls = []
+
+    def ensure_started(self):
+        return True
+
+    def calculate_area(self, fields, padding):
+        self.calls.append(('calculate_area', fields, padding))
+        return Area(1, 2, 3, 4)
+
+    def stop(self):
+        self.calls.append(('stop',))
+
+
+class TestBuildService(TestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.address = str(Path(directory.name) / 'tryton.sock')
+
+        self.app = Mock(trytond=MockTrytond())
+        self.service = BuildService(self.app, self.address)
+        self.client = MockClient()
+        self.service.clients['sao'] = self.client
+        self.service.start()
+        self.thread = Thread(target=self.service.serve_forever)
+        self.thread.start()
+        self.addCleanup(self.stop)
+
+        self.trytond = ServiceTrytond(self.address, 'fr')
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.trytond.service.call(('service',), 'shutdown')
+        self.thread.join()
+
+    def test_get_property(self):
+        "Test properties are looked up by the service in the build's language"
+        self.assertEqual(
+            self.trytond.get_property('model', 'model.name'),
+            'fr:model.name')
+
+    def test_errors(self):
+        "Test errors are raised in the build"
+        with self.assertRaises(RecordNotFoundError):
+            self.trytond.get_view('module.missing')
+        with self.assertRaises(TrytondError):
+            self.trytond.get_view('module.broken')
+        self.assertEqual(
+            self.trytond.get_view('module.view')['model'], 'model.name')
+
+    def test_unknown_method(self):
+        "Test only the service's methods can be called"
+        with self.assertRaises(AttributeError):
+            self.trytond.connect
+        with self.assertRaises(TrytondError):
+            self.trytond.service.call(('trytond', 'fr'), 'connect')
+
+    def test_begin(self):
+        "Test the metadata is kept while the server's modules are unchanged"
+        self.app.trytond.properties['key'] = 'value'
+        self.trytond.begin()
+        self.assertEqual(self.app.trytond.properties, {'key': 'value'})
+
+        self.app.trytond.validator = 'second'
+        self.trytond.begin()
+        self.assertEqual(self.app.trytond.properties, {})
+
+    def test_changed_targets(self):
+        "Test what was loaded for objects changed on the server is forgotten"
+        targets = [('model', 'model.name'), ('view', 'module.view')]
+        self.trytond.get_fingerprints(targets[:1])
+        self.trytond.get_fingerprints(targets)
+        self.assertEqual(self.app.trytond.forgotten, [])
+
+        self.app.trytond.fingerprint = 'second'
+        self.trytond.get_fingerprints(targets)
+        self.assertEqual(self.app.trytond.forgotten, [set(targets)])
+
+    def test_pickle(self):
+        "Test the connection to the service can be saved with the environment"
+        trytond = loads(dumps(self.trytond))
+        self.assertEqual(
+            trytond.get_property('model', 'model.name'), 'fr:model.name')
+
+    def test_client(self):
+        "Test the client methods are run by the service's clients"
+        client = ServiceClient(
+            self.trytond.service, 'sao', default_size=(800, 600),
+            force_update=False, host='localhost')
+
+        self.assertTrue(client.ensure_started())
+        self.assertEqual(client.health.state, 'running')
+        self.assertEqual(client.default_size.width, 800)
+        self.assertEqual(
+            client.calculate_area(['name'], 5), Area(1, 2, 3, 4))
+
+        client.stop()
+        self.assertEqual(self.client.calls, [('calculate_area', ['name'], 5)])
+        with self.assertRaises(ClientError):
+            ServiceClient(
+                self.trytond.service, 'missing', default_size=(800, 600),
+                force_update=False).hide_main_menu()
+
+    def test_shutdown(self):
+        "Test the service stops its clients and removes its socket"
+        self.stop()
+        self.assertEqual(self.client.calls, [('stop',)])
+        self.assertFalse(Path(self.address).exists())
+        self.assertFalse(Path(self.address + '.key').exists())
+
+    def test_unavailable(self):
+        "Test lookups return nothing once the service has stopped"
+        self.stop()
+        self.assertIsNone(self.trytond.get_property('model', 'model.name'))
+        with self.assertRaises(TrytondUnavailableError):
+            self.trytond.get_view('module.view')
+
+
+class TestInitialiseService(TestCase):
+
+    def test_not_running(self):
+        "Test builds connect directly if the service is not running"
+        with TemporaryDirectory() as directory:
+            app = Mock(spec=['confdir'], confdir=directory)
+            config = Mock(tryton_service='tryton.sock', language='en')
+            with patch('sphinxcontrib.tryton.service.logger') as logger:
+                initialise_service(app, config)
+        self.assertFalse(hasattr(app, 'trytond'))
+        self.assertTrue(logger.warning.called)
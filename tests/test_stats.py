@@ -0,0 +1,117 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from json import loads
+from pathlib import Path
+from pickle import dumps, loads as pickle_loads
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from sphinxcontrib.tryton.stats import (
+    Call, RPCStats, clear_rpc_document, merge_rpc_stats, note_rpc_document,
+    report_rpc_stats, rpc_phase)
+from sphinxcontrib.tryton.trytond import Trytond
+
+
+class TestRPCStats(TestCase):
+
+    def setUp(self):
+        self.stats = RPCStats()
+        self.proxy = Mock(**{'search_read.return_value': [{'id': 1}]})
+        self.config = Mock(**{'get_proxy.return_value': self.proxy})
+        self.stats.instrument(self.config)
+
+    def test_instrument(self):
+        self.stats.document = 'index'
+        with self.stats.for_target(('model', 'model.name')):
+            proxy = self.config.get_proxy('ir.model')
+            self.assertEqual(proxy.search_read([], 0, None), [{'id': 1}])
+        proxy.search_read([], 0, None)
+
+        self.assertEqual(
+            [(c.model, c.method, c.document, c.target)
+             for c in self.stats.calls],
+            [('ir.model', 'search_read', 'index', ('model', 'model.name')),
+             ('ir.model', 'search_read', 'index', None)])
+
+    def test_instrument_failure(self):
+        self.proxy.read.side_effect = ValueError
+        proxy = self.config.get_proxy('ir.model')
+        with self.assertRaises(ValueError):
+            proxy.read([1], [])
+        self.assertEqual(len(self.stats.calls), 1)
+
+    def test_summary(self):
+        self.stats.calls = [
+            Call('ir.model', 'search_read', 0.5, 'index', ('model', 'a'), 1),
+            Call('ir.model', 'search_read', 0.25, 'other', ('model', 'b'), 1),
+            Call('ir.ui.menu', 'read', 1.0, 'index', ('menu', 'm'), 1),
+            ]
+        summary = self.stats.summary(limit=2)
+
+        self.assertEqual(summary['calls'], 3)
+        self.assertEqual(summary['time'], 1.75)
+        self.assertEqual(summary['methods'], [
+            {'name': 'ir.ui.menu.read', 'calls': 1, 'time': 1.0},
+            {'name': 'ir.model.search_read', 'calls': 2, 'time': 0.75}])
+        self.assertEqual(summary['documents'][0], {
+            'name': 'index', 'calls': 2, 'time': 1.5})
+        self.assertEqual(
+            [t['name'] for t in summary['targets']], ['menu m', 'model a'])
+        self.assertEqual(
+            [c['duration'] for c in summary['slowest']], [1.0, 0.5])
+
+    def test_merge(self):
+        self.stats.calls = [Call('ir.model', 'read', 1, None, None, 1)]
+        other = RPCStats()
+        other.calls = [
+            Call('ir.model', 'read', 1, None, None, 1),
+            Call('ir.model', 'read', 2, 'index', None, 2)]
+        with patch('sphinxcontrib.tryton.stats.getpid', return_value=1):
+            merge_rpc_stats(
+                Mock(**{'trytond.stats': self.stats}), None, ['index'],
+                Mock(tryton_rpc_calls=other.calls))
+        self.assertEqual([c.duration for c in self.stats.calls], [1, 2])
+
+    def test_document(self):
+        app = Mock(**{'trytond.stats': self.stats})
+        proxy = self.config.get_proxy('ir.model')
+        note_rpc_document(app, 'index', [''])
+        proxy.read([1], [])
+        clear_rpc_document(app, None)
+        proxy.read([1], [])
+        with rpc_phase(app, 'setup_prefetch'):
+            proxy.read([1], [])
+        proxy.read([1], [])
+
+        self.assertEqual(
+            [c.document for c in self.stats.calls],
+            ['index', None, '<setup_prefetch>', None])
+
+    def test_report(self):
+        outdir = Path(mkdtemp())
+        self.addCleanup(rmtree, str(outdir), ignore_errors=True)
+        app = Mock(**{'trytond.stats': self.stats, 'outdir': str(outdir)})
+        note_rpc_document(app, 'index', [''])
+        self.config.get_proxy('ir.model').search_read([], 0, None)
+
+        report_rpc_stats(app, None)
+
+        report = loads(
+            (outdir / 'tryton-rpc-stats.json').read_text(encoding='utf-8'))
+        self.assertEqual(report['calls'], 1)
+        self.assertEqual(report['all'][0]['document'], 'index')
+
+    def test_disabled(self):
+        trytond = Trytond('xmlrpc')
+        self.assertIsNone(trytond.stats)
+        with trytond.for_target('model', 'model.name'):
+            pass
+        self.assertIsNotNone(Trytond('xmlrpc', rpc_stats=True).stats)
+
+    def test_pickle(self):
+        trytond = Trytond('xmlrpc', rpc_stats=True)
+        trytond.stats.calls = [Call('ir.model', 'read', 1, None, None, 1)]
+        self.assertIsNone(pickle_loads(dumps(trytond)).stats)
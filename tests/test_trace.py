@@ -0,0 +1,110 @@
+# This file is part of the sphinxcontrib-tryton extension.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from json import loads
+from pathlib import Path
+from shutil import rmtree
+from sphinx_testing import with_app
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from sphinxcontrib.tryton.domain import get_clients_in_use
+from sphinxcontrib.tryton.trace import (
+    Tracer, get_tracer, initialise_trace, merge_trace, trace_span,
+    write_trace)
+from sphinxcontrib.tryton.trytond import Trytond
+
+
+class MockTrytond(object):
+    def __init__(self, **kwargs):
+        pass
+
+    @classmethod
+    def get_config(cls, config):
+        return Trytond.get_config(config)
+
+    def get_property(self, type_, name, property=None):
+        return (property or name).title()
+
+    def get_fingerprints(self, targets):
+        return {t: 'fingerprint' for t in targets}
+
+
+class TestTracer(TestCase):
+
+    def setUp(self):
+        self.addCleanup(
+            initialise_trace, None, Mock(tryton_trace_file=None))
+
+    def test_disabled(self):
+        initialise_trace(None, Mock(tryton_trace_file=None))
+        self.assertIsNone(get_tracer())
+        with trace_span('span'):
+            pass
+
+    def test_span(self):
+        initialise_trace(None, Mock(tryton_trace_file='trace.json'))
+        with trace_span('outer', 'figure', document='index'):
+            with trace_span('inner'):
+                pass
+
+        events = get_tracer().events
+        self.assertEqual([e['name'] for e in events], ['inner', 'outer'])
+        outer = events[1]
+        self.assertEqual(outer['ph'], 'X')
+        self.assertEqual(outer['cat'], 'figure')
+        self.assertEqual(outer['args'], {'document': 'index'})
+        self.assertLessEqual(outer['ts'], events[0]['ts'])
+
+    def test_span_exception(self):
+        tracer = Tracer()
+        with self.assertRaises(ValueError):
+            with tracer.span('failed', 'tryton'):
+                raise ValueError
+        self.assertEqual(len(tracer.events), 1)
+
+    def test_merge(self):
+        initialise_trace(None, Mock(tryton_trace_file='trace.json'))
+        other = Mock(tryton_trace_events=[
+            {'name': 'before fork', 'pid': 1},
+            {'name': 'child', 'pid': 2}])
+        with patch('sphinxcontrib.tryton.trace.getpid', return_value=1):
+            merge_trace(None, None, ['index'], other)
+        self.assertEqual(
+            [e['name'] for e in get_tracer().events], ['child'])
+
+
+class TestTraceBuild(TestCase):
+
+    def setUp(self):
+        trytond_patcher = patch(
+            'sphinxcontrib.tryton.trytond.Trytond', MockTrytond)
+        trytond_patcher.start()
+        self.addCleanup(trytond_patcher.stop)
+        self.addCleanup(get_clients_in_use().clear)
+        self.addCleanup(
+            initialise_trace, None, Mock(tryton_trace_file=None))
+
+        self.temp_dir = Path(mkdtemp())
+        self.addCleanup(rmtree, str(self.temp_dir), ignore_errors=True)
+
+    @with_app(srcdir='tests/doc/basic/', write_docstring=True)
+    def test_write_trace(self, app, status, warning):
+        """
+        .. tryton:model:: model.name
+        """
+        trace_file = self.temp_dir / 'trace.json'
+        app.config.tryton_trace_file = str(trace_file)
+        initialise_trace(app, app.config)
+
+        app.builder.build_all()
+        write_trace(app, None)
+
+        trace = loads(trace_file.read_text(encoding='utf-8'))
+        spans = [
+            (e['name'], e['cat'], e['args'])
+            for e in trace['traceEvents']]
+        self.assertEqual(spans, [('resolve', 'role', {
+            'document': 'index', 'type': 'model', 'target': 'model.name'})])
+        self.assertIsNone(app.env.tryton_trace_events)